@@ -0,0 +1,68 @@
+import argparse
+import time
+import numpy as np
+from loguru import logger
+from models.ann_index import create_index, get_index
+from models.similarity import normalize_rows, blocked_top_k
+
+
+def make_clustered(qty: int, dim: int, clusters: int, rng: np.random.Generator) -> np.ndarray:
+    """Create embeddings grouped around random centers, similar to product families."""
+    centers = rng.standard_normal((clusters, dim))
+    matrix = centers[rng.integers(0, clusters, qty)] + 0.5 * rng.standard_normal((qty, dim))
+
+    return normalize_rows(matrix)
+
+
+def recall_at_k(true_ids: np.ndarray, found_ids: np.ndarray) -> float:
+    """Return the share of the exact top-k neighbours found by the index."""
+    hits = sum(len(set(t) & set(f)) for t, f in zip(true_ids, found_ids))
+
+    return hits / true_ids.size
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='Recall@k and latency of the ANN index against brute force.')
+    arg_parser.add_argument('--source', help='Build the index from the stored embeddings of this source.')
+    arg_parser.add_argument('--backend', default='ivf')
+    arg_parser.add_argument('--qty', type=int, default=100000, help='Number of synthetic products.')
+    arg_parser.add_argument('--queries', type=int, default=1000)
+    arg_parser.add_argument('--dim', type=int, default=384)
+    arg_parser.add_argument('--k', type=int, default=10)
+    args = arg_parser.parse_args()
+
+    rng = np.random.default_rng(42)
+
+    if args.source:
+        status_code, status_message, index = get_index(args.source, args.backend, rebuild=True)
+        if status_code != 0:
+            logger.error(status_message)
+            exit(1)
+
+        from db.embedding_store import load_store
+
+        _, _, store = load_store(args.source)
+        ids, matrix = store.ids, store.name_emb
+        queries = matrix[rng.choice(len(matrix), min(args.queries, len(matrix)), replace=False)]
+    else:
+        matrix = make_clustered(args.qty + args.queries, args.dim, max(1, args.qty // 50), rng)
+        queries, matrix = matrix[:args.queries], matrix[args.queries:]
+        ids = np.arange(len(matrix))
+
+        start = time.perf_counter()
+        index = create_index(args.backend)
+        index.build(ids, matrix)
+        logger.info(f'index built in {time.perf_counter() - start:.2f}s')
+
+    start = time.perf_counter()
+    true_idx, _ = blocked_top_k(queries, matrix, k=args.k)
+    brute_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    found_ids, _ = index.search(queries, args.k)
+    ann_time = time.perf_counter() - start
+
+    logger.info(f'{len(matrix)} products, {len(queries)} queries, backend "{args.backend}"')
+    logger.info(f'brute force: {brute_time / len(queries) * 1000:.3f} ms/query')
+    logger.info(f'index:       {ann_time / len(queries) * 1000:.3f} ms/query')
+    logger.info(f'recall@{args.k}: {recall_at_k(ids[true_idx], found_ids):.4f}')
@@ -0,0 +1,58 @@
+import argparse
+import time
+import numpy as np
+from loguru import logger
+from parsers.product import Product
+from models.matcher import Matcher
+
+volumes = ['15 ml', '30 ml', '50 ml', '100 ml', '200 ml', '50 g', '']
+
+
+def make_catalogs(qty: int, brands: int, dim: int, unbranded: float, rng: np.random.Generator):
+    """Create two catalogs of the same products with noisy embeddings. The products of list B carry
+    their brand like the MySkin products, the brands of list A are only in the names."""
+    products_a, products_b = [], []
+    centers = rng.standard_normal((brands, dim))
+
+    for i in range(qty):
+        brand = int(rng.integers(brands))
+        volume = volumes[int(rng.integers(len(volumes)))]
+        # the products of a brand are similar to each other, which makes the matching harder
+        embedding = centers[brand] + rng.standard_normal(dim)
+        brand_name = f'Brand {brand}' if rng.random() >= unbranded else 'Unknown'
+
+        for source, products in (('a', products_a), ('b', products_b)):
+            product = Product(source=source, url=f'https://{source}.test/{i}', name=f'{brand_name} product {i} {volume}')
+            product.id = i + 1
+            product.name_emb = (embedding + 0.3 * rng.standard_normal(dim)).astype(np.float32)
+            product.descr_emb = product.name_emb
+            products.append(product)
+
+        products_b[-1].brand = f'Brand {brand}'
+
+    return products_a, products_b
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='Matching with and without blocking by brand and pack size.')
+    arg_parser.add_argument('--qty', type=int, default=20000)
+    arg_parser.add_argument('--brands', type=int, default=300)
+    arg_parser.add_argument('--dim', type=int, default=384)
+    arg_parser.add_argument('--unbranded', type=float, default=0.02,
+                            help='Share of the products without a brand in the name of list A.')
+    arg_parser.add_argument('--threshold', type=float, default=0.5)
+    args = arg_parser.parse_args()
+
+    products_a, products_b = make_catalogs(args.qty, args.brands, args.dim, args.unbranded, np.random.default_rng(42))
+
+    for blocking in (False, True):
+        matcher = Matcher(products_a, products_b, threshold=args.threshold, blocking=blocking)
+
+        start = time.perf_counter()
+        matcher.find_best_matches()
+        elapsed = time.perf_counter() - start
+
+        correct = sum(a.id == b.id for a, b, _ in matcher.get_matches())
+
+        logger.info(f'blocking {str(blocking):<5}: {elapsed:.3f}s, {matcher.comparisons} similarities, '
+                    f'{len(matcher.get_matches())} matches, {correct / len(products_a):.1%} correct')
@@ -0,0 +1,103 @@
+import argparse
+import os
+import tempfile
+import time
+from http.server import ThreadingHTTPServer
+from typing import Dict, List, Tuple
+from loguru import logger
+from config import db_params, http_params, http_cache_params, embedding_cache_params, parse_params
+from db.init_db import create_database
+from db.crawl_state import SourceStates
+from parsers.product import Product
+from parsers.pipeline import CrawlPipeline, CrawlOrchestrator
+from run_parsing import make_parser
+from benchmarks.stub_server import save_page, start_stub_server
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+
+def make_sites(quantities: Dict[str, int], delay: float) -> Dict[str, Tuple[ThreadingHTTPServer, List[str]]]:
+    """Serve copies of the fixture product page of every source from its own stub server,
+    return the servers and the urls of the pages."""
+    sites = {}
+
+    for source, qty in quantities.items():
+        root = tempfile.mkdtemp()
+        server, base_url = start_stub_server(root, delay=delay)
+
+        with open(os.path.join(FIXTURES, f'{source}_product.html'), 'rb') as f:
+            page = f.read()
+
+        urls = [f'{base_url}/product/{i}' for i in range(qty)]
+        for url in urls:
+            save_page(root, url, page)
+
+        sites[source] = (server, urls)
+
+    return sites
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='Crawling several sources one after another vs concurrently.')
+    arg_parser.add_argument('--qty', type=int, nargs='+', default=[300, 100],
+                            help='Number of product pages of moonglow and myskin, or of both.')
+    arg_parser.add_argument('--delay', type=float, default=0.05, help='Simulated latency per page in seconds.')
+    arg_parser.add_argument('--workers', type=int, default=http_params['max_workers'])
+    args = arg_parser.parse_args()
+
+    db_params['db_file'] = os.path.join(tempfile.mkdtemp(), 'products.db')
+    create_database()
+    # every run fetches, parses and embeds all the pages
+    http_cache_params['enabled'] = False
+    embedding_cache_params['enabled'] = False
+
+    sources = ['moonglow', 'myskin']
+    quantities = dict(zip(sources, args.qty if len(args.qty) == len(sources) else args.qty[:1] * len(sources)))
+    sites = make_sites(quantities, args.delay)
+
+    parsers = []
+    for source in sources:
+        parser = make_parser(source, offline=False, other=parsers[0] if parsers else None)
+        # the stub servers are local, no need to be polite
+        parser.http.limiter.max_per_host = args.workers
+        parser.http.limiter.rate_limit = 0
+        parsers.append(parser)
+
+    # the model is loaded before the runs
+    parsers[0].embedder.embed_batch(['warm up'])
+
+    states = SourceStates(sources)
+    states.connect()
+
+    def reset():
+        for parser in parsers:
+            # the name and price come from the catalog pages, which are not crawled
+            parser.products = [Product(source=parser.parser_type, url=url, name=f'product {i}', price=100.0)
+                               for i, url in enumerate(sites[parser.parser_type][1])]
+            states[parser.parser_type].start(parser.products)
+
+    reset()
+    times = {}
+    start = time.perf_counter()
+    for parser in parsers:
+        source_start = time.perf_counter()
+        CrawlPipeline(parser, state=states[parser.parser_type]).run()
+        times[parser.parser_type] = time.perf_counter() - source_start
+    sequential_time = time.perf_counter() - start
+
+    reset()
+    parse_workers = parse_params['max_workers'] and max(1, parse_params['max_workers'] // len(parsers))
+    pipelines = [CrawlPipeline(parser, state=states[parser.parser_type], parse_workers=parse_workers)
+                 for parser in parsers]
+    start = time.perf_counter()
+    stats = CrawlOrchestrator(pipelines, parsers[0].embedder, state=states).run()
+    concurrent_time = time.perf_counter() - start
+
+    logger.info(f'sequential: {sequential_time:.2f}s '
+                f'({", ".join(f"{source} {seconds:.2f}s" for source, seconds in times.items())})')
+    logger.info(f'concurrent: {concurrent_time:.2f}s, {stats.saved} products saved, '
+                f'{stats.parse_errors} parse errors')
+
+    states.close()
+    for server, _ in sites.values():
+        server.shutdown()
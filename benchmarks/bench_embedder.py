@@ -0,0 +1,57 @@
+import argparse
+import time
+import numpy as np
+from loguru import logger
+from config import embedder_params
+from models.embedder import ProductEmbedder
+
+WORDS = ['крем', 'для', 'лица', 'увлажняющий', 'cream', 'serum', 'SPF', '50', 'ml', 'hyaluronic', 'acid',
+         'tonic', 'mask', 'с', 'витамином', 'C', 'peptide', 'gel', 'foam', 'cleansing']
+
+
+def make_texts(qty: int, rng: np.random.Generator):
+    """Create product-like texts: short names and descriptions of varied length."""
+    names = [' '.join(rng.choice(WORDS, rng.integers(3, 10))) for _ in range(qty)]
+    descriptions = [' '.join(rng.choice(WORDS, rng.integers(10, 200))) for _ in range(qty)]
+
+    return names + descriptions
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='Per-item vs batched embedding throughput, and the maximum '
+                                                     'absolute difference of the batched embeddings.')
+    arg_parser.add_argument('--qty', type=int, default=500, help='Number of products (names + descriptions).')
+    arg_parser.add_argument('--model', default=embedder_params['model_name'])
+    arg_parser.add_argument('--batch-size', type=int, nargs='+', default=[16, 64, 128])
+    arg_parser.add_argument('--tolerance', type=float, default=1e-5,
+                            help='Maximum absolute difference from the per-item embeddings.')
+    args = arg_parser.parse_args()
+
+    texts = make_texts(args.qty, np.random.default_rng(42))
+    # no embedding cache: every run encodes all the texts
+    embedder = ProductEmbedder(args.model)
+
+    start = time.perf_counter()
+    single = np.stack([embedder.embed_description(text) for text in texts])
+    elapsed = time.perf_counter() - start
+    logger.info(f'per item:       {len(texts) / elapsed:8.1f} items/s')
+
+    max_diff = 0.0
+    for batch_size in args.batch_size:
+        for sort_by_length in (False, True):
+            start = time.perf_counter()
+            batched = embedder.embed_batch(texts, batch_size=batch_size, sort_by_length=sort_by_length)
+            elapsed = time.perf_counter() - start
+            diff = float(np.abs(single - batched).max())
+            max_diff = max(max_diff, diff)
+
+            logger.info(f'batch {batch_size:4d}{" sorted" if sort_by_length else "       "}: '
+                        f'{len(texts) / elapsed:8.1f} items/s, max abs diff {diff:.2e}')
+
+    if max_diff > args.tolerance:
+        logger.error(f'The batched embeddings differ from the per-item ones by up to {max_diff:.2e}, '
+                     f'more than the tolerance {args.tolerance:.0e}.')
+        exit(1)
+
+    logger.info(f'The batched embeddings match the per-item ones: max abs diff {max_diff:.2e} '
+                f'<= {args.tolerance:.0e}.')
@@ -0,0 +1,59 @@
+import argparse
+import os
+import tempfile
+import time
+from loguru import logger
+from parsers.product import Product
+from parsers.ms_parser import MySkinParser
+from benchmarks.stub_server import save_page, start_stub_server
+
+FIXTURE_PAGE = os.path.join(os.path.dirname(__file__), 'fixtures', 'myskin_product.html')
+
+PRODUCT_PAGE = """<html><body>
+<ul><li class="acc-block_item"><span class="acc-title">Описание</span>
+<div class="acc-content"><p>Рекомендуем</p><p>Product {i} description.</p></div></li></ul>
+<a class="gall-img img-0 active" href="/images/{i}.jpg"></a>
+</body></html>"""
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='Sequential vs concurrent product page fetching.')
+    arg_parser.add_argument('--qty', type=int, default=200)
+    arg_parser.add_argument('--delay', type=float, default=0.05, help='Simulated latency per page in seconds.')
+    arg_parser.add_argument('--workers', type=int, default=8)
+    arg_parser.add_argument('--pages', help='Directory with recorded pages, synthetic pages are used if omitted.')
+    arg_parser.add_argument('--parse-workers', type=int, nargs='+', default=[0, os.cpu_count()],
+                            help='Numbers of parsing processes to compare, 0 to parse in the fetching threads.')
+    arg_parser.add_argument('--fixture', action='store_true',
+                            help='Serve the saved MySkin product page instead of the small synthetic one.')
+    args = arg_parser.parse_args()
+
+    root = args.pages or tempfile.mkdtemp()
+    server, base_url = start_stub_server(root, delay=args.delay)
+
+    urls = [f'{base_url}/product/{i}' for i in range(args.qty)]
+    if not args.pages:
+        with open(FIXTURE_PAGE, 'rb') as f:
+            fixture = f.read()
+
+        for i, url in enumerate(urls):
+            save_page(root, url, fixture if args.fixture else PRODUCT_PAGE.format(i=i).encode())
+
+    parser = MySkinParser(parser_type='myskin', prod_urls=['https://myskin.md/brendy'])
+    # the stub server is local, no need to be polite
+    parser.http.limiter.max_per_host = args.workers
+    parser.http.limiter.rate_limit = 0
+
+    runs = [(1, 0)] + [(args.workers, parse_workers) for parse_workers in args.parse_workers]
+
+    for workers, parse_workers in runs:
+        parser.products = [Product(source='myskin', url=url) for url in urls]
+
+        start = time.perf_counter()
+        prc_qty, err_qty = parser.parse_products(max_workers=workers, parse_workers=parse_workers)
+        elapsed = time.perf_counter() - start
+
+        logger.info(f'{workers} worker(s), {parse_workers} parsing process(es): {prc_qty} products, '
+                    f'{err_qty} errors, {elapsed:.2f}s ({prc_qty / elapsed:.1f} pages/s)')
+
+    server.shutdown()
@@ -0,0 +1,61 @@
+import argparse
+import time
+import numpy as np
+from loguru import logger
+from parsers.product import Product
+from models.matcher import Matcher
+from models.lexical_index import LexicalIndex
+
+variants = ['SPF 30 50 ml', 'SPF 50 50 ml', 'SPF 50 200 ml', '30 ml', '100 ml']
+
+
+def make_catalogs(families: int, dim: int, rng: np.random.Generator):
+    """Create two catalogs of product families whose variants differ only by SPF or volume. The name embeddings
+    of the variants of a family are almost identical, like the embeddings of a model that ignores the numbers."""
+    products_a, products_b = [], []
+
+    for family in range(families):
+        embedding = rng.standard_normal(dim)
+        descr = rng.standard_normal(dim)
+
+        for variant in variants:
+            for source, products in (('a', products_a), ('b', products_b)):
+                name = f'Brand {family % 50} Cream {family} {variant}'
+                product = Product(source=source, url=f'https://{source}.test/{len(products)}', name=name)
+                product.id = len(products) + 1
+                product.name_emb = (embedding + 0.2 * rng.standard_normal(dim)).astype(np.float32)
+                product.descr_emb = (descr + 0.2 * rng.standard_normal(dim)).astype(np.float32)
+                products.append(product)
+
+    return products_a, products_b
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='Accuracy and time of the embedding and the hybrid matching.')
+    arg_parser.add_argument('--families', type=int, default=2000)
+    arg_parser.add_argument('--dim', type=int, default=384)
+    arg_parser.add_argument('--top-k', type=int, default=5)
+    args = arg_parser.parse_args()
+
+    products_a, products_b = make_catalogs(args.families, args.dim, np.random.default_rng(42))
+
+    start = time.perf_counter()
+    lexical = LexicalIndex()
+    lexical.build(np.array([p.id for p in products_b]), [p.name for p in products_b])
+    logger.info(f'{len(products_b)} products, lexical index built in {time.perf_counter() - start:.2f}s, '
+                f'{len(lexical.vocabulary)} features')
+
+    queries = lexical.transform([p.name for p in products_a])
+    start = time.perf_counter()
+    lexical.search(queries, args.top_k)
+    logger.info(f'lexical search: {(time.perf_counter() - start) / len(products_a) * 1e6:.1f} us/query')
+
+    for label, params in (('embedding', dict(threshold=0.0)), ('hybrid', dict(threshold=0.0, lexical=lexical))):
+        matcher = Matcher(products_a, products_b, top_k=args.top_k, **params)
+
+        start = time.perf_counter()
+        matcher.find_best_matches()
+        elapsed = time.perf_counter() - start
+
+        correct = sum(a.id == b.id for a, b, _ in matcher.get_matches())
+        logger.info(f'{label:<9}: {elapsed:.3f}s, {correct / len(products_a):.1%} correct')
@@ -0,0 +1,70 @@
+import argparse
+import time
+import numpy as np
+from loguru import logger
+from parsers.product import Product
+from models.matcher import Matcher
+
+
+def make_products(source: str, qty: int, dim: int, rng: np.random.Generator):
+    """Create products with random float32 embeddings."""
+    products = []
+
+    for i in range(qty):
+        product = Product(source=source, url=f'https://{source}.test/{i}', name=f'product {i}')
+        product.id = i + 1
+        product.name_emb = rng.standard_normal(dim).astype(np.float32)
+        product.descr_emb = rng.standard_normal(dim).astype(np.float32)
+        products.append(product)
+
+    return products
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='Compare the vectorized matcher with the pairwise loop.')
+    arg_parser.add_argument('--qty-a', type=int, default=500)
+    arg_parser.add_argument('--qty-b', type=int, default=2000)
+    arg_parser.add_argument('--dim', type=int, default=384)
+    arg_parser.add_argument('--threshold', type=float, default=0.1)
+    arg_parser.add_argument('--top-k', type=int, default=5, help='Number of candidates of the matching modes.')
+    args = arg_parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    products_a = make_products('a', args.qty_a, args.dim, rng)
+    products_b = make_products('b', args.qty_b, args.dim, rng)
+
+    matcher = Matcher(products_a, products_b, threshold=args.threshold)
+
+    start = time.perf_counter()
+    matcher.find_best_matches_loop()
+    loop_time = time.perf_counter() - start
+    loop_matches = list(matcher.get_matches())
+
+    start = time.perf_counter()
+    matcher.find_best_matches()
+    matrix_time = time.perf_counter() - start
+    matrix_matches = list(matcher.get_matches())
+
+    same_pairs = [(a.id, b.id) for a, b, _ in loop_matches] == [(a.id, b.id) for a, b, _ in matrix_matches]
+    max_diff = max((abs(float(s1) - float(s2)) for (_, _, s1), (_, _, s2) in zip(loop_matches, matrix_matches)),
+                   default=0.0)
+
+    logger.info(f'{args.qty_a} x {args.qty_b} products, dim {args.dim}, {len(matrix_matches)} matches')
+    logger.info(f'loop:   {loop_time:.3f}s')
+    logger.info(f'matrix: {matrix_time:.3f}s ({loop_time / matrix_time:.1f}x faster)')
+    logger.info(f'identical pairs: {same_pairs}, max similarity difference: {max_diff:.2e}')
+
+    for mode, assignment in (('best', 'greedy'), ('mutual', 'greedy'), ('one_to_one', 'greedy'),
+                             ('one_to_one', 'hungarian')):
+        matcher = Matcher(products_a, products_b, threshold=args.threshold, top_k=args.top_k, mode=mode,
+                          assignment=assignment)
+
+        start = time.perf_counter()
+        matcher.find_best_matches()
+        elapsed = time.perf_counter() - start
+
+        matches = matcher.get_matches()
+        distinct = len({b.id for _, b, _ in matches})
+
+        logger.info(f'{mode:<10} {assignment:<9} top-{args.top_k}: {elapsed:.3f}s, {len(matches)} matches '
+                    f'({distinct} distinct products of B), total similarity {sum(float(s) for _, _, s in matches):.1f}')
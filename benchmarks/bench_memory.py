@@ -0,0 +1,60 @@
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+from loguru import logger
+from config import db_params
+from db.init_db import create_database
+from db.controller import ProductController
+from db.embedding_store import load_store
+from benchmarks.bench_store import fill_database
+
+
+def measure(load):
+    """Return the result of `load`, the Python memory it holds in MB and its run time in seconds."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = load()
+    elapsed = time.perf_counter() - start
+    size = tracemalloc.get_traced_memory()[0] / 2 ** 20
+    tracemalloc.stop()
+
+    return result, size, elapsed
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='Memory held by a catalog loaded with all columns vs the columns '
+                                                     'needed for matching.')
+    arg_parser.add_argument('--source', help='Use the stored products of the source, synthetic products are used if omitted.')
+    arg_parser.add_argument('--qty', type=int, default=100000, help='Number of synthetic products.')
+    arg_parser.add_argument('--dim', type=int, default=384)
+    arg_parser.add_argument('--descr-len', type=int, default=2000, help='Length of the synthetic descriptions.')
+    args = arg_parser.parse_args()
+
+    source = args.source
+
+    if source is None:
+        source = 'bench'
+        db_params['db_file'] = os.path.join(tempfile.mkdtemp(), 'products.db')
+        create_database()
+        fill_database(source, args.qty, args.dim, np.random.default_rng(42), args.descr_len)
+
+    # built beforehand, loading it is measured
+    load_store(source)
+
+    (_, _, products), full_size, full_time = measure(lambda: ProductController.get_products(source))
+    del products
+
+    def load_compact():
+        _, _, store = load_store(source)
+        _, _, products = ProductController.get_products(source, columns=('name', 'price', 'image_url'))
+        return store, products
+
+    (store, products), compact_size, compact_time = measure(load_compact)
+
+    logger.info(f'{len(products)} products')
+    logger.info(f'all columns:              {full_size:7.1f} MB in {full_time:.2f}s')
+    logger.info(f'matching columns + store: {compact_size:7.1f} MB in {compact_time:.2f}s '
+                f'(+{store.name_emb.nbytes * 2 / 2 ** 20:.1f} MB memory-mapped)')
@@ -0,0 +1,64 @@
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime
+import numpy as np
+from loguru import logger
+from config import db_params, matcher_params
+from db.init_db import create_database
+from db.embedding_store import load_store
+from benchmarks.bench_store import fill_database
+from run_matching import load_source, match_source, match_competitors
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='Matching an anchor source with several competitors: one run per '
+                                                     'competitor vs one pass, sequential and in parallel processes.')
+    arg_parser.add_argument('--qty', type=int, default=20000, help='Number of products of every source.')
+    arg_parser.add_argument('--competitors', type=int, default=4)
+    arg_parser.add_argument('--dim', type=int, default=384)
+    arg_parser.add_argument('--workers', type=int, default=matcher_params['workers'])
+    arg_parser.add_argument('--blocking', action='store_true',
+                            help='Match with blocking, which adds Python-level work per product.')
+    args = arg_parser.parse_args()
+
+    db_params['db_file'] = os.path.join(tempfile.mkdtemp(), 'products.db')
+    create_database()
+
+    rng = np.random.default_rng(42)
+    sources = ['anchor'] + [f'competitor{i}' for i in range(args.competitors)]
+
+    for source in sources:
+        fill_database(source, args.qty, args.dim, rng)
+        load_store(source)
+
+    match_args = argparse.Namespace(ann=False, top_k=1, mode='best', assignment='greedy', blocking=args.blocking,
+                                    hybrid=False, incremental=False)
+    started_at = datetime.now().isoformat()
+
+    # one run per competitor, the anchor catalog is loaded by every run
+    start = time.perf_counter()
+    for source in sources[1:]:
+        _, _, products, store = load_source('anchor')
+        match_source(match_args, 'anchor', products, store, source, started_at)
+    separate_time = time.perf_counter() - start
+
+    # one pass, the anchor catalog is loaded once and the competitors are matched one after another
+    start = time.perf_counter()
+    _, _, products, store = load_source('anchor')
+    sequential = match_competitors(match_args, 'anchor', products, store, sources[1:], started_at)
+    sequential_time = time.perf_counter() - start
+
+    # one pass, the competitors are matched in parallel by processes memory-mapping the anchor store
+    start = time.perf_counter()
+    _, _, products, store = load_source('anchor')
+    parallel = match_competitors(match_args, 'anchor', products, store, sources[1:], started_at, args.workers)
+    parallel_time = time.perf_counter() - start
+
+    same = all([(a.id, b.id) for a, b, _ in seq[2]['matches']] == [(a.id, b.id) for a, b, _ in par[2]['matches']]
+               for seq, par in zip(sequential, parallel))
+
+    logger.info(f'{args.competitors} competitors x {args.qty} products, {os.cpu_count()} CPUs: '
+                f'separate runs {separate_time:.3f}s, one pass {sequential_time:.3f}s, '
+                f'{args.workers} processes {parallel_time:.3f}s ({sequential_time / parallel_time:.2f}x over one pass), '
+                f'same matches: {same}')
@@ -0,0 +1,73 @@
+import argparse
+import time
+import numpy as np
+from loguru import logger
+from config import embedder_params
+from db.controller import ProductController
+from models.embedder import ProductEmbedder
+from models.similarity import normalize_rows
+from benchmarks.bench_embedder import make_texts
+
+
+def load_stored(source: str, qty: int):
+    """Return the names and descriptions of the stored products of the source with their stored embeddings."""
+    status_code, status_message, products = ProductController.get_products(source)
+
+    if status_code != 0:
+        logger.error(f'Unable to load the products of {source}: {status_message}')
+        return [], None
+
+    products = [p for p in products if p.name_emb is not None and p.descr_emb is not None][:qty]
+    texts = [p.name for p in products] + [p.description for p in products]
+    embeddings = [p.name_emb for p in products] + [p.descr_emb for p in products]
+
+    return texts, np.stack(embeddings) if embeddings else None
+
+
+def nn_agreement(reference: np.ndarray, embeddings: np.ndarray) -> float:
+    """Return the share of texts whose nearest other text is the same with both embeddings."""
+    def nearest(matrix):
+        scores = normalize_rows(matrix) @ normalize_rows(matrix).T
+        np.fill_diagonal(scores, -np.inf)
+        return scores.argmax(axis=1)
+
+    return float((nearest(reference) == nearest(embeddings)).mean())
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='Accuracy and throughput of the ONNX embedder backends vs fp32.')
+    arg_parser.add_argument('--model', default=embedder_params['model_name'])
+    arg_parser.add_argument('--source', help='Compare with the stored embeddings of the source, synthetic texts '
+                                             'embedded by the torch backend are used if omitted.')
+    arg_parser.add_argument('--qty', type=int, default=500, help='Number of products (names + descriptions).')
+    arg_parser.add_argument('--batch-size', type=int, default=embedder_params['batch_size'])
+    arg_parser.add_argument('--onnx-dir', default=embedder_params['onnx_dir'])
+    args = arg_parser.parse_args()
+
+    texts, reference = load_stored(args.source, args.qty) if args.source else ([], None)
+
+    if not texts:
+        texts = make_texts(args.qty, np.random.default_rng(42))
+
+    backends = [
+        ('torch fp32', dict(backend='torch')),
+        ('onnx fp32', dict(backend='onnx', quantize=False)),
+        ('onnx int8', dict(backend='onnx', quantize=True)),
+    ]
+    embedders = {label: ProductEmbedder(args.model, onnx_dir=args.onnx_dir, **params) for label, params in backends}
+    # the tokenizer of the exported model is the one of the SentenceTransformer model
+    tokens = embedders['onnx fp32'].model.count_tokens(texts)
+
+    for label, embedder in embedders.items():
+        start = time.perf_counter()
+        embeddings = embedder.embed_batch(texts, batch_size=args.batch_size)
+        elapsed = time.perf_counter() - start
+
+        if reference is None:
+            reference = embeddings
+
+        cosine = (normalize_rows(embeddings) * normalize_rows(reference)).sum(axis=1)
+
+        logger.info(f'{label}: {len(texts) / elapsed:8.1f} items/s, {tokens / elapsed:9.1f} tokens/s, '
+                    f'cosine to fp32 mean {cosine.mean():.5f} min {cosine.min():.5f}, '
+                    f'nearest neighbour agreement {nn_agreement(reference, embeddings):.1%}')
@@ -0,0 +1,76 @@
+import argparse
+import os
+import time
+from loguru import logger
+import parsers.extractors
+import parsers.soup
+from parsers.mg_parser import MoonGlowParser
+from parsers.ms_parser import MySkinParser
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+# (fixture page, parser class or None for the product page extractors, extraction function, strainer attribute)
+CASES = [
+    ('myskin_catalog.html', MySkinParser, '_extract_catalog_products', 'catalog_strainer'),
+    ('myskin_product.html', None, 'extract_myskin_product', 'myskin_product_strainer'),
+    ('moonglow_catalog.html', MoonGlowParser, '_extract_catalog_products', 'catalog_strainer'),
+    ('moonglow_product.html', None, 'extract_moonglow_product', 'moonglow_product_strainer'),
+]
+
+
+def comparable(result):
+    """Turn an extraction result into a value that can be compared between tree builders."""
+    if isinstance(result, list):
+        return [(p.url, p.name, p.price) for p in result]
+
+    return result
+
+
+def measure(extract, html: str, repeat: int) -> float:
+    """Return the CPU time per page in milliseconds."""
+    start = time.process_time()
+
+    for _ in range(repeat):
+        extract(html)
+
+    return (time.process_time() - start) / repeat * 1000
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='Per-page CPU cost of the HTML extraction.')
+    arg_parser.add_argument('--repeat', type=int, default=50)
+    arg_parser.add_argument('--pages', default=FIXTURES, help='Directory with the saved fixture pages.')
+    args = arg_parser.parse_args()
+
+    parser_objs = {
+        MySkinParser: MySkinParser(parser_type='myskin', prod_urls=['https://myskin.md/brendy']),
+        MoonGlowParser: MoonGlowParser(parser_type='moonglow', prod_urls=['https://moonglow.md/ru/catalog/']),
+    }
+    default_builder = parsers.soup.HTML_PARSER
+
+    for page, parser_cls, method, strainer_attr in CASES:
+        with open(os.path.join(args.pages, page), encoding='utf-8') as f:
+            html = f.read()
+
+        # the strainers are class attributes of the parsers and module attributes of the extractors
+        owner = parser_cls or parsers.extractors
+        extract = getattr(parser_objs[parser_cls] if parser_cls else owner, method)
+        strainer = getattr(owner, strainer_attr)
+        results = {}
+
+        for builder, strained in (('html.parser', False), (default_builder, False), (default_builder, True)):
+            parsers.soup.HTML_PARSER = builder
+            setattr(owner, strainer_attr, strainer if strained else None)
+
+            label = f'{builder}{", strained" if strained else ""}'
+            results[label] = comparable(extract(html))
+            ms = measure(extract, html, args.repeat)
+
+            logger.info(f'{page:22s} {label:22s} {ms:7.2f} ms/page')
+
+        parsers.soup.HTML_PARSER = default_builder
+        setattr(owner, strainer_attr, strainer)
+
+        baseline = results['html.parser']
+        if any(result != baseline for result in results.values()):
+            logger.error(f'{page}: the extracted fields differ from the html.parser full tree')
@@ -0,0 +1,85 @@
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta
+import numpy as np
+from loguru import logger
+from config import db_params
+from db.init_db import create_database
+from db.price_controller import PriceController
+
+
+def fill_history(qty: int, changes: int, days: int, rng: np.random.Generator):
+    """Insert `qty` products of two sources matched one to one, first seen `days` days ago, and `changes`
+    price changes of every product spread over these days directly into the history."""
+    conn = sqlite3.connect(db_params['db_file'])
+    now = datetime.now()
+
+    for source in ('anchor', 'competitor'):
+        conn.executemany("""
+            insert into products (source, url, name, description, price, image_url, crawled_at)
+            values (?, ?, ?, '', ?, '', ?);
+        """, ((source, f'https://{source}.test/{i}', f'product {i}', float(rng.uniform(50, 150)),
+               (now - timedelta(days=days)).isoformat()) for i in range(qty)))
+
+    conn.executemany("""
+        insert into matches (product_a, product_b, source_a, source_b, similarity, model, computed_at)
+        values (?, ?, 'anchor', 'competitor', 1.0, 'bench', ?);
+    """, ((i + 1, qty + i + 1, now.isoformat()) for i in range(qty)))
+
+    seconds = rng.integers(0, days * 86400, size=(2 * qty, changes))
+    conn.executemany(
+        'insert into price_history (product_id, price, observed_at) values (?, ?, ?);',
+        ((id + 1, float(rng.uniform(50, 150)), (now - timedelta(seconds=int(s))).isoformat())
+         for id in range(2 * qty) for s in seconds[id])
+    )
+    conn.commit()
+    conn.close()
+
+
+def time_queries(since: str, min_diff: float, repeat: int):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        _, _, changes = PriceController.get_price_changes('anchor', since)
+    changes_time = (time.perf_counter() - start) / repeat
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        _, _, cheaper = PriceController.get_cheaper_competitors('anchor', 'competitor', 'bench', min_diff)
+    cheaper_time = (time.perf_counter() - start) / repeat
+
+    return changes_time, len(changes), cheaper_time, len(cheaper)
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='Price change queries over the price history, '
+                                                     'with and without its indexes.')
+    arg_parser.add_argument('--qty', type=int, default=50000, help='Number of products of every source.')
+    arg_parser.add_argument('--changes', type=int, default=20, help='Number of price changes of every product.')
+    arg_parser.add_argument('--days', type=int, default=365, help='Number of days the changes are spread over.')
+    arg_parser.add_argument('--min-diff', type=float, default=20.0)
+    arg_parser.add_argument('--repeat', type=int, default=3)
+    arg_parser.add_argument('--without-indexes', action='store_true',
+                            help='Also time the queries without the indexes of the history (minutes on large histories).')
+    args = arg_parser.parse_args()
+
+    db_params['db_file'] = os.path.join(tempfile.mkdtemp(), 'products.db')
+    create_database()
+    fill_history(args.qty, args.changes, args.days, np.random.default_rng(42))
+
+    since = (datetime.now() - timedelta(days=1)).isoformat()
+    logger.info(f'{2 * args.qty * args.changes} price observations')
+
+    for indexed in (True, False) if args.without_indexes else (True,):
+        if not indexed:
+            conn = sqlite3.connect(db_params['db_file'])
+            conn.execute('drop index price_history_product_idx;')
+            conn.execute('drop index price_history_observed_idx;')
+            conn.close()
+
+        changes_time, changes, cheaper_time, cheaper = time_queries(since, args.min_diff, args.repeat)
+
+        logger.info(f'indexes {str(indexed):<5}: changed since yesterday {changes_time * 1000:.1f}ms ({changes} changes), '
+                    f'cheaper by >{args.min_diff}% {cheaper_time * 1000:.1f}ms ({cheaper} matches)')
@@ -0,0 +1,51 @@
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+from loguru import logger
+from config import embedder_params
+
+# (label, python code run in a fresh interpreter)
+ENTRY_POINTS = [
+    ('run_parsing.py --help', 'import runpy, sys; sys.argv = ["run_parsing.py", "--help"]; '
+                              'runpy.run_path("run_parsing.py", run_name="__main__")'),
+    ('run_matching.py --help', 'import runpy, sys; sys.argv = ["run_matching.py", "--help"]; '
+                               'runpy.run_path("run_matching.py", run_name="__main__")'),
+    ('parser construction', 'from parsers.ms_parser import MySkinParser; '
+                            'MySkinParser(parser_type="myskin", prod_urls=["https://myskin.md/brendy"])'),
+]
+
+# the deferred cost, paid only by the runs that embed products
+MODEL_LOAD = 'from models.embedder import ProductEmbedder; ProductEmbedder({model!r}, backend={backend!r}).load()'
+
+
+def measure(code: str, repeat: int) -> float:
+    """Return the median wall time in seconds of running the code in a new interpreter."""
+    times = []
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', code], check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        times.append(time.perf_counter() - start)
+
+    return statistics.median(times)
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='Startup time of the entry points.')
+    arg_parser.add_argument('--repeat', type=int, default=5)
+    arg_parser.add_argument('--model', nargs='?', const=embedder_params['model_name'],
+                            help='Also measure the load of the embedding model, the configured one by default.')
+    args = arg_parser.parse_args()
+
+    baseline = measure('pass', args.repeat)
+    logger.info(f'{"python interpreter":24s} {baseline:6.2f}s')
+
+    entry_points = list(ENTRY_POINTS)
+    if args.model:
+        entry_points.append(('embedding model load',
+                             MODEL_LOAD.format(model=args.model, backend=embedder_params['backend'])))
+
+    for label, code in entry_points:
+        logger.info(f'{label:24s} {measure(code, args.repeat):6.2f}s')
@@ -0,0 +1,64 @@
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+import numpy as np
+from loguru import logger
+from config import db_params
+from db.init_db import create_database
+from db.controller import ProductController
+from db.embedding_store import load_store
+from models.similarity import normalize_rows
+
+
+def fill_database(source: str, qty: int, dim: int, rng: np.random.Generator, descr_len: int = 0):
+    """Insert products with random float32 embeddings (and descriptions of `descr_len` characters) into the database."""
+    conn = sqlite3.connect(db_params['db_file'])
+    rows = (
+        (source, f'https://{source}.test/{i}', f'product {i}', f'description {i}'.ljust(descr_len, '.'), 100.0, '',
+         rng.standard_normal(dim).astype(np.float32).tobytes(), rng.standard_normal(dim).astype(np.float32).tobytes())
+        for i in range(qty)
+    )
+    conn.executemany("""
+        insert into products (source, url, name, description, price, image_url, name_emb, descr_emb)
+        values (?, ?, ?, ?, ?, ?, ?, ?);
+    """, rows)
+    conn.commit()
+    conn.close()
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='Load time of the embeddings: products table vs embedding store.')
+    arg_parser.add_argument('--source', help='Use the stored products of the source, synthetic products are used if omitted.')
+    arg_parser.add_argument('--qty', type=int, default=100000, help='Number of synthetic products.')
+    arg_parser.add_argument('--dim', type=int, default=384)
+    args = arg_parser.parse_args()
+
+    source = args.source
+
+    if source is None:
+        source = 'bench'
+        db_params['db_file'] = os.path.join(tempfile.mkdtemp(), 'products.db')
+        create_database()
+        fill_database(source, args.qty, args.dim, np.random.default_rng(42))
+
+    start = time.perf_counter()
+    _, _, products = ProductController.get_products(source)
+    products = sorted((p for p in products if p.name_emb is not None and p.descr_emb is not None), key=lambda p: p.id)
+    matrix = normalize_rows(np.stack([p.name_emb for p in products]))
+    rows_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    _, _, store = load_store(source, rebuild=True)
+    build_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    _, _, store = load_store(source)
+    mmap_time = time.perf_counter() - start
+
+    logger.info(f'{len(store)} products, dim {store.name_emb.shape[1]}')
+    logger.info(f'products table: {rows_time:.3f}s')
+    logger.info(f'store build:    {build_time:.3f}s')
+    logger.info(f'store mmap:     {mmap_time * 1000:.1f}ms ({rows_time / mmap_time:.0f}x faster)')
+    logger.info(f'identical matrices: {np.array_equal(matrix, store.name_emb)}')
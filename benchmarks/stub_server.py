@@ -0,0 +1,65 @@
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Tuple
+from urllib.parse import quote, urlsplit
+import os
+import threading
+import time
+
+
+def page_path(root: str, url: str) -> str:
+    """Return the file storing the recorded page of the url (path and query string)."""
+    parts = urlsplit(url)
+    path = parts.path + (f'?{parts.query}' if parts.query else '')
+
+    return os.path.join(root, quote(path, safe=''))
+
+
+def save_page(root: str, url: str, body: bytes):
+    """Record a page served by the stub server for the url."""
+    os.makedirs(root, exist_ok=True)
+
+    with open(page_path(root, url), 'wb') as f:
+        f.write(body)
+
+
+def start_stub_server(root: str, delay: float = 0.0, port: int = 0) -> Tuple[ThreadingHTTPServer, str]:
+    """
+    Serve the pages recorded in `root` from a local HTTP server running in a background thread.
+
+    Unknown pages are answered with 404.
+
+    Args:
+        root (str): The directory with the recorded pages.
+        delay (float): The delay in seconds added to every response to simulate network latency.
+        port (int): The port to listen on, 0 to pick a free one.
+
+    Returns:
+        Tuple[ThreadingHTTPServer, str]: The server (call `shutdown()` to stop it) and its base url.
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(delay)
+            path = page_path(root, self.path)
+
+            if not os.path.exists(path):
+                self.send_error(404)
+                return
+
+            with open(path, 'rb') as f:
+                body = f.read()
+
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    return server, f'http://127.0.0.1:{server.server_address[1]}'
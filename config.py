@@ -1,9 +1,129 @@
+import os
+
 db_params = {
     # The path to the SQLite database file.
-    'db_file': 'db/products.db'
+    'db_file': 'db/products.db',
+    # PRAGMA statements applied to the connections writing products.
+    'pragmas': {
+        'journal_mode': 'wal',
+        'synchronous': 'normal',
+        # negative values are in KiB
+        'cache_size': -65536,
+        'temp_store': 'memory',
+    },
+    # Number of products saved in one transaction.
+    'chunk_size': 1000,
 }
 
 parser_types = ['moonglow', 'myskin']
 
 # User agent used in HTTP request headers.
-user_agent = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36'
\ No newline at end of file
+user_agent = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36'
+
+embedder_params = {
+    # The SentenceTransformer model used to embed product names and descriptions.
+    'model_name': 'sentence-transformers/all-MiniLM-L6-v2',
+    # Number of texts encoded at once.
+    'batch_size': 32,
+    # The inference backend: 'torch' runs the SentenceTransformer model, 'onnx' runs it exported to ONNX Runtime on CPU
+    # (requires the optional `onnxruntime` and `onnx` packages, the model is exported on first use).
+    'backend': 'torch',
+    # Run the int8 quantized model with the 'onnx' backend: several times faster on CPU, slightly less accurate.
+    'quantize': True,
+    # The directory of the exported ONNX models.
+    'onnx_dir': 'models/onnx',
+}
+
+pipeline_params = {
+    # Number of products embedded together by the streaming pipeline.
+    'embed_batch_size': 64,
+    # Number of products saved in one transaction by the streaming pipeline.
+    'save_batch_size': 500,
+    # Capacity of the queues between the pipeline stages.
+    'queue_size': 1000,
+}
+
+embedding_cache_params = {
+    # Reuse the embeddings of texts that were already embedded by the same model.
+    'enabled': True,
+    # The path to the SQLite database file of the embedding cache.
+    'db_file': 'db/embedding_cache.db',
+    # Maximum number of cached embeddings, the least recently used ones are evicted.
+    'max_entries': 500000,
+}
+
+matcher_params = {
+    # Minimum cosine similarity of the names of matched products.
+    'threshold': 0.9,
+    # Number of candidates kept for every product, printed by `run_matching.py` when above 1.
+    'top_k': 5,
+    # How the matches are chosen among the candidates: 'best', 'mutual' (mutual nearest neighbours)
+    # or 'one_to_one' (every competitor product matched at most once).
+    'mode': 'best',
+    # Assignment of the 'one_to_one' mode: 'greedy' or 'hungarian' (optimal, requires scipy).
+    'assignment': 'greedy',
+    # Compare the products only within the same brand and pack size, see `models/blocking.py`.
+    'blocking': False,
+    # Score the candidates with the hybrid score: the weighted sum of the name embedding, the character
+    # n-gram TF-IDF and the description embedding similarities, see `models/lexical_index.py`.
+    'hybrid': False,
+    # Weights of the similarities of the hybrid score.
+    'weights': {'name': 0.6, 'lexical': 0.25, 'descr': 0.15},
+    # Minimum hybrid score of matched products, used instead of `threshold`.
+    'hybrid_threshold': 0.75,
+    # Number of competitor sources matched in parallel by the processes of `run_matching.py`, 1 for one after another.
+    'workers': os.cpu_count(),
+}
+
+ann_params = {
+    # Backend of the approximate nearest-neighbour index: 'ivf' (NumPy) or 'hnsw' (requires hnswlib).
+    'backend': 'ivf',
+    # Number of IVF lists, None to use ~sqrt(number of products).
+    'nlist': None,
+    # Number of IVF lists scanned per query.
+    'nprobe': 8,
+    # Number of candidates the matcher requests from the index per product.
+    'candidates': 10,
+}
+
+http_params = {
+    # Number of worker threads fetching product pages, 1 to fetch them one by one.
+    'max_workers': 8,
+    # Maximum number of simultaneous requests to the same host.
+    'max_per_host': 4,
+    # Maximum number of requests per second to the same host, 0 for no limit.
+    'rate_limit': 5.0,
+    # Request timeout in seconds.
+    'timeout': 30,
+    # Number of retries of a request failed with a connection error, a timeout, 429 or 5xx status.
+    'max_retries': 3,
+    # Base delay in seconds of the exponential backoff between retries.
+    'backoff_factor': 0.5,
+    # Maximum delay in seconds between retries, also caps the Retry-After header.
+    'max_backoff': 30,
+}
+
+parse_params = {
+    # Number of worker processes extracting the product fields from the fetched pages, 0 to extract them
+    # in the fetching threads.
+    'max_workers': os.cpu_count(),
+}
+
+http_cache_params = {
+    # Store fetched pages and revalidate them with conditional requests.
+    'enabled': True,
+    # The path to the SQLite database file of the response cache.
+    'db_file': 'db/http_cache.db',
+    # Serve pages only from the cache, without touching the network.
+    'offline': False,
+}
+
+crawl_params = {
+    # Number of attempts after which a failing product is no longer retried by --resume.
+    'max_attempts': 3,
+    # Number of days after which an unchanged product page is crawled again by --incremental.
+    'stale_days': 7,
+    # Minimum size of a discovered catalog relative to the stored products of the source for the missing products
+    # to be marked as gone, a smaller catalog points to a failed discovery.
+    'min_catalog_share': 0.5,
+}
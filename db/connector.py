@@ -1,5 +1,6 @@
-from typing import Tuple, List
+from typing import Dict, Tuple, List
 import sqlite3
+import threading
 from sqlite3 import Error
 
 
@@ -42,14 +43,20 @@ class SQLiteConnector:
         >>> db_connector.close()
     """
 
-    def __init__(self, db_file: str):
+    def __init__(self, db_file: str, check_same_thread: bool = True, pragmas: Dict[str, str] = None):
         """
         Initialize the SQLiteConnector with the path to the database file.
 
         Args:
             db_file (str): The path to the SQLite database file.
+            check_same_thread (bool): If False, the connection may be used by several threads,
+                the caller is responsible for serializing the access.
+            pragmas (Dict[str, str], optional): PRAGMA statements applied on connect,
+                e.g. {'journal_mode': 'wal', 'synchronous': 'normal'}.
         """
         self.db_file = db_file
+        self.check_same_thread = check_same_thread
+        self.pragmas = pragmas or {}
         self.connection = None
 
     def connect(self) -> Tuple[int, str]:
@@ -61,7 +68,10 @@ class SQLiteConnector:
                              (0, 'OK') if successful, (1, 'error message') if an error occurs.
         """
         try:
-            self.connection = sqlite3.connect(self.db_file)
+            self.connection = sqlite3.connect(self.db_file, check_same_thread=self.check_same_thread)
+
+            for name, value in self.pragmas.items():
+                self.connection.execute(f'pragma {name} = {value};')
         except Error as e:
             return 1, f'Error "{e}" occurred during database connection.'
 
@@ -95,6 +105,78 @@ class SQLiteConnector:
 
         return 0, 'OK'
 
+    def executemany(self, query: str, params_list: List[Tuple],
+                    chunk_size: int = 1000) -> Tuple[int, str, List[Tuple[int, str]]]:
+        """
+        Execute a modification query for every set of parameters in chunked transactions.
+
+        Every chunk is committed in a single transaction. If a row of the chunk fails, the
+        chunk is rolled back and replayed row by row, so only the failing rows are skipped.
+
+        Args:
+            query (str): The SQL query to execute.
+            params_list (List[Tuple]): The parameters to bind to the SQL query, one tuple per row.
+            chunk_size (int): The number of rows committed in one transaction.
+
+        Returns:
+            Tuple[int, str, List[Tuple[int, str]]]: A tuple containing a status code, a message and the list
+                of failed rows as (index in `params_list`, error message).
+        """
+        failed = []
+
+        try:
+            cursor = self.connection.cursor()
+
+            for start in range(0, len(params_list), chunk_size):
+                chunk = params_list[start:start + chunk_size]
+
+                try:
+                    cursor.executemany(query, chunk)
+                    self.connection.commit()
+                except Error:
+                    self.connection.rollback()
+
+                    for i, params in enumerate(chunk, start):
+                        try:
+                            cursor.execute(query, params)
+                        except Error as e:
+                            failed.append((i, f'The error "{e}" occurred'))
+
+                    self.connection.commit()
+        except Error as e:
+            return 1, f'The error "{e}" occurred', failed
+
+        return 0, 'OK', failed
+
+    def execute_transaction(self, statements: List[Tuple[str, List[Tuple]]]) -> Tuple[int, str]:
+        """
+        Execute several modification queries in a single transaction: either all of them are
+        committed or, if any row fails, none of them.
+
+        Args:
+            statements (List[Tuple[str, List[Tuple]]]): The queries with their parameters, one tuple per row.
+
+        Returns:
+            Tuple[int, str]: A tuple containing a status code and a message.
+                             (0, 'OK') if committed, (1, 'error message') if rolled back.
+        """
+        try:
+            cursor = self.connection.cursor()
+
+            for query, params_list in statements:
+                cursor.executemany(query, params_list)
+
+            self.connection.commit()
+        except Error as e:
+            try:
+                self.connection.rollback()
+            except Error:
+                pass
+
+            return 1, f'The error "{e}" occurred, the transaction is rolled back'
+
+        return 0, 'OK'
+
     def execute_read_query(self, query: str, params: Tuple = None) -> Tuple[int, str, List]:
         """
         Execute a read query against the SQLite database and fetch results.
@@ -114,3 +196,49 @@ class SQLiteConnector:
             return 0, 'OK', result
         except Error as e:
             return 1, f'The error "{e}" occurred', []
+
+
+class SharedConnector(SQLiteConnector):
+    """
+    One connection writing the database for several threads.
+
+    Every query runs under the lock of the connector, so the threads sharing it write one at a time
+    through a single connection instead of competing for the write lock of the database with
+    connections of their own. A call is committed before the call of another thread starts.
+
+    Example:
+        >>> conn = SharedConnector('example.db')
+        >>> status_code, status_message = conn.connect()
+        >>> # from any thread
+        >>> status_code, status_message = conn.execute_query(query, params)
+    """
+
+    def __init__(self, db_file: str, pragmas: Dict[str, str] = None):
+        """
+        Args:
+            db_file (str): The path to the SQLite database file.
+            pragmas (Dict[str, str], optional): PRAGMA statements applied on connect.
+        """
+        super().__init__(db_file, check_same_thread=False, pragmas=pragmas)
+        self.lock = threading.RLock()
+
+    def close(self):
+        with self.lock:
+            super().close()
+
+    def execute_query(self, query: str, params: Tuple = None) -> Tuple[int, str]:
+        with self.lock:
+            return super().execute_query(query, params)
+
+    def executemany(self, query: str, params_list: List[Tuple],
+                    chunk_size: int = 1000) -> Tuple[int, str, List[Tuple[int, str]]]:
+        with self.lock:
+            return super().executemany(query, params_list, chunk_size)
+
+    def execute_transaction(self, statements: List[Tuple[str, List[Tuple]]]) -> Tuple[int, str]:
+        with self.lock:
+            return super().execute_transaction(statements)
+
+    def execute_read_query(self, query: str, params: Tuple = None) -> Tuple[int, str, List]:
+        with self.lock:
+            return super().execute_read_query(query, params)
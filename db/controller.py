@@ -1,63 +1,137 @@
-from typing import Tuple, List, Dict
-from parsers.base import Product
+from typing import Tuple, List, Dict, Iterable, Set
+from datetime import datetime
+from parsers.product import Product
 from config import db_params
 from db.connector import SQLiteConnector
 import numpy as np
+import hashlib
 
 
 class ProductController:
     """A class to handle products and their embeddings from a database.
 
     Methods:
-        get_products: Retrieves products from the database for a given source.
+        get_products: Retrieves products from the database for a given source, optionally only some columns.
+        load_descriptions: Reads the descriptions of products retrieved without them.
         get_embeddings: Retrieves embeddings for products from the database for a given source.
+        get_fingerprint: Computes a fingerprint of the products stored for a given source.
+        get_crawl_info: Retrieves the stored price and crawl time of the products of a given source.
+        get_changed_ids: Retrieves the ids of the products saved after a given time.
+        mark_seen: Marks products as seen in the catalog without recrawling them.
+        mark_gone: Marks products as no longer present in the catalog.
+
+    Products marked as gone are kept in the database but not returned by the getters.
     """
+    # the columns of the products table read into Product attributes, in the order of the table
+    columns = ('id', 'source', 'url', 'name', 'description', 'price', 'image_url', 'brand', 'name_emb', 'descr_emb')
+
     @staticmethod
-    def get_products(source: str) -> Tuple[int, str, List[Product]]:
+    def get_products(source: str, columns: Iterable[str] = None) -> Tuple[int, str, List[Product]]:
         """Retrieve products from the database for a given source.
 
+        Only the requested columns are read, the other attributes keep their defaults, except
+        the description, which is loaded on first access. The id, source and url of the
+        products are always read.
+
         Args:
             source (str): The source of the products.
+            columns (Iterable[str], optional): The columns to read, all of `ProductController.columns` if omitted.
 
         Returns:
             Tuple[int, str, List[Product]]: A tuple containing status code, status message,
                 and a list of Product objects.
+
+        Example:
+            # enough to print matches, the embeddings are taken from the embedding store
+            ProductController.get_products('myskin', columns=('name', 'price', 'image_url'))
         """
+        columns = ProductController.columns if columns is None else tuple(columns)
+        unknown = set(columns) - set(ProductController.columns)
+
+        if unknown:
+            return 1, f'Unknown product columns: {sorted(unknown)}', []
+
+        columns = [c for c in ProductController.columns if c in columns or c in ('id', 'source', 'url')]
+
         conn = SQLiteConnector(db_params['db_file'])
         status_code, status_message = conn.connect()
 
         if status_code != 0:
             return status_code, status_message, []
 
-        query = 'select * from products where source = ?;'
+        # in the order of the embedding store, so the matcher uses the rows of the store without copying them
+        query = f"select {', '.join(columns)} from products where source = ? and gone_at is null order by id;"
         params = (source,)
 
         status_code, status_message, result = conn.execute_read_query(query, params)
+        conn.close()
 
         if status_code != 0:
             return status_code, status_message, []
 
         products = []
+        lazy_description = 'description' not in columns
 
-        for id, _, url, name, descr, price, image_url, name_emb, descr_emb in result:
-            product = Product(
-                source=source,
-                url=url,
-            )
+        for row in result:
+            values = dict(zip(columns, row))
+            product = Product(source=source, url=values.pop('url'))
 
-            product.id=id
-            product.name=name
-            product.description=descr
-            product.price=price
-            product.image_url=image_url
-            product.name_emb=np.frombuffer(name_emb, dtype=np.float32)
-            product.descr_emb=np.frombuffer(descr_emb, dtype=np.float32)
+            for name in ('name_emb', 'descr_emb'):
+                if values.get(name) is not None:
+                    values[name] = np.frombuffer(values[name], dtype=np.float32)
+
+            if values.get('brand', '') is None:
+                values['brand'] = ''
+
+            for name, value in values.items():
+                setattr(product, name, value)
+
+            if lazy_description:
+                product.description = None
 
             products.append(product)
 
+        return 0, 'OK', products
+
+    @staticmethod
+    def load_descriptions(products: List[Product]) -> Tuple[int, str]:
+        """Read the descriptions of products retrieved without them, with one query per 500 products.
+
+        Args:
+            products (List[Product]): The products, the ones with an id of 0 (not saved) are skipped.
+
+        Returns:
+            Tuple[int, str]: A tuple containing status code and status message.
+        """
+        products = [p for p in products if p.id]
+
+        conn = SQLiteConnector(db_params['db_file'])
+        status_code, status_message = conn.connect()
+
+        if status_code != 0:
+            return status_code, status_message
+
+        descriptions = {}
+
+        # sqlite limits the number of the parameters of a query
+        for start in range(0, len(products), 500):
+            ids = [p.id for p in products[start:start + 500]]
+            query = f"select id, description from products where id in ({', '.join('?' * len(ids))});"
+
+            status_code, status_message, result = conn.execute_read_query(query, tuple(ids))
+
+            if status_code != 0:
+                conn.close()
+                return status_code, status_message
+
+            descriptions.update(result)
+
         conn.close()
 
-        return 0, 'OK', products
+        for product in products:
+            product.description = descriptions.get(product.id, "")
+
+        return 0, 'OK'
 
     @staticmethod
     def get_embeddings(source: str) -> Tuple[int, str, List[Dict]]:
@@ -76,7 +150,7 @@ class ProductController:
         if status_code != 0:
             return status_code, status_message, []
 
-        query = 'select id, name_emb, descr_emb from products where source = ?;'
+        query = 'select id, name_emb, descr_emb from products where source = ? and gone_at is null;'
         params = (source,)
 
         status_code, status_message, result = conn.execute_read_query(query, params)
@@ -90,8 +164,8 @@ class ProductController:
             embedding = {
                 'source': source,
                 'product_id': id,
-                'name_emb': np.frombuffer(name_emb, dtype=np.float32),
-                'descr_emb': np.frombuffer(descr_emb, dtype=np.float32)
+                'name_emb': None if name_emb is None else np.frombuffer(name_emb, dtype=np.float32),
+                'descr_emb': None if descr_emb is None else np.frombuffer(descr_emb, dtype=np.float32)
             }
 
             embeddings.append(embedding)
@@ -99,3 +173,147 @@ class ProductController:
         conn.close()
 
         return 0, 'OK', embeddings
+
+    @staticmethod
+    def get_fingerprint(source: str) -> Tuple[int, str, str]:
+        """Compute a fingerprint of the products stored for a given source.
+
+        Every save updates the crawl time of the product, so the fingerprint of the ids and crawl times
+        of the products still in the catalog changes whenever the products of the source change.
+
+        Args:
+            source (str): The source of the products.
+
+        Returns:
+            Tuple[int, str, str]: A tuple containing status code, status message and the fingerprint.
+        """
+        conn = SQLiteConnector(db_params['db_file'])
+        status_code, status_message = conn.connect()
+
+        if status_code != 0:
+            return status_code, status_message, ''
+
+        query = 'select id, crawled_at from products where source = ? and gone_at is null order by id;'
+        params = (source,)
+
+        status_code, status_message, result = conn.execute_read_query(query, params)
+        conn.close()
+
+        if status_code != 0:
+            return status_code, status_message, ''
+
+        digest = hashlib.sha1(','.join(f'{id}:{crawled_at}' for id, crawled_at in result).encode()).hexdigest()
+
+        return 0, 'OK', digest
+
+    @staticmethod
+    def get_crawl_info(source: str) -> Tuple[int, str, Dict[str, Tuple[float, str, str]]]:
+        """Retrieve the stored price and crawl times of the products of a given source.
+
+        Args:
+            source (str): The source of the products.
+
+        Returns:
+            Tuple[int, str, Dict[str, Tuple[float, str, str]]]: A tuple containing status code, status message
+                and a dictionary mapping product urls to (price, crawled_at, gone_at).
+        """
+        conn = SQLiteConnector(db_params['db_file'])
+        status_code, status_message = conn.connect()
+
+        if status_code != 0:
+            return status_code, status_message, {}
+
+        query = 'select url, price, crawled_at, gone_at from products where source = ?;'
+        params = (source,)
+
+        status_code, status_message, result = conn.execute_read_query(query, params)
+        conn.close()
+
+        if status_code != 0:
+            return status_code, status_message, {}
+
+        return 0, 'OK', {url: (price, crawled_at, gone_at) for url, price, crawled_at, gone_at in result}
+
+    @staticmethod
+    def get_changed_ids(source: str, since: str) -> Tuple[int, str, Set[int]]:
+        """Retrieve the ids of the products of a given source saved (added or re-embedded) after a time.
+
+        Args:
+            source (str): The source of the products.
+            since (str): The time in ISO format.
+
+        Returns:
+            Tuple[int, str, Set[int]]: A tuple containing status code, status message and the product ids.
+        """
+        conn = SQLiteConnector(db_params['db_file'])
+        status_code, status_message = conn.connect()
+
+        if status_code != 0:
+            return status_code, status_message, set()
+
+        query = 'select id from products where source = ? and gone_at is null and crawled_at > ?;'
+        params = (source, since)
+
+        status_code, status_message, result = conn.execute_read_query(query, params)
+        conn.close()
+
+        if status_code != 0:
+            return status_code, status_message, set()
+
+        return 0, 'OK', {id for id, in result}
+
+    @staticmethod
+    def _update_urls(query: str, source: str, urls: Iterable[str], conn: SQLiteConnector = None) -> Tuple[int, str]:
+        """Run an update query taking (timestamp, source, url) for every url, through `conn` if given
+        (left open) or through a connection of its own."""
+        own = conn is None
+
+        if own:
+            conn = SQLiteConnector(db_params['db_file'], pragmas=db_params['pragmas'])
+            status_code, status_message = conn.connect()
+
+            if status_code != 0:
+                return status_code, status_message
+
+        now = datetime.now().isoformat()
+        status_code, status_message, failed = conn.executemany(query, [(now, source, url) for url in urls])
+
+        if own:
+            conn.close()
+
+        if status_code == 0 and failed:
+            return 1, f'{len(failed)} products were not updated, first error: {failed[0][1]}'
+
+        return status_code, status_message
+
+    @staticmethod
+    def mark_seen(source: str, urls: Iterable[str], conn: SQLiteConnector = None) -> Tuple[int, str]:
+        """Mark products as seen in the catalog without recrawling their pages.
+
+        Args:
+            source (str): The source of the products.
+            urls (Iterable[str]): The urls of the products.
+            conn (SQLiteConnector, optional): An open connection to write through, e.g. the shared writer of a crawl.
+
+        Returns:
+            Tuple[int, str]: A tuple containing status code and status message.
+        """
+        query = 'update products set seen_at = ?, gone_at = null where source = ? and url = ?;'
+
+        return ProductController._update_urls(query, source, urls, conn)
+
+    @staticmethod
+    def mark_gone(source: str, urls: Iterable[str], conn: SQLiteConnector = None) -> Tuple[int, str]:
+        """Mark products as no longer present in the catalog. The products are not deleted.
+
+        Args:
+            source (str): The source of the products.
+            urls (Iterable[str]): The urls of the products.
+            conn (SQLiteConnector, optional): An open connection to write through, e.g. the shared writer of a crawl.
+
+        Returns:
+            Tuple[int, str]: A tuple containing status code and status message.
+        """
+        query = 'update products set gone_at = ? where source = ? and url = ? and gone_at is null;'
+
+        return ProductController._update_urls(query, source, urls, conn)
@@ -0,0 +1,201 @@
+from datetime import datetime
+from typing import Dict, List, Tuple
+from config import db_params
+from db.connector import SharedConnector
+from parsers.product import Product
+
+
+class CrawlState:
+    """
+    Tracks the stage of every product url of a crawl in the `crawl_state` table.
+
+    A crawl starts with all the catalog products in the `discovered` stage. Every product then
+    moves through `fetched`, `parsed`, `embedded` and `saved`; a failing product keeps the
+    stage it reached together with the error and the number of attempts, so an interrupted
+    or partially failed crawl can be resumed with only the unfinished products.
+
+    The state is safe to update from several threads, its queries run one at a time on one connection.
+
+    Example:
+        state = CrawlState('myskin')
+        state.connect()
+        state.start(parser.products)
+        ...
+        products = state.get_unfinished(max_attempts=3)
+    """
+
+    DISCOVERED = 'discovered'
+    FETCHED = 'fetched'
+    PARSED = 'parsed'
+    EMBEDDED = 'embedded'
+    SAVED = 'saved'
+
+    def __init__(self, source: str, conn: SharedConnector = None):
+        """
+        Args:
+            source (str): The source of the crawled products.
+            conn (SharedConnector, optional): A connection shared with the states of other sources and
+                the other writers of the crawl, opened and closed by its owner.
+        """
+        self.source = source
+        self.shared = conn is not None
+        self.conn = conn or SharedConnector(db_params['db_file'], pragmas=db_params['pragmas'])
+
+    def connect(self) -> Tuple[int, str]:
+        if self.shared:
+            return 0, 'OK'
+
+        return self.conn.connect()
+
+    def close(self):
+        if not self.shared:
+            self.conn.close()
+
+    def start(self, products: List[Product]) -> Tuple[int, str]:
+        """
+        Start a new crawl of the source with the discovered products, discarding the previous state.
+        The previous state is replaced in one transaction, it is kept if the new one cannot be written.
+
+        Args:
+            products (List[Product]): The products found in the catalog.
+
+        Returns:
+            Tuple[int, str]: A tuple containing a status code and a message.
+        """
+        now = datetime.now().isoformat()
+
+        query = """
+            insert into crawl_state (source, url, name, price, brand, stage, attempts, updated_at)
+            values (?, ?, ?, ?, ?, ?, 0, ?);
+        """
+        params = [(self.source, p.url, p.name, p.price, p.brand or None, self.DISCOVERED, now) for p in products]
+
+        # one transaction: a failed start keeps the previous state, which can still be resumed
+        return self.conn.execute_transaction([
+            ('delete from crawl_state where source = ?;', [(self.source,)]),
+            (query, params),
+        ])
+
+    def mark(self, products: List[Product], stage: str, error: str = None, attempt: bool = False) -> Tuple[int, str]:
+        """
+        Move the products to a stage.
+
+        Args:
+            products (List[Product]): The products.
+            stage (str): The stage the products reached.
+            error (str, optional): The error that stopped the products at this stage.
+            attempt (bool): Count a new processing attempt for the products.
+
+        Returns:
+            Tuple[int, str]: A tuple containing a status code and a message, an error if any
+                of the products could not be moved.
+        """
+        query = """
+            update crawl_state
+            set stage = ?, last_error = ?, attempts = attempts + ?, updated_at = ?
+            where source = ? and url = ?;
+        """
+        now = datetime.now().isoformat()
+        params = [(stage, error, int(attempt), now, self.source, p.url) for p in products]
+
+        status_code, status_message, failed = self.conn.executemany(query, params)
+
+        if status_code == 0 and failed:
+            return 1, f'{len(failed)} products were not moved to `{stage}`, first error: {failed[0][1]}'
+
+        return status_code, status_message
+
+    def get_unfinished(self, max_attempts: int) -> Tuple[int, str, List[Product]]:
+        """
+        Return the products of the last crawl that were not saved and have attempts left.
+
+        Args:
+            max_attempts (int): The number of attempts after which a product is given up.
+
+        Returns:
+            Tuple[int, str, List[Product]]: A tuple containing status code, status message and the products.
+        """
+        query = """
+            select url, name, price, brand from crawl_state
+            where source = ? and stage != ? and attempts < ?
+            order by rowid;
+        """
+
+        status_code, status_message, result = self.conn.execute_read_query(
+            query, (self.source, self.SAVED, max_attempts)
+        )
+
+        if status_code != 0:
+            return status_code, status_message, []
+
+        products = []
+
+        for url, name, price, brand in result:
+            product = Product(source=self.source, url=url, name=name or '', price=price)
+            product.brand = brand or ''
+            products.append(product)
+
+        return 0, 'OK', products
+
+    def get_summary(self) -> Tuple[int, str, List[Tuple[str, int]]]:
+        """
+        Return the number of products per stage.
+
+        Returns:
+            Tuple[int, str, List[Tuple[str, int]]]: A tuple containing status code, status message
+                and the (stage, number of products) pairs.
+        """
+        return self.conn.execute_read_query(
+            'select stage, count(*) from crawl_state where source = ? group by stage;', (self.source,)
+        )
+
+
+class SourceStates:
+    """
+    The crawl states of several sources crawled together, behind the `mark` interface of one state:
+    the products are marked in the state of their source.
+
+    The states share one connection, the single writer of the crawl: the save stage of the crawl pipeline
+    and the catalog comparison of the parsers (`select_products_to_crawl`) write through it too, so the
+    products, their crawl states and their seen and gone marks are written one at a time by one connection.
+
+    Example:
+        states = SourceStates(['moonglow', 'myskin'])
+        states.connect()
+        states['myskin'].start(parser.products)
+        states.mark(products, CrawlState.PARSED)
+    """
+
+    def __init__(self, sources: List[str]):
+        """
+        Args:
+            sources (List[str]): The crawled sources.
+        """
+        self.conn = SharedConnector(db_params['db_file'], pragmas=db_params['pragmas'])
+        self.states: Dict[str, CrawlState] = {source: CrawlState(source, self.conn) for source in sources}
+
+    def __getitem__(self, source: str) -> CrawlState:
+        return self.states[source]
+
+    def connect(self) -> Tuple[int, str]:
+        return self.conn.connect()
+
+    def close(self):
+        self.conn.close()
+
+    def mark(self, products: List[Product], stage: str, error: str = None, attempt: bool = False) -> Tuple[int, str]:
+        """Move the products to a stage in the states of their sources, see `CrawlState.mark`."""
+        by_source = {}
+        for product in products:
+            by_source.setdefault(product.source, []).append(product)
+
+        result = 0, 'OK'
+
+        # a failing source does not keep the products of the other sources in their previous stage
+        for source, source_products in by_source.items():
+            status_code, status_message = self.states[source].mark(source_products, stage, error, attempt)
+
+            if status_code != 0 and result[0] == 0:
+                result = status_code, f'[{source}] {status_message}'
+
+        return result
@@ -0,0 +1,205 @@
+from typing import Optional, Tuple
+import json
+import os
+import numpy as np
+from loguru import logger
+from config import db_params
+from db.connector import SQLiteConnector
+from db.controller import ProductController
+from models.similarity import normalize_rows
+
+
+def get_store_path(source: str, column: str, extension: str = '.npy') -> str:
+    """Return the path of a column of the embedding store of a source, next to the database file."""
+    base = os.path.splitext(db_params['db_file'])[0]
+
+    return f'{base}.{source}.{column}{extension}'
+
+
+class EmbeddingStore:
+    """
+    Columnar store of the embeddings of the products of a source.
+
+    The name and description embeddings of the products are kept in two contiguous float32
+    `.npy` matrices next to the database file, with the ids and urls of the products in the
+    same row order (sorted by id). The rows are L2-normalized, so a matrix product gives
+    the cosine similarities directly. The matrices are memory-mapped when loaded, so a whole
+    catalog is available without copying it or creating an array per product.
+
+    Only the products with both embeddings are stored. The store remembers the fingerprint of
+    the products of the source and is rebuilt by `load_store` when they change.
+
+    Example:
+        status_code, status_message, store = load_store('myskin')
+        similarities = store.name_emb @ query
+        product_ids = store.ids[np.argsort(-similarities)[:10]]
+    """
+
+    columns = ('ids', 'urls', 'name_emb', 'descr_emb')
+
+    def __init__(self, source: str, ids: np.ndarray, urls: np.ndarray, name_emb: np.ndarray,
+                 descr_emb: np.ndarray, fingerprint: str = ''):
+        """
+        Args:
+            source (str): The source of the products.
+            ids (np.ndarray): The (n,) sorted product ids.
+            urls (np.ndarray): The (n,) product urls.
+            name_emb (np.ndarray): The (n, dim) normalized name embeddings.
+            descr_emb (np.ndarray): The (n, dim) normalized description embeddings.
+            fingerprint (str): The fingerprint of the products the store was built from.
+        """
+        self.source = source
+        self.ids = ids
+        self.urls = urls
+        self.name_emb = name_emb
+        self.descr_emb = descr_emb
+        self.fingerprint = fingerprint
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def positions(self, ids: np.ndarray) -> np.ndarray:
+        """
+        Return the rows of the products, -1 for the products missing from the store.
+
+        Args:
+            ids (np.ndarray): The product ids.
+
+        Returns:
+            np.ndarray: The (len(ids),) row numbers.
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+
+        if len(self.ids) == 0:
+            return np.full(len(ids), -1, dtype=np.int64)
+
+        rows = np.minimum(np.searchsorted(self.ids, ids), len(self.ids) - 1)
+
+        return np.where(self.ids[rows] == ids, rows, -1)
+
+    @classmethod
+    def build(cls, source: str) -> Tuple[int, str, Optional['EmbeddingStore']]:
+        """
+        Build the store of a source from the `products` table.
+
+        The embeddings are read with a single query and converted to matrices at once,
+        without creating an array per product.
+
+        Args:
+            source (str): The source of the products.
+
+        Returns:
+            Tuple[int, str, Optional[EmbeddingStore]]: A tuple containing status code, status message and the store.
+        """
+        status_code, status_message, fingerprint = ProductController.get_fingerprint(source)
+        if status_code != 0:
+            return status_code, status_message, None
+
+        conn = SQLiteConnector(db_params['db_file'])
+        status_code, status_message = conn.connect()
+
+        if status_code != 0:
+            return status_code, status_message, None
+
+        query = """
+            select id, url, name_emb, descr_emb from products
+            where source = ? and gone_at is null and name_emb is not null and descr_emb is not null
+            order by id;
+        """
+        status_code, status_message, result = conn.execute_read_query(query, (source,))
+        conn.close()
+
+        if status_code != 0:
+            return status_code, status_message, None
+
+        # every embedding of a source comes from the same model, skip the rows of another size
+        size = len(result[0][2]) if result else 0
+        result = [row for row in result if len(row[2]) == size and len(row[3]) == size]
+        dim = size // 4
+
+        ids = np.array([row[0] for row in result], dtype=np.int64)
+        urls = np.array([row[1] for row in result], dtype=str)
+        name_emb = np.frombuffer(b''.join(row[2] for row in result), dtype=np.float32).reshape(len(result), dim)
+        descr_emb = np.frombuffer(b''.join(row[3] for row in result), dtype=np.float32).reshape(len(result), dim)
+
+        return 0, 'OK', cls(source, ids, urls, normalize_rows(name_emb), normalize_rows(descr_emb), fingerprint)
+
+    def save(self):
+        """
+        Save the store. Every column is written to a temporary file first and renamed,
+        the metadata with the fingerprint is written last.
+        """
+        for column in self.columns:
+            path = get_store_path(self.source, column)
+
+            with open(f'{path}.tmp', 'wb') as f:
+                np.save(f, getattr(self, column))
+
+            os.replace(f'{path}.tmp', path)
+
+        meta_path = get_store_path(self.source, 'meta', '.json')
+
+        with open(f'{meta_path}.tmp', 'w') as f:
+            json.dump({'fingerprint': self.fingerprint, 'size': len(self)}, f)
+
+        os.replace(f'{meta_path}.tmp', meta_path)
+
+    @classmethod
+    def load(cls, source: str) -> 'EmbeddingStore':
+        """
+        Load the store of a source, memory-mapping its columns.
+
+        Raises:
+            OSError: If the store does not exist.
+            ValueError: If the columns do not match the metadata.
+        """
+        with open(get_store_path(source, 'meta', '.json')) as f:
+            meta = json.load(f)
+
+        columns = {column: np.load(get_store_path(source, column), mmap_mode='r') for column in cls.columns}
+
+        if any(len(values) != meta['size'] for values in columns.values()):
+            raise ValueError('the columns of the store do not match its metadata')
+
+        return cls(source, fingerprint=meta['fingerprint'], **columns)
+
+
+def load_store(source: str, rebuild: bool = False) -> Tuple[int, str, Optional[EmbeddingStore]]:
+    """
+    Load the embedding store of a source, building it when the products of the source changed.
+
+    Args:
+        source (str): The source of the products.
+        rebuild (bool): Rebuild the store even if it is up to date.
+
+    Returns:
+        Tuple[int, str, Optional[EmbeddingStore]]: A tuple containing status code, status message and the store.
+    """
+    status_code, status_message, fingerprint = ProductController.get_fingerprint(source)
+    if status_code != 0:
+        return status_code, status_message, None
+
+    if not rebuild:
+        try:
+            store = EmbeddingStore.load(source)
+
+            if store.fingerprint == fingerprint:
+                return 0, 'OK', store
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f'Unable to load the embedding store of source "{source}": {e}')
+
+    logger.info(f'Building the embedding store of source "{source}" ...')
+
+    status_code, status_message, store = EmbeddingStore.build(source)
+    if status_code != 0:
+        return status_code, status_message, None
+
+    try:
+        store.save()
+    except Exception as e:
+        logger.exception(f'Error while saving the embedding store of source "{source}": {e}')
+        return 1, f'Error "{e}" occurred while saving the embedding store.', None
+
+    return 0, 'OK', EmbeddingStore.load(source)
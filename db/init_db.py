@@ -2,6 +2,29 @@ import sqlite3
 from sqlite3 import Error
 from config import db_params
 
+# columns added to existing tables after their creation, applied by `create_database` if missing
+migrations = {
+    'products': {
+        'crawled_at': 'text',
+        'seen_at': 'text',
+        'gone_at': 'text',
+        'brand': 'text',
+    },
+    'crawl_state': {
+        'brand': 'text',
+    },
+}
+
+
+def add_missing_columns(cursor: sqlite3.Cursor, table: str, columns: dict):
+    """Add the columns missing from an existing table."""
+    existing = {row[1] for row in cursor.execute(f'pragma table_info({table});')}
+
+    for name, definition in columns.items():
+        if name not in existing:
+            cursor.execute(f'alter table {table} add column {name} {definition};')
+
+
 def create_database() -> int:
     conn = sqlite3.connect(db_params['db_file'])
 
@@ -17,11 +40,84 @@ def create_database() -> int:
             price real not null,
             image_url text not null,
             name_emb blob,
-            descr_emb blob
+            descr_emb blob,
+            crawled_at text,
+            seen_at text,
+            gone_at text,
+            brand text
+        );
+    """
+
+    query2 = "create unique index if not exists products_source_idx on products (source, url);"
+
+    query3 = """
+        create table if not exists crawl_state (
+            source text not null,
+            url text not null,
+            name text,
+            price real,
+            brand text,
+            stage text not null,
+            attempts integer not null default 0,
+            last_error text,
+            updated_at text not null,
+            primary key (source, url)
+        );
+    """
+
+    query4 = """
+        create table if not exists matches (
+            product_a integer not null,
+            product_b integer not null,
+            source_a text not null,
+            source_b text not null,
+            similarity real not null,
+            model text not null,
+            computed_at text not null,
+            primary key (product_a, source_b, model)
+        );
+    """
+
+    query5 = "create index if not exists matches_sources_idx on matches (source_a, source_b, model, computed_at);"
+
+    query6 = """
+        create table if not exists price_history (
+            product_id integer not null,
+            price real not null,
+            observed_at text not null
         );
     """
 
-    query2 = "create unique index products_source_idx on products (source, url);"
+    # the history of a product, and the price before a change
+    query7 = "create index if not exists price_history_product_idx on price_history (product_id, observed_at);"
+
+    # the price changes since a time
+    query8 = "create index if not exists price_history_observed_idx on price_history (observed_at, product_id);"
+
+    # the first price of a product and every price change are appended to the history at the crawl time
+    query9 = """
+        create trigger if not exists products_price_insert after insert on products
+        begin
+            insert into price_history (product_id, price, observed_at)
+            values (new.id, new.price, coalesce(new.crawled_at, strftime('%Y-%m-%dT%H:%M:%S', 'now', 'localtime')));
+        end;
+    """
+
+    query10 = """
+        create trigger if not exists products_price_update after update of price on products
+        when old.price is not new.price
+        begin
+            insert into price_history (product_id, price, observed_at)
+            values (new.id, new.price, coalesce(new.crawled_at, strftime('%Y-%m-%dT%H:%M:%S', 'now', 'localtime')));
+        end;
+    """
+
+    # the current prices of the products saved before the history was created
+    query11 = """
+        insert into price_history (product_id, price, observed_at)
+        select id, price, coalesce(crawled_at, strftime('%Y-%m-%dT%H:%M:%S', 'now', 'localtime')) from products
+        where not exists (select 1 from price_history where product_id = products.id);
+    """
 
     try:
         # create product table
@@ -30,6 +126,25 @@ def create_database() -> int:
         # add uq index on source/url columns
         cursor.execute(query2)
 
+        # create crawl state table
+        cursor.execute(query3)
+
+        # create the table of the matches of the products of two sources
+        cursor.execute(query4)
+        cursor.execute(query5)
+
+        # add the columns introduced after the tables were created
+        for table, columns in migrations.items():
+            add_missing_columns(cursor, table, columns)
+
+        # create the price history table with its triggers and fill it with the current prices
+        cursor.execute(query6)
+        cursor.execute(query7)
+        cursor.execute(query8)
+        cursor.execute(query9)
+        cursor.execute(query10)
+        cursor.execute(query11)
+
         conn.commit()
         print('The database was created successfully.')
 
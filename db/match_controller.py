@@ -0,0 +1,124 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+from config import db_params
+from db.connector import SQLiteConnector
+from parsers.product import Product
+
+
+class MatchController:
+    """A class to store the matches of the products of two sources in the `matches` table.
+
+    The matches of a pair of sources are kept per settings key (the `model` column holds the embedding
+    model and the matcher settings, see `models.matcher.match_key`), every product of the first source has
+    at most one match per key. All the matches written by a run carry the start time of the run, so the
+    latest `computed_at` is the time of the last run.
+
+    Methods:
+        get_last_run: Retrieves the start time of the last run that stored matches.
+        get_matches: Retrieves the stored matches.
+        save_matches: Replaces the stored matches of products of the first source.
+    """
+    @staticmethod
+    def get_last_run(source_a: str, source_b: str, model: str) -> Tuple[int, str, Optional[str]]:
+        """Retrieve the start time of the last run that stored matches of two sources.
+
+        Args:
+            source_a (str): The source of the matched products.
+            source_b (str): The source the matches were searched in.
+            model (str): The key of the settings the matches were computed with, see `models.matcher.match_key`.
+
+        Returns:
+            Tuple[int, str, Optional[str]]: A tuple containing status code, status message and the time
+                in ISO format, None if no matches are stored.
+        """
+        conn = SQLiteConnector(db_params['db_file'])
+        status_code, status_message = conn.connect()
+
+        if status_code != 0:
+            return status_code, status_message, None
+
+        query = 'select max(computed_at) from matches where source_a = ? and source_b = ? and model = ?;'
+        params = (source_a, source_b, model)
+
+        status_code, status_message, result = conn.execute_read_query(query, params)
+        conn.close()
+
+        if status_code != 0:
+            return status_code, status_message, None
+
+        return 0, 'OK', result[0][0] if result else None
+
+    @staticmethod
+    def get_matches(source_a: str, source_b: str, model: str) -> Tuple[int, str, Dict[int, Tuple[int, float]]]:
+        """Retrieve the stored matches of two sources.
+
+        Args:
+            source_a (str): The source of the matched products.
+            source_b (str): The source the matches were searched in.
+            model (str): The key of the settings the matches were computed with, see `models.matcher.match_key`.
+
+        Returns:
+            Tuple[int, str, Dict[int, Tuple[int, float]]]: A tuple containing status code, status message
+                and a dictionary mapping the product ids of source A to (product id of source B, similarity).
+        """
+        conn = SQLiteConnector(db_params['db_file'])
+        status_code, status_message = conn.connect()
+
+        if status_code != 0:
+            return status_code, status_message, {}
+
+        query = """
+            select product_a, product_b, similarity from matches
+            where source_a = ? and source_b = ? and model = ?;
+        """
+        params = (source_a, source_b, model)
+
+        status_code, status_message, result = conn.execute_read_query(query, params)
+        conn.close()
+
+        if status_code != 0:
+            return status_code, status_message, {}
+
+        return 0, 'OK', {product_a: (product_b, similarity) for product_a, product_b, similarity in result}
+
+    @staticmethod
+    def save_matches(source_a: str, source_b: str, model: str, matches: List[Tuple[Product, Product, float]],
+                     computed_at: str, product_ids_a: Iterable[int] = None) -> Tuple[int, str]:
+        """Replace the stored matches of products of source A in one transaction: if any match
+        cannot be written, the stored matches are left unchanged.
+
+        Args:
+            source_a (str): The source of the matched products.
+            source_b (str): The source the matches were searched in.
+            model (str): The key of the settings the matches were computed with, see `models.matcher.match_key`.
+            matches (List[Tuple[Product, Product, float]]): The new matches.
+            computed_at (str): The start time of the run in ISO format.
+            product_ids_a (Iterable[int], optional): The products of source A whose stored matches are
+                deleted before the new matches are written, all of them if omitted.
+
+        Returns:
+            Tuple[int, str]: A tuple containing status code and status message.
+        """
+        conn = SQLiteConnector(db_params['db_file'], pragmas=db_params['pragmas'])
+        status_code, status_message = conn.connect()
+
+        if status_code != 0:
+            return status_code, status_message
+
+        if product_ids_a is None:
+            delete = ('delete from matches where source_a = ? and source_b = ? and model = ?;',
+                      [(source_a, source_b, model)])
+        else:
+            delete = ('delete from matches where product_a = ? and source_b = ? and model = ?;',
+                      [(id, source_b, model) for id in product_ids_a])
+
+        query = """
+            insert or replace into matches (product_a, product_b, source_a, source_b, similarity, model, computed_at)
+            values (?, ?, ?, ?, ?, ?, ?);
+        """
+        params = [(a.id, b.id, source_a, source_b, float(sim), model, computed_at) for a, b, sim in matches]
+
+        # one transaction: if a match cannot be written, the stored matches are kept for the next run
+        status_code, status_message = conn.execute_transaction([delete, (query, params)])
+        conn.close()
+
+        return status_code, status_message
@@ -0,0 +1,120 @@
+from typing import List, Tuple
+from config import db_params
+from db.connector import SQLiteConnector
+
+
+class PriceController:
+    """A class to query the `price_history` table and the current prices of matched products.
+
+    The history is append-only: the triggers of the `products` table add the first price of every
+    product and every price change, observed at the crawl time of the product.
+
+    Methods:
+        get_history: Retrieves the price history of a product.
+        get_price_changes: Retrieves the price changes of the products of a source since a time.
+        get_cheaper_competitors: Retrieves the matches whose competitor price is lower by more than a share.
+    """
+    @staticmethod
+    def get_history(product_id: int) -> Tuple[int, str, List[Tuple[float, str]]]:
+        """Retrieve the price history of a product.
+
+        Args:
+            product_id (int): The id of the product.
+
+        Returns:
+            Tuple[int, str, List[Tuple[float, str]]]: A tuple containing status code, status message
+                and the (price, observed_at) of the product, oldest first.
+        """
+        conn = SQLiteConnector(db_params['db_file'])
+        status_code, status_message = conn.connect()
+
+        if status_code != 0:
+            return status_code, status_message, []
+
+        query = 'select price, observed_at from price_history where product_id = ? order by observed_at;'
+        params = (product_id,)
+
+        status_code, status_message, result = conn.execute_read_query(query, params)
+        conn.close()
+
+        return status_code, status_message, result
+
+    @staticmethod
+    def get_price_changes(source: str, since: str) -> Tuple[int, str, List[Tuple[int, str, float, float, str]]]:
+        """Retrieve the price changes of the products of a source observed after a time.
+
+        The changes are found with the index on the observation time, and the previous price of every
+        change with the index on the product, so the query reads only the recent part of the history.
+
+        Args:
+            source (str): The source of the products.
+            since (str): The time in ISO format.
+
+        Returns:
+            Tuple[int, str, List[Tuple[int, str, float, float, str]]]: A tuple containing status code, status message
+                and the (product id, url, previous price, price, observed_at) of the changes, oldest first.
+                The previous price is None for the products first seen after `since`.
+        """
+        conn = SQLiteConnector(db_params['db_file'])
+        status_code, status_message = conn.connect()
+
+        if status_code != 0:
+            return status_code, status_message, []
+
+        query = """
+            select h.product_id, p.url,
+                (select prev.price from price_history prev
+                 where prev.product_id = h.product_id and prev.observed_at < h.observed_at
+                 order by prev.observed_at desc limit 1),
+                h.price, h.observed_at
+            from price_history h
+            join products p on p.id = h.product_id
+            where h.observed_at > ? and p.source = ?
+            order by h.observed_at;
+        """
+        params = (since, source)
+
+        status_code, status_message, result = conn.execute_read_query(query, params)
+        conn.close()
+
+        return status_code, status_message, result
+
+    @staticmethod
+    def get_cheaper_competitors(source_a: str, source_b: str, model: str,
+                                min_diff: float) -> Tuple[int, str, List[Tuple[int, str, float, int, str, float, float]]]:
+        """Retrieve the stored matches whose product of source B is cheaper than the product of source A
+        by more than `min_diff` percent, at the current prices.
+
+        Args:
+            source_a (str): The source of the matched products.
+            source_b (str): The source the matches were searched in.
+            model (str): The key of the settings the matches were computed with, see `models.matcher.match_key`.
+            min_diff (float): The minimum price difference in percent of the price of source A.
+
+        Returns:
+            Tuple[int, str, List[Tuple[int, str, float, int, str, float, float]]]: A tuple containing status code,
+                status message and the (product id A, url A, price A, product id B, url B, price B, difference
+                in percent) of the matches, largest difference first.
+        """
+        conn = SQLiteConnector(db_params['db_file'])
+        status_code, status_message = conn.connect()
+
+        if status_code != 0:
+            return status_code, status_message, []
+
+        query = """
+            select a.id, a.url, a.price, b.id, b.url, b.price, round((a.price - b.price) * 100.0 / a.price, 2) as diff
+            from matches m
+            join products a on a.id = m.product_a
+            join products b on b.id = m.product_b
+            where m.source_a = ? and m.source_b = ? and m.model = ?
+                and a.gone_at is null and b.gone_at is null and a.price > 0
+                and b.price < a.price * (1 - ? / 100.0)
+            order by diff desc;
+        """
+        params = (source_a, source_b, model, min_diff)
+
+        status_code, status_message, result = conn.execute_read_query(query, params)
+        conn.close()
+
+        return status_code, status_message, result
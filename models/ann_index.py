@@ -0,0 +1,289 @@
+import json
+import os
+from typing import Tuple, Optional
+import numpy as np
+from loguru import logger
+from config import ann_params, db_params
+from db.controller import ProductController
+from db.embedding_store import load_store
+from models.similarity import normalize_rows, blocked_top_k
+
+
+class ANNIndex:
+    """
+    Base class for approximate nearest-neighbour indexes over normalized embeddings.
+
+    The index stores product ids next to the vectors, so search results refer to
+    products directly. Similarities are cosine similarities.
+
+    Methods:
+    - build(self, ids: np.ndarray, matrix: np.ndarray): Builds the index.
+    - search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]: Returns the top-k ids and similarities.
+    - save(self, path: str): Saves the index to disk.
+    - load(cls, path: str) -> ANNIndex: Loads the index from disk.
+    """
+
+    extension = ''
+
+    def __init__(self):
+        self.fingerprint = ''
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+    def build(self, ids: np.ndarray, matrix: np.ndarray):
+        raise NotImplementedError
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Search the index.
+
+        Args:
+            queries (np.ndarray): A (n, dim) matrix of query embeddings.
+            k (int): The number of neighbours to return.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: (n, k) arrays with the product ids (-1 for empty slots)
+                and the cosine similarities, sorted by decreasing similarity.
+        """
+        raise NotImplementedError
+
+    def save(self, path: str):
+        raise NotImplementedError
+
+    @classmethod
+    def load(cls, path: str) -> 'ANNIndex':
+        raise NotImplementedError
+
+
+class IVFIndex(ANNIndex):
+    """
+    Inverted file index implemented in NumPy.
+
+    The vectors are clustered with spherical k-means into `nlist` lists, and a query
+    scans only the `nprobe` lists whose centroids are the most similar to it.
+    """
+
+    extension = '.ivf.npz'
+
+    def __init__(self, nlist: Optional[int] = None, nprobe: int = 8, n_iter: int = 20, seed: int = 0):
+        super().__init__()
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.n_iter = n_iter
+        self.seed = seed
+        self.centroids = np.zeros((0, 0), dtype=np.float32)
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.vectors = np.zeros((0, 0), dtype=np.float32)
+        # list l owns the rows offsets[l]:offsets[l + 1] of `ids` and `vectors`
+        self.offsets = np.zeros(1, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _train(self, matrix: np.ndarray, nlist: int) -> np.ndarray:
+        """Train the centroids with spherical k-means on a sample of the vectors."""
+        rng = np.random.default_rng(self.seed)
+        sample_size = min(len(matrix), nlist * 256)
+        sample = matrix[rng.choice(len(matrix), sample_size, replace=False)]
+        centroids = sample[rng.choice(sample_size, nlist, replace=False)].copy()
+
+        for _ in range(self.n_iter):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, sample)
+            empty = ~sums.any(axis=1)
+            # re-seed empty lists with random sample points
+            sums[empty] = sample[rng.choice(sample_size, int(empty.sum()))]
+            centroids = normalize_rows(sums)
+
+        return centroids
+
+    def build(self, ids: np.ndarray, matrix: np.ndarray):
+        matrix = normalize_rows(matrix)
+        ids = np.asarray(ids, dtype=np.int64)
+        nlist = self.nlist or max(1, int(np.sqrt(len(matrix))))
+        nlist = min(nlist, len(matrix))
+
+        self.centroids = self._train(matrix, nlist)
+        assignment, _ = blocked_top_k(matrix, self.centroids, k=1)
+        assignment = assignment[:, 0]
+
+        order = np.argsort(assignment, kind='stable')
+        self.ids = ids[order]
+        self.vectors = matrix[order]
+        self.offsets = np.concatenate(([0], np.cumsum(np.bincount(assignment, minlength=nlist))))
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        queries = normalize_rows(np.atleast_2d(queries))
+        nprobe = min(self.nprobe, len(self.centroids))
+        probes, _ = blocked_top_k(queries, self.centroids, k=nprobe)
+
+        cand_ids = np.full((len(queries), nprobe, k), -1, dtype=np.int64)
+        cand_sims = np.full((len(queries), nprobe, k), -np.inf, dtype=np.float32)
+
+        # every list is multiplied once against all the queries probing it
+        for lst in np.unique(probes):
+            rows, slots = np.nonzero(probes == lst)
+            start, end = self.offsets[lst], self.offsets[lst + 1]
+
+            if start == end:
+                continue
+
+            top, sims = blocked_top_k(queries[rows], self.vectors[start:end], k=k)
+            cand_ids[rows, slots, :top.shape[1]] = self.ids[start:end][top]
+            cand_sims[rows, slots, :top.shape[1]] = sims
+
+        cand_ids = cand_ids.reshape(len(queries), -1)
+        cand_sims = cand_sims.reshape(len(queries), -1)
+        order = np.argsort(-cand_sims, axis=1, kind='stable')[:, :k]
+
+        return np.take_along_axis(cand_ids, order, axis=1), np.take_along_axis(cand_sims, order, axis=1)
+
+    def save(self, path: str):
+        np.savez(path, centroids=self.centroids, ids=self.ids, vectors=self.vectors, offsets=self.offsets,
+                 nprobe=self.nprobe, fingerprint=self.fingerprint)
+
+    @classmethod
+    def load(cls, path: str) -> 'IVFIndex':
+        data = np.load(path)
+        index = cls(nprobe=int(data['nprobe']))
+        index.centroids = data['centroids']
+        index.ids = data['ids']
+        index.vectors = data['vectors']
+        index.offsets = data['offsets']
+        index.nlist = len(index.centroids)
+        index.fingerprint = str(data['fingerprint'])
+
+        return index
+
+
+class HNSWIndex(ANNIndex):
+    """
+    HNSW graph index backed by the optional `hnswlib` package.
+    """
+
+    extension = '.hnsw.bin'
+
+    def __init__(self, m: int = 16, ef_construction: int = 200, ef_search: int = 64):
+        super().__init__()
+        self.m = m
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self.index = None
+
+    def __len__(self) -> int:
+        return 0 if self.index is None else self.index.get_current_count()
+
+    def build(self, ids: np.ndarray, matrix: np.ndarray):
+        import hnswlib
+
+        matrix = normalize_rows(matrix)
+        self.index = hnswlib.Index(space='ip', dim=matrix.shape[1])
+        self.index.init_index(max_elements=len(matrix), ef_construction=self.ef_construction, M=self.m)
+        self.index.add_items(matrix, np.asarray(ids, dtype=np.int64))
+        self.index.set_ef(self.ef_search)
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        k = min(k, len(self))
+        self.index.set_ef(max(self.ef_search, k))
+        labels, distances = self.index.knn_query(normalize_rows(np.atleast_2d(queries)), k=k)
+
+        # hnswlib returns 1 - inner product for the 'ip' space
+        return labels.astype(np.int64), (1.0 - distances).astype(np.float32)
+
+    def save(self, path: str):
+        self.index.save_index(path)
+
+        with open(f'{path}.json', 'w') as f:
+            json.dump({'dim': self.index.dim, 'ef_search': self.ef_search, 'fingerprint': self.fingerprint}, f)
+
+    @classmethod
+    def load(cls, path: str) -> 'HNSWIndex':
+        import hnswlib
+
+        with open(f'{path}.json') as f:
+            meta = json.load(f)
+
+        index = cls(ef_search=meta['ef_search'])
+        index.index = hnswlib.Index(space='ip', dim=meta['dim'])
+        index.index.load_index(path)
+        index.index.set_ef(index.ef_search)
+        index.fingerprint = meta['fingerprint']
+
+        return index
+
+
+index_types = {
+    'ivf': IVFIndex,
+    'hnsw': HNSWIndex,
+}
+
+
+def get_index_path(source: str, backend: str) -> str:
+    """Return the path of the index of a source, next to the database file."""
+    db_file = db_params['db_file']
+    base = os.path.splitext(db_file)[0]
+
+    return f'{base}.{source}{index_types[backend].extension}'
+
+
+def create_index(backend: str) -> ANNIndex:
+    """Create an empty index of the given backend with the parameters from config."""
+    if backend == 'ivf':
+        return IVFIndex(nlist=ann_params['nlist'], nprobe=ann_params['nprobe'])
+
+    return index_types[backend]()
+
+
+def get_index(source: str, backend: str = None, rebuild: bool = False) -> Tuple[int, str, Optional[ANNIndex]]:
+    """
+    Load the index of a source, building it when the products of the source changed.
+
+    Args:
+        source (str): The source of the products.
+        backend (str, optional): The index backend, defaults to `ann_params['backend']`.
+        rebuild (bool): Rebuild the index even if it is up to date.
+
+    Returns:
+        Tuple[int, str, Optional[ANNIndex]]: A tuple containing status code, status message and the index.
+    """
+    backend = backend or ann_params['backend']
+
+    if backend not in index_types:
+        return 1, f'Unknown index backend "{backend}", must be one of: {list(index_types)}', None
+
+    status_code, status_message, fingerprint = ProductController.get_fingerprint(source)
+    if status_code != 0:
+        return status_code, status_message, None
+
+    path = get_index_path(source, backend)
+
+    if not rebuild and os.path.exists(path):
+        try:
+            index = index_types[backend].load(path)
+
+            if index.fingerprint == fingerprint:
+                return 0, 'OK', index
+        except Exception as e:
+            logger.warning(f'Unable to load the index "{path}": {e}')
+
+    status_code, status_message, store = load_store(source)
+    if status_code != 0:
+        return status_code, status_message, None
+
+    if len(store) == 0:
+        return 1, f'No embeddings for source "{source}"', None
+
+    logger.info(f'Building the "{backend}" index for source "{source}" ({len(store)} products) ...')
+
+    try:
+        index = create_index(backend)
+        index.build(store.ids, store.name_emb)
+        index.fingerprint = store.fingerprint
+        index.save(path)
+    except Exception as e:
+        logger.exception(f'Error while building the index for source "{source}": {e}')
+        return 1, f'Error "{e}" occurred while building the index.', None
+
+    return 0, 'OK', index
@@ -0,0 +1,124 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+import re
+from parsers.product import Product
+
+# units of the pack sizes and the base unit and factor they are converted to
+volume_units = {
+    'ml': ('ml', 1.0), 'мл': ('ml', 1.0),
+    'l': ('ml', 1000.0), 'л': ('ml', 1000.0),
+    'g': ('g', 1.0), 'gr': ('g', 1.0), 'г': ('g', 1.0), 'гр': ('g', 1.0),
+    'kg': ('g', 1000.0), 'кг': ('g', 1000.0),
+    'pcs': ('pcs', 1.0), 'шт': ('pcs', 1.0),
+}
+
+volume_pattern = re.compile(
+    r'(\d+(?:[.,]\d+)?)\s*(' + '|'.join(sorted(volume_units, key=len, reverse=True)) + r')\.?(?![\w])',
+    re.IGNORECASE,
+)
+token_pattern = re.compile(r'\w+')
+
+
+def normalize_brand(brand: str) -> str:
+    """Return the brand in lower case with the words separated by single spaces and no punctuation."""
+    return ' '.join(token_pattern.findall((brand or '').lower()))
+
+
+def extract_volume(name: str) -> Optional[Tuple[float, str]]:
+    """
+    Extract the pack size from a product name, for example "50 ml" or "1,5 л".
+
+    Args:
+        name (str): The name of the product.
+
+    Returns:
+        Optional[Tuple[float, str]]: The size converted to the base unit ('ml', 'g' or 'pcs') and the unit,
+            or None if the name has no size.
+    """
+    match = volume_pattern.search(name or '')
+
+    if match is None:
+        return None
+
+    unit, factor = volume_units[match.group(2).lower()]
+
+    return round(float(match.group(1).replace(',', '.')) * factor, 3), unit
+
+
+class BrandDictionary:
+    """
+    Finds the brands of products in their names.
+
+    The dictionary is built from known brands (the brands captured by the parsers), and the
+    longest known brand whose words appear consecutively in the name is the brand of a product.
+
+    Example:
+        brands = BrandDictionary(['La Roche-Posay', 'CeraVe'])
+        brands.find('CeraVe Moisturizing Cream 50 ml')  # 'cerave'
+    """
+
+    def __init__(self, brands: Iterable[str] = ()):
+        """
+        Args:
+            brands (Iterable[str]): The known brands.
+        """
+        self.brands = set()
+        self.max_words = 0
+
+        for brand in brands:
+            self.add(brand)
+
+    def add(self, brand: str):
+        brand = normalize_brand(brand)
+
+        if brand:
+            self.brands.add(brand)
+            self.max_words = max(self.max_words, len(brand.split()))
+
+    def find(self, name: str) -> Optional[str]:
+        """
+        Return the normalized brand found in a product name, or None.
+
+        Args:
+            name (str): The name of the product.
+        """
+        words = normalize_brand(name).split()
+
+        for size in range(min(self.max_words, len(words)), 0, -1):
+            for start in range(len(words) - size + 1):
+                brand = ' '.join(words[start:start + size])
+
+                if brand in self.brands:
+                    return brand
+
+        return None
+
+
+def get_block_keys(products: List[Product],
+                   brands: BrandDictionary) -> Tuple[List[Optional[str]], List[Optional[Tuple[float, str]]]]:
+    """
+    Return the brand and the pack size of every product. The brand captured by the parser
+    is used when present, otherwise the brand is searched in the name.
+
+    Args:
+        products (List[Product]): The products.
+        brands (BrandDictionary): The known brands.
+
+    Returns:
+        Tuple[List[Optional[str]], List[Optional[Tuple[float, str]]]]: The normalized brands and the pack
+            sizes of the products, None when unknown.
+    """
+    product_brands = [normalize_brand(p.brand) or brands.find(p.name) for p in products]
+    volumes = [extract_volume(p.name) for p in products]
+
+    return product_brands, volumes
+
+
+def group_rows(keys: List[Optional[str]]) -> Dict[str, List[int]]:
+    """Return the rows of every key, the rows without a key are omitted."""
+    groups = {}
+
+    for row, key in enumerate(keys):
+        if key is not None:
+            groups.setdefault(key, []).append(row)
+
+    return groups
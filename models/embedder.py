@@ -1,33 +1,124 @@
-from sentence_transformers import SentenceTransformer
-import torch
+from typing import List, Optional
+from tqdm import tqdm
 import numpy as np
+import threading
 from loguru import logger
+from models.embedding_cache import EmbeddingCache
+from models.onnx_encoder import OnnxEncoder, export_onnx, get_model_dir
+import os
 
 class ProductEmbedder:
     """
     A class for embedding product descriptions using SentenceTransformer.
 
+    The model runs either in PyTorch (`torch` backend) or exported to ONNX Runtime (`onnx` backend),
+    optionally quantized to int8 for faster CPU inference. The model and its heavy dependencies
+    (torch, sentence_transformers, onnxruntime) are loaded on the first embedding, so creating
+    an embedder is cheap.
+
     Example:
         embedder = ProductEmbedder()
         description = "This is a product description."
         embedding = embedder.embed_description(description)
+        embeddings = embedder.embed_batch(["First product.", "Second product."])
     """
 
-    def __init__(self, model_name: str = 'cointegrated/rubert-tiny2', use_gpu: bool = False):
+    def __init__(self, model_name: str = 'cointegrated/rubert-tiny2', use_gpu: bool = False,
+                 cache: EmbeddingCache = None, backend: str = 'torch', quantize: bool = True,
+                 onnx_dir: str = 'models/onnx'):
         """
         Initialize the ProductEmbedder with a SentenceTransformer model.
 
         Args:
             model_name (str): The name of the SentenceTransformer model to use. Defaults to 'cointegrated/rubert-tiny2'.
             use_gpu (bool): Flag indicating whether to use GPU if available.
+            cache (EmbeddingCache, optional): The persistent embedding cache looked up by `embed_batch`.
+            backend (str): 'torch' to run the SentenceTransformer model, 'onnx' to run it with ONNX Runtime on CPU.
+            quantize (bool): Run the int8 quantized model with the 'onnx' backend.
+            onnx_dir (str): The directory of the exported ONNX models, a missing model is exported on first use.
+        """
+        self.model_name = model_name
+        self.cache = cache
+        self.backend = backend
+        self.use_gpu = use_gpu
+        self.quantize = quantize
+        self.onnx_dir = onnx_dir
+        self._model = None
+        self._load_error = None
+        self._lock = threading.Lock()
+
+        if backend not in ('torch', 'onnx'):
+            raise ValueError(f"Unknown embedder backend '{backend}', expected 'torch' or 'onnx'.")
+
+        # the embeddings of the backends differ slightly, so they are cached separately
+        self.cache_key = model_name
+        if backend == 'onnx':
+            self.cache_key = f"{model_name}@onnx-{'int8' if quantize else 'fp32'}"
+
+    @property
+    def model(self):
+        """
+        The model, loaded on first access.
+
+        Raises:
+            RuntimeError: If the model cannot be loaded.
+        """
+        if self._model is None:
+            with self._lock:
+                # a model that failed to load is not loaded again on every batch
+                if self._load_error is not None:
+                    raise RuntimeError(self._load_error)
+
+                if self._model is None:
+                    try:
+                        self._model = self._load_model()
+                    except RuntimeError as e:
+                        self._load_error = str(e)
+                        raise
+
+        return self._model
+
+    def load(self) -> 'ProductEmbedder':
         """
+        Load the model now instead of on the first embedding.
+
+        Returns:
+            ProductEmbedder: The embedder.
+        """
+        _ = self.model
+
+        return self
+
+    def _loaded_model(self):
+        """Return the model, None if it cannot be loaded (the error is logged when the load fails)."""
         try:
-            device = "cuda" if torch.cuda.is_available() and use_gpu else "cpu"
-            self.model = SentenceTransformer(model_name, device=device)
+            return self.model
+        except RuntimeError:
+            return None
+
+    def _load_model(self):
+        device = "cpu"
+
+        try:
+            if self.backend == 'onnx':
+                model_dir = get_model_dir(self.onnx_dir, self.model_name)
+
+                if not os.path.exists(OnnxEncoder.model_path(model_dir, self.quantize)):
+                    export_onnx(self.model_name, model_dir)
+
+                return OnnxEncoder(model_dir, quantized=self.quantize)
+
+            import torch
+            from sentence_transformers import SentenceTransformer
+
+            device = "cuda" if torch.cuda.is_available() and self.use_gpu else "cpu"
+
+            return SentenceTransformer(self.model_name, device=device)
         except Exception as e:
-            self.model = None
-            logger.exception(f'Error loading "{model_name}" model: {e}')
-            raise RuntimeError(f"Failed to load the model '{self.model_name}' on the specified device '{device}'")
+            logger.exception(f'Error loading "{self.model_name}" model: {e}')
+            raise RuntimeError(
+                f"Failed to load the model '{self.model_name}' with the '{self.backend}' backend on '{device}'"
+            )
 
     def embed_description(self, description) -> np.ndarray:
         """
@@ -40,8 +131,66 @@ class ProductEmbedder:
             np.ndarray or None: The embedded representation of the description,
                                  or None if the model is not loaded.
         """
-        if self.model:
-            embedding = self.model.encode(description)
-            return embedding
+        model = self._loaded_model()
+
+        if model is not None:
+            return model.encode(description)
 
         return None
+
+    def embed_batch(self, texts: List[str], batch_size: int = 64, sort_by_length: bool = True,
+                    show_progress: bool = False) -> Optional[np.ndarray]:
+        """
+        Embed many texts at once.
+
+        The texts found in the cache are not encoded again, and the model is not loaded if all
+        of them are cached. The remaining texts are sorted by length and split into batches of
+        similar length, so every batch carries little padding, and each batch is encoded with
+        a single model call. The embeddings match the ones of `embed_description` up to float rounding
+        (the padding of a batch changes the order of the sums), which `benchmarks/bench_embedder.py`
+        checks against a tolerance.
+
+        Args:
+            texts (List[str]): The texts to embed.
+            batch_size (int): The number of texts encoded at once.
+            sort_by_length (bool): Group texts of similar length into the same batch.
+            show_progress (bool): Show a progress bar over the batches.
+
+        Returns:
+            np.ndarray or None: A (len(texts), dim) float32 array with the embeddings in the order
+                                of the texts (an empty (0, 0) array for no texts, without loading
+                                the model), or None if the model cannot be loaded.
+        """
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+
+        cached = {} if self.cache is None else self.cache.get_many(self.cache_key, texts)
+        missing = np.array([i for i in range(len(texts)) if i not in cached], dtype=np.int64)
+        model = None
+
+        if len(missing) == 0:
+            dim = len(next(iter(cached.values())))
+        elif (model := self._loaded_model()) is None:
+            return None
+        else:
+            dim = model.get_sentence_embedding_dimension()
+
+        embeddings = np.zeros((len(texts), dim), dtype=np.float32)
+
+        for i, embedding in cached.items():
+            embeddings[i] = embedding
+
+        order = missing
+        if sort_by_length:
+            order = missing[np.argsort([-len(texts[i]) for i in missing], kind="stable")]
+
+        batches = [order[i:i + batch_size] for i in range(0, len(order), batch_size)]
+
+        for batch in tqdm(batches, disable=not show_progress):
+            batch_texts = [texts[i] for i in batch]
+            embeddings[batch] = model.encode(batch_texts, batch_size=len(batch))
+
+            if self.cache is not None:
+                self.cache.put_many(self.cache_key, batch_texts, embeddings[batch])
+
+        return embeddings
@@ -0,0 +1,174 @@
+from typing import Dict, List, Tuple
+import hashlib
+import threading
+import time
+import unicodedata
+import numpy as np
+from db.connector import SQLiteConnector
+
+
+class EmbeddingCache:
+    """
+    Persistent cache of embeddings keyed by (model name, normalized text hash).
+
+    The least recently used entries are evicted when the cache grows over `max_entries`.
+    The cache counts hits and misses and is safe to use from several threads.
+
+    Example:
+        cache = EmbeddingCache('db/embedding_cache.db')
+        status_code, status_message = cache.connect()
+        found = cache.get_many('cointegrated/rubert-tiny2', ['Product name'])
+    """
+
+    # number of rows per multi-row statement, keeps the number of bound parameters below SQLite limits
+    chunk_size = 200
+
+    def __init__(self, db_file: str, max_entries: int = 500000):
+        """
+        Args:
+            db_file (str): The path to the SQLite database file of the cache.
+            max_entries (int): The maximum number of cached embeddings.
+        """
+        self.conn = SQLiteConnector(db_file, check_same_thread=False)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def connect(self) -> Tuple[int, str]:
+        """
+        Open the cache database, creating the table if needed.
+
+        Returns:
+            Tuple[int, str]: A tuple containing a status code and a message.
+        """
+        status_code, status_message = self.conn.connect()
+
+        if status_code != 0:
+            return status_code, status_message
+
+        status_code, status_message = self.conn.execute_query("""
+            create table if not exists embeddings (
+                model text not null,
+                text_hash text not null,
+                embedding blob not null,
+                last_used real not null,
+                primary key (model, text_hash)
+            );
+        """)
+
+        if status_code != 0:
+            return status_code, status_message
+
+        return self.conn.execute_query("create index if not exists embeddings_last_used_idx on embeddings (last_used);")
+
+    def close(self):
+        self.conn.close()
+
+    @staticmethod
+    def hash_text(text: str) -> str:
+        """Return the hash of the text with normalized unicode and whitespace."""
+        normalized = " ".join(unicodedata.normalize("NFC", text or "").split())
+
+        return hashlib.sha256(normalized.encode()).hexdigest()
+
+    def get_many(self, model: str, texts: List[str]) -> Dict[int, np.ndarray]:
+        """
+        Look up the embeddings of the texts.
+
+        Args:
+            model (str): The name of the model that computed the embeddings.
+            texts (List[str]): The texts to look up.
+
+        Returns:
+            Dict[int, np.ndarray]: The cached embeddings by position in `texts`.
+        """
+        hashes = [self.hash_text(text) for text in texts]
+        unique = list(dict.fromkeys(hashes))
+        cached = {}
+        now = time.time()
+
+        with self._lock:
+            for i in range(0, len(unique), self.chunk_size):
+                chunk = unique[i:i + self.chunk_size]
+                placeholders = ",".join("?" * len(chunk))
+
+                status_code, _, result = self.conn.execute_read_query(
+                    f"select text_hash, embedding from embeddings where model = ? and text_hash in ({placeholders});",
+                    (model, *chunk),
+                )
+
+                if status_code != 0:
+                    continue
+
+                for text_hash, embedding in result:
+                    cached[text_hash] = np.frombuffer(embedding, dtype=np.float32)
+
+                self.conn.execute_query(
+                    f"update embeddings set last_used = ? where model = ? and text_hash in ({placeholders});",
+                    (now, model, *chunk),
+                )
+
+            found = {i: cached[text_hash] for i, text_hash in enumerate(hashes) if text_hash in cached}
+            self.hits += len(found)
+            self.misses += len(texts) - len(found)
+
+        return found
+
+    def put_many(self, model: str, texts: List[str], embeddings: np.ndarray) -> Tuple[int, str]:
+        """
+        Store the embeddings of the texts and evict the least recently used entries over the limit.
+
+        Args:
+            model (str): The name of the model that computed the embeddings.
+            texts (List[str]): The embedded texts.
+            embeddings (np.ndarray): A (len(texts), dim) array with the embeddings.
+
+        Returns:
+            Tuple[int, str]: A tuple containing a status code and a message.
+        """
+        now = time.time()
+        rows = {
+            self.hash_text(text): np.asarray(embedding, dtype=np.float32).tobytes()
+            for text, embedding in zip(texts, embeddings)
+        }
+        rows = list(rows.items())
+
+        with self._lock:
+            for i in range(0, len(rows), self.chunk_size):
+                chunk = rows[i:i + self.chunk_size]
+                placeholders = ",".join("(?, ?, ?, ?)" for _ in chunk)
+                params = [value for text_hash, embedding in chunk for value in (model, text_hash, embedding, now)]
+
+                status_code, status_message = self.conn.execute_query(
+                    f"insert or replace into embeddings (model, text_hash, embedding, last_used) values {placeholders};",
+                    tuple(params),
+                )
+
+                if status_code != 0:
+                    return status_code, status_message
+
+            return self._evict()
+
+    def _evict(self) -> Tuple[int, str]:
+        """Delete the least recently used entries over `max_entries`."""
+        status_code, status_message, result = self.conn.execute_read_query("select count(*) from embeddings;")
+
+        if status_code != 0:
+            return status_code, status_message
+
+        excess = result[0][0] - self.max_entries
+        if excess <= 0:
+            return 0, "OK"
+
+        return self.conn.execute_query(
+            "delete from embeddings where rowid in (select rowid from embeddings order by last_used limit ?);",
+            (excess,),
+        )
+
+    def stats(self) -> str:
+        """Return the hit/miss statistics as a human-readable string."""
+        total = self.hits + self.misses
+        ratio = self.hits / total if total else 0.0
+
+        return f"{self.hits} hits, {self.misses} misses ({ratio:.1%} hit ratio)"
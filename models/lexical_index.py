@@ -0,0 +1,301 @@
+from typing import Dict, List, Optional, Tuple
+from collections import Counter
+import re
+import numpy as np
+from loguru import logger
+from db.controller import ProductController
+from db.embedding_store import get_store_path
+
+word_pattern = re.compile(r'\w+')
+
+# sparse rows of TF-IDF vectors: (indptr, indices, data) in CSR layout
+SparseRows = Tuple[np.ndarray, np.ndarray, np.ndarray]
+
+
+def expand_rows(rows: SparseRows, selected: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Gather the entries of selected sparse rows without a Python loop.
+
+    Args:
+        rows (SparseRows): The sparse rows.
+        selected (np.ndarray): The rows to gather, may repeat.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray, np.ndarray]: For every entry, the position of its row in `selected`,
+            its column and its value.
+    """
+    indptr, indices, data = rows
+    lengths = indptr[selected + 1] - indptr[selected]
+    owners = np.repeat(np.arange(len(selected)), lengths)
+    positions = np.repeat(indptr[selected] - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+
+    return owners, indices[positions], data[positions]
+
+
+class LexicalIndex:
+    """
+    Character n-gram TF-IDF inverted index over product names.
+
+    Every word of a name is padded with spaces and split into character n-grams, so inflections,
+    typos and transliterations still share most features, while different numbers ("SPF 30" vs
+    "SPF 50", "50 ml" vs "200 ml") produce different features. The names are weighted with sublinear
+    TF-IDF and L2-normalized, so the dot product of two names is their cosine similarity.
+
+    The postings of every feature are stored contiguously (CSC layout). A search reads only the
+    postings of the rare features of the queries (document frequency up to `max_df`), so its cost
+    depends on the length of these postings, not on the size of the catalog.
+
+    Example:
+        index = LexicalIndex()
+        index.build(ids, names)
+        queries = index.transform(['La Roche-Posay Anthelios SPF 50 50 ml'])
+        query_rows, doc_rows, scores = index.search(queries, k=10)
+    """
+
+    def __init__(self, n: int = 3, max_df: float = 0.1):
+        """
+        Args:
+            n (int): The length of the character n-grams.
+            max_df (float): The share of the names above which a feature is too common to retrieve candidates.
+        """
+        self.n = n
+        self.max_df = max_df
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.vocabulary: Dict[str, int] = {}
+        self.idf = np.zeros(0, dtype=np.float32)
+        self.df = np.zeros(0, dtype=np.int64)
+        self.docs: SparseRows = (np.zeros(1, dtype=np.int64), np.zeros(0, dtype=np.int64),
+                                 np.zeros(0, dtype=np.float32))
+        self.postings: SparseRows = self.docs
+        self.fingerprint = ''
+
+    def features(self, text: str) -> Counter:
+        """Return the character n-grams of the words of a text with their counts."""
+        features = Counter()
+
+        for word in word_pattern.findall((text or '').lower()):
+            word = f' {word} '
+            features.update(word[i:i + self.n] for i in range(max(1, len(word) - self.n + 1)))
+
+        return features
+
+    def build(self, ids: np.ndarray, names: List[str]):
+        """
+        Build the index.
+
+        Args:
+            ids (np.ndarray): The (n,) sorted product ids.
+            names (List[str]): The names of the products.
+        """
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.vocabulary = {}
+        rows, columns, counts = [], [], []
+
+        for row, name in enumerate(names):
+            for feature, count in self.features(name).items():
+                rows.append(row)
+                columns.append(self.vocabulary.setdefault(feature, len(self.vocabulary)))
+                counts.append(count)
+
+        rows = np.array(rows, dtype=np.int64)
+        columns = np.array(columns, dtype=np.int64)
+
+        self.df = np.bincount(columns, minlength=len(self.vocabulary))
+        self.idf = (np.log((1 + len(names)) / (1 + self.df)) + 1).astype(np.float32)
+
+        weights = (1 + np.log(np.array(counts, dtype=np.float32))) * self.idf[columns]
+        norms = np.sqrt(np.bincount(rows, weights ** 2, minlength=len(names)))
+        weights = (weights / np.where(norms > 0, norms, 1)[rows]).astype(np.float32)
+
+        indptr = np.concatenate([[0], np.cumsum(np.bincount(rows, minlength=len(names)))])
+        self.docs = (indptr, columns, weights)
+
+        order = np.argsort(columns, kind='stable')
+        postings_ptr = np.concatenate([[0], np.cumsum(self.df)])
+        self.postings = (postings_ptr, rows[order], weights[order])
+
+    def transform(self, names: List[str]) -> SparseRows:
+        """
+        Return the normalized TF-IDF vectors of names with the vocabulary of the index. The features missing
+        from the vocabulary count in the norm of a vector with the highest weight but cannot match.
+
+        Args:
+            names (List[str]): The names.
+
+        Returns:
+            SparseRows: The vectors of the names.
+        """
+        unknown_idf = np.log(1 + len(self.ids)) + 1
+        rows, columns, counts = [], [], []
+
+        for row, name in enumerate(names):
+            for feature, count in self.features(name).items():
+                rows.append(row)
+                columns.append(self.vocabulary.get(feature, -1))
+                counts.append(count)
+
+        rows = np.array(rows, dtype=np.int64)
+        columns = np.array(columns, dtype=np.int64)
+        known = columns >= 0
+
+        idf = np.full(len(columns), unknown_idf, dtype=np.float32)
+        idf[known] = self.idf[columns[known]]
+        weights = (1 + np.log(np.array(counts, dtype=np.float32))) * idf
+        norms = np.sqrt(np.bincount(rows, weights ** 2, minlength=len(names)))
+        weights = (weights / np.where(norms > 0, norms, 1)[rows]).astype(np.float32)
+
+        indptr = np.concatenate([[0], np.cumsum(np.bincount(rows[known], minlength=len(names)))])
+
+        return indptr.astype(np.int64), columns[known], weights[known]
+
+    def search(self, queries: SparseRows, k: int = 10,
+               block_size: int = 1024) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Find the k names of the index sharing the most weight of rare features with every query.
+
+        The scores are computed over the rare features only and serve to select candidates,
+        `pair_scores` gives the exact similarities.
+
+        Args:
+            queries (SparseRows): The vectors of the queries from `transform`.
+            k (int): The number of candidates of every query.
+            block_size (int): The number of queries processed at once.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray, np.ndarray]: The query rows, the rows of the index and the scores
+                of the candidates, grouped by query with the best candidate first.
+        """
+        rare = self.df <= max(1, self.max_df * len(self.ids))
+        n_docs = max(1, len(self.ids))
+        results = []
+
+        for start in range(0, len(queries[0]) - 1, block_size):
+            selected = np.arange(start, min(start + block_size, len(queries[0]) - 1))
+            owners, columns, weights = expand_rows(queries, selected)
+            keep = rare[columns]
+            owners, columns, weights = owners[keep], columns[keep], weights[keep]
+
+            # the postings of all the features of the block at once
+            posting_owners, doc_rows, posting_values = expand_rows(self.postings, columns)
+            query_rows = owners[posting_owners]
+            scores = weights[posting_owners] * posting_values
+
+            keys, inverse = np.unique(query_rows * n_docs + doc_rows, return_inverse=True)
+            scores = np.bincount(inverse, scores).astype(np.float32)
+            query_rows, doc_rows = keys // n_docs, keys % n_docs
+
+            order = np.lexsort((-scores, query_rows))
+            query_rows, doc_rows, scores = query_rows[order], doc_rows[order], scores[order]
+            rank = np.arange(len(query_rows)) - np.searchsorted(query_rows, query_rows)
+            top = rank < k
+
+            results.append((query_rows[top] + start, doc_rows[top], scores[top]))
+
+        if not results:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        return tuple(np.concatenate(values) for values in zip(*results))
+
+    def pair_scores(self, queries: SparseRows, query_rows: np.ndarray, doc_rows: np.ndarray) -> np.ndarray:
+        """
+        Return the cosine similarities of pairs of queries and names of the index.
+
+        Args:
+            queries (SparseRows): The vectors of the queries from `transform`.
+            query_rows (np.ndarray): The query of every pair.
+            doc_rows (np.ndarray): The row of the index of every pair.
+
+        Returns:
+            np.ndarray: The similarity of every pair.
+        """
+        n_features = max(1, len(self.vocabulary))
+        query_pairs, query_columns, query_weights = expand_rows(queries, np.asarray(query_rows, dtype=np.int64))
+        doc_pairs, doc_columns, doc_weights = expand_rows(self.docs, np.asarray(doc_rows, dtype=np.int64))
+
+        # the features are unique within a vector, so the (pair, feature) keys are unique on both sides
+        _, query_idx, doc_idx = np.intersect1d(query_pairs * n_features + query_columns,
+                                               doc_pairs * n_features + doc_columns,
+                                               assume_unique=True, return_indices=True)
+
+        return np.bincount(query_pairs[query_idx], query_weights[query_idx] * doc_weights[doc_idx],
+                           minlength=len(query_rows)).astype(np.float32)
+
+    def positions(self, ids: np.ndarray) -> np.ndarray:
+        """Return the rows of the products in the index, -1 for the products missing from it."""
+        ids = np.asarray(ids, dtype=np.int64)
+
+        if len(self.ids) == 0:
+            return np.full(len(ids), -1, dtype=np.int64)
+
+        rows = np.minimum(np.searchsorted(self.ids, ids), len(self.ids) - 1)
+
+        return np.where(self.ids[rows] == ids, rows, -1)
+
+    def save(self, path: str):
+        vocabulary = np.array(sorted(self.vocabulary, key=self.vocabulary.get), dtype=str)
+        np.savez(path, n=self.n, max_df=self.max_df, ids=self.ids, vocabulary=vocabulary, idf=self.idf,
+                 df=self.df, docs_ptr=self.docs[0], docs_columns=self.docs[1], docs_weights=self.docs[2],
+                 postings_ptr=self.postings[0], postings_rows=self.postings[1], postings_weights=self.postings[2],
+                 fingerprint=self.fingerprint)
+
+    @classmethod
+    def load(cls, path: str) -> 'LexicalIndex':
+        data = np.load(path)
+        index = cls(n=int(data['n']), max_df=float(data['max_df']))
+        index.ids = data['ids']
+        index.vocabulary = {feature: column for column, feature in enumerate(data['vocabulary'].tolist())}
+        index.idf = data['idf']
+        index.df = data['df']
+        index.docs = (data['docs_ptr'], data['docs_columns'], data['docs_weights'])
+        index.postings = (data['postings_ptr'], data['postings_rows'], data['postings_weights'])
+        index.fingerprint = str(data['fingerprint'])
+
+        return index
+
+
+def get_lexical_index(source: str, rebuild: bool = False) -> Tuple[int, str, Optional[LexicalIndex]]:
+    """
+    Load the lexical index of the product names of a source, building it when the products of the source changed.
+
+    Args:
+        source (str): The source of the products.
+        rebuild (bool): Rebuild the index even if it is up to date.
+
+    Returns:
+        Tuple[int, str, Optional[LexicalIndex]]: A tuple containing status code, status message and the index.
+    """
+    status_code, status_message, fingerprint = ProductController.get_fingerprint(source)
+    if status_code != 0:
+        return status_code, status_message, None
+
+    path = get_store_path(source, 'lexical', '.npz')
+
+    if not rebuild:
+        try:
+            index = LexicalIndex.load(path)
+
+            if index.fingerprint == fingerprint:
+                return 0, 'OK', index
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f'Unable to load the lexical index "{path}": {e}')
+
+    status_code, status_message, products = ProductController.get_products(source, columns=('name',))
+    if status_code != 0:
+        return status_code, status_message, None
+
+    logger.info(f'Building the lexical index for source "{source}" ({len(products)} products) ...')
+
+    products.sort(key=lambda p: p.id)
+
+    try:
+        index = LexicalIndex()
+        index.build(np.array([p.id for p in products], dtype=np.int64), [p.name for p in products])
+        index.fingerprint = fingerprint
+        index.save(path)
+    except Exception as e:
+        logger.exception(f'Error while building the lexical index for source "{source}": {e}')
+        return 1, f'Error "{e}" occurred while building the lexical index.', None
+
+    return 0, 'OK', index
@@ -1,17 +1,217 @@
 import numpy as np
 from parsers.product import Product
-from typing import List, Tuple, Optional
+from models.similarity import stack_embeddings, blocked_top_k, top_k, pair_similarities
+from models.blocking import BrandDictionary, get_block_keys, group_rows
+from models.lexical_index import LexicalIndex
+from models.ann_index import ANNIndex
+from db.embedding_store import EmbeddingStore
+from config import ann_params, embedder_params, matcher_params
+from typing import Callable, Dict, List, Set, Tuple, Optional
 from tqdm import tqdm
 
 
+match_modes = ('best', 'mutual', 'one_to_one')
+
+
+def match_key(mode: str = 'best', assignment: str = 'greedy', hybrid: bool = False, blocking: bool = False,
+              ann: bool = False) -> str:
+    """
+    Build the key of the stored matches from the settings they are computed with, so the matches of
+    different settings are stored side by side and an incremental run only reuses the matches of its own settings.
+
+    Args:
+        mode (str): The match mode.
+        assignment (str): The assignment of the 'one_to_one' mode.
+        hybrid (bool): Whether the candidates are scored with the hybrid score.
+        blocking (bool): Whether the products are compared only within the same block.
+        ann (bool): Whether the candidates are searched in the approximate nearest-neighbour index.
+
+    Returns:
+        str: The key, e.g. 'sentence-transformers/all-MiniLM-L6-v2@torch|best|threshold=0.9'.
+    """
+    backend = embedder_params['backend']
+    if backend == 'onnx':
+        backend += '-int8' if embedder_params['quantize'] else '-fp32'
+
+    parts = [f"{embedder_params['model_name']}@{backend}", mode if mode != 'one_to_one' else f'{mode}-{assignment}']
+
+    if hybrid:
+        weights = ','.join(f'{name}={weight}' for name, weight in matcher_params['weights'].items())
+        parts += [f"threshold={matcher_params['hybrid_threshold']}", f'hybrid={weights}']
+    else:
+        parts.append(f"threshold={matcher_params['threshold']}")
+
+    if blocking:
+        parts.append('blocking')
+
+    if ann:
+        parts.append(f"ann={ann_params['backend']}")
+
+    return '|'.join(parts)
+
+
+def best_edges(rows_a: np.ndarray, rows_b: np.ndarray, sims: np.ndarray, mutual: bool = False) -> np.ndarray:
+    """
+    Select the most similar edge of every row of A in a candidate graph.
+
+    Args:
+        rows_a (np.ndarray): The rows of A of the edges, grouped by row with the most similar edge first.
+        rows_b (np.ndarray): The rows of B of the edges.
+        sims (np.ndarray): The similarities of the edges.
+        mutual (bool): Keep only the edges that are also the most similar edge of their row of B
+            (ties go to the lower row of A).
+
+    Returns:
+        np.ndarray: The indices of the selected edges, in the order of the rows of A.
+    """
+    _, edges = np.unique(rows_a, return_index=True)
+
+    if not mutual or len(edges) == 0:
+        return edges
+
+    order = np.lexsort((rows_a, -sims))
+    _, first = np.unique(rows_b[order], return_index=True)
+
+    return edges[np.isin(edges, order[first])]
+
+
+def greedy_assignment(rows_a: np.ndarray, rows_b: np.ndarray, sims: np.ndarray,
+                      n_a: int, n_b: int) -> np.ndarray:
+    """
+    Select edges of a candidate graph so that every row of A and B is matched at most once,
+    taking the edges from the most similar one while both of their rows are free.
+
+    Args:
+        rows_a (np.ndarray): The rows of A of the edges.
+        rows_b (np.ndarray): The rows of B of the edges.
+        sims (np.ndarray): The similarities of the edges.
+        n_a (int): The number of rows of A.
+        n_b (int): The number of rows of B.
+
+    Returns:
+        np.ndarray: The indices of the selected edges, in the order of the rows of A.
+    """
+    free_a = np.ones(n_a, dtype=bool)
+    free_b = np.ones(n_b, dtype=bool)
+    selected = []
+
+    for edge in np.lexsort((rows_b, rows_a, -sims)):
+        if free_a[rows_a[edge]] and free_b[rows_b[edge]]:
+            free_a[rows_a[edge]] = free_b[rows_b[edge]] = False
+            selected.append(edge)
+
+    selected = np.array(selected, dtype=np.int64)
+
+    return selected[np.argsort(rows_a[selected], kind='stable')]
+
+
+def hungarian_assignment(rows_a: np.ndarray, rows_b: np.ndarray, sims: np.ndarray,
+                         n_a: int, n_b: int) -> np.ndarray:
+    """
+    Select edges of a candidate graph so that every row of A and B is matched at most once
+    and the total similarity of the matches is maximal.
+
+    The assignment is solved on the sparse graph with `scipy`. Every row of A gets an extra edge
+    to its own dummy column of similarity 0, so a row of A can stay unmatched.
+
+    Args:
+        rows_a (np.ndarray): The rows of A of the edges.
+        rows_b (np.ndarray): The rows of B of the edges.
+        sims (np.ndarray): The similarities of the edges.
+        n_a (int): The number of rows of A.
+        n_b (int): The number of rows of B.
+
+    Returns:
+        np.ndarray: The indices of the selected edges, in the order of the rows of A.
+    """
+    try:
+        from scipy.sparse import csr_matrix
+        from scipy.sparse.csgraph import min_weight_full_bipartite_matching
+    except ImportError:
+        raise RuntimeError("The 'hungarian' assignment requires the 'scipy' package: pip install scipy")
+
+    if len(sims) == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    # the costs must be positive, the dummy edges cost as much as an edge of similarity 0
+    offset = max(1.0, float(sims.max())) + 1.0
+    dummy = np.arange(n_a)
+    graph = csr_matrix(
+        (np.concatenate([offset - sims.astype(np.float64), np.full(n_a, offset)]),
+         (np.concatenate([rows_a, dummy]), np.concatenate([rows_b, n_b + dummy]))),
+        shape=(n_a, n_b + n_a),
+    )
+    _, columns = min_weight_full_bipartite_matching(graph)
+
+    edge_by_pair = {(a, b): edge for edge, (a, b) in enumerate(zip(rows_a.tolist(), rows_b.tolist()))}
+
+    return np.array([edge_by_pair[(a, b)] for a, b in enumerate(columns.tolist()) if b < n_b], dtype=np.int64)
+
+
 class Matcher:
-    """Class to match products from two lists based on maximum cosine similarity."""
+    """Class to match products from two lists based on maximum cosine similarity.
+
+    Example:
+        matcher = Matcher(products_a, products_b, threshold=0.8, top_k=5, mode='one_to_one')
+        matcher.find_best_matches()
+        matches = matcher.get_matches()
+        candidates = matcher.get_candidates()
+    """
+
+    def __init__(self, products_a: List[Product], products_b: List[Product], threshold: float = 0.9,
+                 block_size: int = 1024, index: Optional[ANNIndex] = None, candidates: int = 10,
+                 store_a: Optional[EmbeddingStore] = None, store_b: Optional[EmbeddingStore] = None,
+                 top_k: int = 1, mode: str = 'best', assignment: str = 'greedy', blocking: bool = False,
+                 lexical: Optional[LexicalIndex] = None, weights: Optional[Dict[str, float]] = None):
+        """
+        Args:
+            products_a (List[Product]): The products to find matches for.
+            products_b (List[Product]): The products to search the matches in.
+            threshold (float): The minimum cosine similarity of a match.
+            block_size (int): The number of products of list A compared at once.
+            index (ANNIndex, optional): An approximate nearest-neighbour index built over the
+                products of list B. When passed, only its top candidates are considered.
+            candidates (int): The number of candidates requested from the index per product.
+            store_a (EmbeddingStore, optional): The embedding store of the source of list A. When passed,
+                the embeddings are taken from the store instead of the products.
+            store_b (EmbeddingStore, optional): The embedding store of the source of list B.
+            top_k (int): The number of candidates kept for every product of list A.
+            mode (str): How the matches are chosen among the candidates: 'best', 'mutual' or 'one_to_one'.
+            assignment (str): The assignment of the 'one_to_one' mode: 'greedy' or 'hungarian' (requires scipy).
+            blocking (bool): Compare the products only with the products of the same brand and a compatible
+                pack size. The products without a brand found in list B are compared with all of list B.
+                Not applied with an index.
+            lexical (LexicalIndex, optional): The lexical index of the names of list B. When passed, its candidates
+                are added to the candidates of the embeddings, and all the candidates are scored with the weighted
+                sum of the name embedding, lexical and description embedding similarities, which the threshold
+                then applies to.
+            weights (Dict[str, float], optional): The weights of the 'name', 'lexical' and 'descr' similarities
+                of the hybrid score, `matcher_params['weights']` if omitted.
+        """
+        if mode not in match_modes:
+            raise ValueError(f"Unknown match mode '{mode}', expected one of: {match_modes}")
+
+        if assignment not in ('greedy', 'hungarian'):
+            raise ValueError(f"Unknown assignment '{assignment}', expected 'greedy' or 'hungarian'.")
 
-    def __init__(self, products_a: List[Product], products_b: List[Product], threshold: float = 0.9):
         self.products_a = products_a
         self.products_b = products_b
         self.matches: List[Tuple[Product, Optional[Product], float]] = []
         self.threshold = threshold
+        self.block_size = block_size
+        self.index = index
+        self.candidates = candidates
+        self.store_a = store_a
+        self.store_b = store_b
+        self.top_k = max(1, top_k)
+        self.mode = mode
+        self.assignment = assignment
+        self.blocking = blocking
+        self.lexical = lexical
+        self.weights = dict(matcher_params['weights'], **(weights or {}))
+        # the number of similarities computed by the last `find_best_matches` without an index
+        self.comparisons = 0
+        self.candidate_matches: List[Tuple[Product, List[Tuple[Product, float]]]] = []
 
     @staticmethod
     def cosine_similarity(v1: np.ndarray, v2: np.ndarray) -> float:
@@ -21,8 +221,240 @@ class Matcher:
 
         return np.dot(v1, v2) / (np.linalg.norm(v1) * np.linalg.norm(v2))
 
+    @staticmethod
+    def _matchable(products: List[Product], store: Optional[EmbeddingStore] = None) -> List[Product]:
+        """Return the products that take part in matching (both embeddings present)."""
+        if store is not None:
+            rows = store.positions([p.id for p in products])
+            return [p for p, row in zip(products, rows) if row >= 0]
+
+        return [p for p in products if p.descr_emb is not None and p.name_emb is not None]
+
+    @staticmethod
+    def _name_matrix(products: List[Product], store: Optional[EmbeddingStore] = None,
+                     column: str = 'name_emb') -> np.ndarray:
+        """Return the normalized matrix of the name (or `column`) embeddings of the products.
+
+        With a store, the rows are taken from its memory-mapped matrix, which is used as is
+        when the products are exactly the products of the store.
+        """
+        if store is None:
+            return stack_embeddings([getattr(p, column) for p in products])[0]
+
+        rows = store.positions([p.id for p in products])
+
+        if np.array_equal(rows, np.arange(len(store))):
+            return getattr(store, column)
+
+        return getattr(store, column)[rows]
+
     def find_best_matches(self):
-        """Find the best match for each product in list A from list B based on maximum cosine similarity."""
+        """Find the matches of the products of list A among the products of list B.
+
+        The top-k candidates of every product of list A above the threshold are found first
+        (with a blocked matrix product or the index), and the matches are chosen among these
+        candidates according to `mode`:
+
+        - 'best': the most similar candidate of every product of list A.
+        - 'mutual': the most similar candidate, kept only if the product of list A is also the most
+          similar product of list A for it among the candidates.
+        - 'one_to_one': every product of list B is matched at most once, with the greedy or Hungarian
+          `assignment` on the candidate graph.
+
+        The name embeddings of both lists are stacked into normalized float32 matrices once
+        (or taken from the embedding stores).
+        """
+        self.matches.clear()
+        self.candidate_matches.clear()
+        self.comparisons = 0
+
+        products_a = self._matchable(self.products_a, self.store_a)
+        products_b = self._matchable(self.products_b, self.store_b)
+
+        if not products_a or not products_b:
+            return
+
+        if self.index is not None:
+            rows_a, rows_b, sims = self._find_candidates_index(products_a, products_b)
+        elif self.blocking:
+            rows_a, rows_b, sims = self._find_candidates_blocked(products_a, products_b)
+        else:
+            rows_a, rows_b, sims = self._find_candidates(products_a, products_b)
+
+        if self.lexical is not None:
+            rows_a, rows_b, sims = self._rerank(products_a, products_b, rows_a, rows_b)
+
+        for row_a, row_b, sim in zip(rows_a, rows_b, sims):
+            if not self.candidate_matches or self.candidate_matches[-1][0] is not products_a[row_a]:
+                self.candidate_matches.append((products_a[row_a], []))
+            self.candidate_matches[-1][1].append((products_b[row_b], sim))
+
+        if self.mode == 'one_to_one':
+            assign = hungarian_assignment if self.assignment == 'hungarian' else greedy_assignment
+            selected = assign(rows_a, rows_b, sims, len(products_a), len(products_b))
+        else:
+            selected = best_edges(rows_a, rows_b, sims, mutual=self.mode == 'mutual')
+
+        for edge in selected:
+            self.matches.append((products_a[rows_a[edge]], products_b[rows_b[edge]], sims[edge]))
+
+    @property
+    def _candidate_threshold(self) -> float:
+        # the hybrid score is thresholded after the re-ranking, only the pairs excluded by the blocking
+        # (similarity -inf) are filtered out of the candidates
+        return float(np.finfo(np.float32).min) if self.lexical is not None else self.threshold
+
+    def _rerank(self, products_a: List[Product], products_b: List[Product], rows_a: np.ndarray,
+                rows_b: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Add the lexical candidates to the candidate graph and score all the candidates with the hybrid score.
+
+        Returns the top-k candidates above the threshold of every product of list A, grouped by row of A
+        and sorted by decreasing score. The lexical candidates are not restricted by the blocking.
+        """
+        queries = self.lexical.transform([p.name for p in products_a])
+        docs_b = self.lexical.positions([p.id for p in products_b])
+        rows_of_docs = np.full(len(self.lexical.ids), -1, dtype=np.int64)
+        rows_of_docs[docs_b[docs_b >= 0]] = np.flatnonzero(docs_b >= 0)
+
+        query_rows, doc_rows, _ = self.lexical.search(queries, self.top_k, self.block_size)
+        lexical_rows_b = rows_of_docs[doc_rows]
+        known = lexical_rows_b >= 0
+
+        keys = np.unique(np.concatenate([rows_a * len(products_b) + rows_b,
+                                         query_rows[known] * len(products_b) + lexical_rows_b[known]]))
+        rows_a, rows_b = keys // len(products_b), keys % len(products_b)
+
+        name_sims = pair_similarities(self._name_matrix(products_a, self.store_a),
+                                      self._name_matrix(products_b, self.store_b), rows_a, rows_b)
+        descr_sims = pair_similarities(self._name_matrix(products_a, self.store_a, 'descr_emb'),
+                                       self._name_matrix(products_b, self.store_b, 'descr_emb'), rows_a, rows_b)
+        lexical_sims = np.zeros(len(rows_a), dtype=np.float32)
+        indexed = docs_b[rows_b] >= 0
+        lexical_sims[indexed] = self.lexical.pair_scores(queries, rows_a[indexed], docs_b[rows_b[indexed]])
+
+        scores = (self.weights['name'] * name_sims + self.weights['lexical'] * lexical_sims
+                  + self.weights['descr'] * descr_sims).astype(np.float32)
+
+        order = np.lexsort((-scores, rows_a))
+        rows_a, rows_b, scores = rows_a[order], rows_b[order], scores[order]
+        rank = np.arange(len(rows_a)) - np.searchsorted(rows_a, rows_a)
+        keep = (rank < self.top_k) & (scores >= self.threshold)
+
+        return rows_a[keep], rows_b[keep], scores[keep]
+
+    def _find_candidates(self, products_a: List[Product],
+                         products_b: List[Product]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Return the candidate graph: the top-k edges (row in A, row in B, similarity) above the threshold,
+        grouped by row of A and sorted by decreasing similarity within a row."""
+        matrix_a = self._name_matrix(products_a, self.store_a)
+        matrix_b = self._name_matrix(products_b, self.store_b)
+
+        indices, scores = blocked_top_k(matrix_a, matrix_b, k=self.top_k, block_size=self.block_size)
+        self.comparisons += len(products_a) * len(products_b)
+
+        return self._edges(np.arange(len(products_a)), indices, scores)
+
+    def _edges(self, rows_a: np.ndarray, indices: np.ndarray,
+               scores: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Return the edges above the threshold of (len(rows_a), k) top-k indices into B and scores."""
+        mask = scores >= self._candidate_threshold
+        rows_a = np.broadcast_to(rows_a[:, None], indices.shape)
+
+        return rows_a[mask], indices[mask], scores[mask]
+
+    def _find_candidates_blocked(self, products_a: List[Product],
+                                 products_b: List[Product]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Return the candidate graph of `_find_candidates`, comparing the products within the blocks of their brand.
+
+        The brands are the brands captured by the parsers, or the known brands found in the names.
+        Within a brand, two products whose pack sizes are both known in the same unit are compared only
+        if the sizes are equal.
+        """
+        matrix_a = self._name_matrix(products_a, self.store_a)
+        matrix_b = self._name_matrix(products_b, self.store_b)
+
+        brands = BrandDictionary(p.brand for p in products_a + products_b if p.brand)
+        brands_a, volumes_a = get_block_keys(products_a, brands)
+        brands_b, volumes_b = get_block_keys(products_b, brands)
+        sizes_a, units_a = self._volume_arrays(volumes_a)
+        sizes_b, units_b = self._volume_arrays(volumes_b)
+
+        groups_b = group_rows(brands_b)
+        edges = []
+
+        for brand, block_a in group_rows(brands_a).items():
+            if brand not in groups_b:
+                continue
+
+            block_b = np.array(groups_b[brand])
+            k = min(self.top_k, len(block_b))
+
+            for start in range(0, len(block_a), self.block_size):
+                rows = np.array(block_a[start:start + self.block_size])
+                sims = matrix_a[rows] @ matrix_b[block_b].T
+
+                other_size = ((units_a[rows, None] == units_b[None, block_b]) & (units_a[rows, None] != 0)
+                              & (sizes_a[rows, None] != sizes_b[None, block_b]))
+                sims[other_size] = -np.inf
+
+                indices, scores = top_k(sims, k)
+                edges.append(self._edges(rows, block_b[indices], scores))
+                self.comparisons += sims.size
+
+        # the products of a brand missing from list B are compared with the whole list
+        unblocked = np.array([row for row, brand in enumerate(brands_a) if brand not in groups_b], dtype=np.int64)
+
+        if len(unblocked):
+            indices, scores = blocked_top_k(matrix_a[unblocked], matrix_b, k=self.top_k, block_size=self.block_size)
+            edges.append(self._edges(unblocked, indices, scores))
+            self.comparisons += len(unblocked) * len(products_b)
+
+        if not edges:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        rows_a, rows_b, sims = (np.concatenate(values) for values in zip(*edges))
+        # group the edges by row of A, the most similar first
+        order = np.lexsort((-sims, rows_a))
+
+        return rows_a[order], rows_b[order], sims[order]
+
+    @staticmethod
+    def _volume_arrays(volumes: List[Optional[Tuple[float, str]]]) -> Tuple[np.ndarray, np.ndarray]:
+        """Return the pack sizes and the codes of their units (0 if unknown)."""
+        codes = {'ml': 1, 'g': 2, 'pcs': 3}
+        sizes = np.array([v[0] if v else 0.0 for v in volumes])
+        units = np.array([codes[v[1]] if v else 0 for v in volumes], dtype=np.int64)
+
+        return sizes, units
+
+    def _find_candidates_index(self, products_a: List[Product],
+                               products_b: List[Product]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Return the candidate graph of `_find_candidates` among the top candidates returned by the index."""
+        rows_by_id = {p.id: row for row, p in enumerate(products_b)}
+        matrix_a = self._name_matrix(products_a, self.store_a)
+        edges = []
+
+        for start in range(0, len(products_a), self.block_size):
+            ids, sims = self.index.search(matrix_a[start:start + self.block_size], max(self.candidates, self.top_k))
+
+            for row_a, (row_ids, row_sims) in enumerate(zip(ids, sims), start):
+                # candidates are sorted by similarity, only the products of list B are kept
+                known = [(rows_by_id[id], sim) for id, sim in zip(row_ids, row_sims) if id in rows_by_id]
+
+                edges.extend((row_a, row_b, sim) for row_b, sim in known[:self.top_k]
+                             if sim >= self._candidate_threshold)
+
+        if not edges:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        rows_a, rows_b, sims = zip(*edges)
+
+        return np.array(rows_a), np.array(rows_b), np.array(sims, dtype=np.float32)
+
+    def find_best_matches_loop(self):
+        """Reference pairwise implementation of `find_best_matches`, kept for benchmarking."""
+        self.matches.clear()
+
         for prod_a in tqdm(self.products_a, desc='Matching Products', unit='product'):
             best_match = None
             max_similarity = -1
@@ -41,3 +473,64 @@ class Matcher:
     def get_matches(self) -> List[Tuple[Product, Optional[Product], float]]:
         """Return the list of product pairs with their cosine similarity."""
         return self.matches
+
+    def get_candidates(self) -> List[Tuple[Product, List[Tuple[Product, float]]]]:
+        """Return the products of list A with their top-k candidates and similarities, most similar first.
+        The products of list A without candidates above the threshold are omitted."""
+        return self.candidate_matches
+
+
+def incremental_matches(products_a: List[Product], products_b: List[Product],
+                        stored: Dict[int, Tuple[int, float]], changed_a: Set[int], changed_b: Set[int],
+                        make_matcher: Callable[[List[Product], List[Product], bool], Matcher]
+                        ) -> Tuple[List[Tuple[Product, Product, float]], Set[int]]:
+    """
+    Update the best matches of a previous run with the products saved since then.
+
+    The products of list A that changed or whose stored match changed or is no longer in list B are
+    matched against the whole list B; the other products of list A are only matched against the changed
+    products of list B, and a match replaces the stored one if it is more similar. The result equals
+    a full run of the 'best' mode with the same settings, as long as the similarity of two products does
+    not depend on the other products: not with the hybrid scoring (the lexical weights are computed over
+    the whole list B) or the blocking (the blocks depend on the brands of the whole list B).
+
+    Args:
+        products_a (List[Product]): The products to find matches for.
+        products_b (List[Product]): The products to search the matches in.
+        stored (Dict[int, Tuple[int, float]]): The stored matches: product id of A -> (product id of B, similarity).
+        changed_a (Set[int]): The ids of the products of list A saved since the previous run.
+        changed_b (Set[int]): The ids of the products of list B saved since the previous run.
+        make_matcher (Callable[[List[Product], List[Product], bool], Matcher]): Creates a matcher of two lists,
+            the flag tells whether list B is the whole list (an index of list B can be used).
+
+    Returns:
+        Tuple[List[Tuple[Product, Product, float]], Set[int]]: The new matches and the ids of the products
+            of list A whose stored matches are replaced (including the products no longer in list A).
+    """
+    ids_b = {p.id for p in products_b}
+    # a product keeps its id when it is saved again, the similarity of a stored match with a changed product is stale
+    recompute = [p for p in products_a if p.id in changed_a or
+                 (p.id in stored and (stored[p.id][0] not in ids_b or stored[p.id][0] in changed_b))]
+    replaced = {p.id for p in recompute}
+    matches = []
+
+    if recompute:
+        matcher = make_matcher(recompute, products_b, True)
+        matcher.find_best_matches()
+        matches.extend(matcher.get_matches())
+
+    rest = [p for p in products_a if p.id not in replaced]
+    new_b = [p for p in products_b if p.id in changed_b]
+
+    if rest and new_b:
+        matcher = make_matcher(rest, new_b, False)
+        matcher.find_best_matches()
+
+        for prod_a, prod_b, sim in matcher.get_matches():
+            if prod_a.id not in stored or sim > stored[prod_a.id][1]:
+                matches.append((prod_a, prod_b, sim))
+                replaced.add(prod_a.id)
+
+    replaced.update(set(stored) - {p.id for p in products_a})
+
+    return matches, replaced
@@ -0,0 +1,195 @@
+from typing import List, Union
+import json
+import os
+import re
+import numpy as np
+from loguru import logger
+
+
+def get_model_dir(onnx_dir: str, model_name: str) -> str:
+    """Return the directory storing the exported ONNX model of a SentenceTransformer model."""
+    return os.path.join(onnx_dir, re.sub(r'[^\w.-]', '_', model_name))
+
+
+def _pooling_mode(config: dict) -> str:
+    """Return the pooling mode of a SentenceTransformer pooling module config."""
+    if 'pooling_mode' in config:
+        return config['pooling_mode']
+
+    for mode, key in (('cls', 'pooling_mode_cls_token'), ('max', 'pooling_mode_max_tokens')):
+        if config.get(key):
+            return mode
+
+    return 'mean'
+
+
+def export_onnx(model_name: str, model_dir: str, quantize: bool = True):
+    """
+    Export the transformer of a SentenceTransformer model to ONNX.
+
+    The tokenizer, the pooling mode and the normalization of the model are stored next to the
+    ONNX graph, so `OnnxEncoder` computes the same embeddings without torch. With `quantize` the
+    weights of the graph are also quantized to int8 (dynamic quantization, the activations are
+    quantized on the fly), which makes CPU inference several times faster.
+
+    Requires `torch`, `sentence_transformers`, `transformers` and `onnxruntime` (with `onnx` for the quantization).
+
+    Args:
+        model_name (str): The name or path of the SentenceTransformer model.
+        model_dir (str): The output directory.
+        quantize (bool): Also write the int8 quantized graph.
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+    from transformers.convert_slow_tokenizer import convert_slow_tokenizer
+
+    st_model = SentenceTransformer(model_name, device='cpu')
+    transformer = st_model[0]
+    tokenizer = transformer.tokenizer
+    input_names = [name for name in ('input_ids', 'attention_mask', 'token_type_ids')
+                   if name in tokenizer.model_input_names]
+
+    class TokenEmbeddings(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, *inputs):
+            return self.model(**dict(zip(input_names, inputs))).last_hidden_state
+
+    os.makedirs(model_dir, exist_ok=True)
+    fp32_path = os.path.join(model_dir, 'model.onnx')
+
+    dummy = tokenizer(['an example product name'], return_tensors='pt')
+    dynamic_axes = {name: {0: 'batch', 1: 'sequence'} for name in input_names + ['token_embeddings']}
+
+    with torch.no_grad():
+        torch.onnx.export(
+            TokenEmbeddings(transformer.auto_model.eval()),
+            tuple(dummy[name] for name in input_names),
+            fp32_path,
+            input_names=input_names,
+            output_names=['token_embeddings'],
+            dynamic_axes=dynamic_axes,
+            opset_version=14,
+            dynamo=False,
+        )
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        quantize_dynamic(fp32_path, os.path.join(model_dir, 'model.int8.onnx'), weight_type=QuantType.QInt8)
+
+    fast_tokenizer = tokenizer.backend_tokenizer if tokenizer.is_fast else convert_slow_tokenizer(tokenizer)
+    fast_tokenizer.save(os.path.join(model_dir, 'tokenizer.json'))
+
+    pooling = next((module for module in st_model if type(module).__name__ == 'Pooling'), None)
+
+    meta = {
+        'model_name': model_name,
+        'dim': st_model.get_sentence_embedding_dimension(),
+        'max_seq_length': st_model.max_seq_length,
+        'input_names': input_names,
+        'pad_token': tokenizer.pad_token,
+        'pad_token_id': tokenizer.pad_token_id,
+        'pooling': 'mean' if pooling is None else _pooling_mode(pooling.get_config_dict()),
+        'normalize': any(type(module).__name__ == 'Normalize' for module in st_model),
+    }
+
+    with open(os.path.join(model_dir, 'meta.json'), 'w') as f:
+        json.dump(meta, f, indent=2)
+
+    logger.info(f'The model "{model_name}" was exported to {model_dir}')
+
+
+class OnnxEncoder:
+    """
+    Sentence encoder running an exported SentenceTransformer model with ONNX Runtime on CPU.
+
+    Has the `encode` and `get_sentence_embedding_dimension` methods of `SentenceTransformer`,
+    so it can replace the model in `ProductEmbedder`. The model is exported by `export_onnx`.
+
+    Example:
+        export_onnx('sentence-transformers/all-MiniLM-L6-v2', 'models/onnx/all-MiniLM-L6-v2')
+        encoder = OnnxEncoder('models/onnx/all-MiniLM-L6-v2', quantized=True)
+        embeddings = encoder.encode(['First product.', 'Second product.'])
+    """
+
+    def __init__(self, model_dir: str, quantized: bool = True, num_threads: int = 0):
+        """
+        Args:
+            model_dir (str): The directory of the exported model.
+            quantized (bool): Run the int8 quantized graph instead of the fp32 one.
+            num_threads (int): The number of threads of an inference, 0 for one per CPU core.
+        """
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        with open(os.path.join(model_dir, 'meta.json')) as f:
+            self.meta = json.load(f)
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, 'tokenizer.json'))
+        self.tokenizer.enable_truncation(max_length=self.meta['max_seq_length'])
+        self.tokenizer.enable_padding(pad_id=self.meta['pad_token_id'], pad_token=self.meta['pad_token'])
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = num_threads
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+
+        path = self.model_path(model_dir, quantized)
+        self.session = ort.InferenceSession(path, options, providers=['CPUExecutionProvider'])
+
+    @staticmethod
+    def model_path(model_dir: str, quantized: bool) -> str:
+        """Return the path of the fp32 or int8 graph of an exported model."""
+        return os.path.join(model_dir, 'model.int8.onnx' if quantized else 'model.onnx')
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.meta['dim']
+
+    def count_tokens(self, texts: List[str]) -> int:
+        """Return the number of tokens of the texts after truncation, without padding."""
+        return sum(sum(encoding.attention_mask) for encoding in self.tokenizer.encode_batch(texts))
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        inputs = {
+            'input_ids': np.array([e.ids for e in encodings], dtype=np.int64),
+            'attention_mask': np.array([e.attention_mask for e in encodings], dtype=np.int64),
+            'token_type_ids': np.array([e.type_ids for e in encodings], dtype=np.int64),
+        }
+        token_embeddings = self.session.run(None, {name: inputs[name] for name in self.meta['input_names']})[0]
+        mask = inputs['attention_mask'][:, :, None].astype(np.float32)
+
+        if self.meta['pooling'] == 'cls':
+            embeddings = token_embeddings[:, 0]
+        elif self.meta['pooling'] == 'max':
+            embeddings = np.where(mask > 0, token_embeddings, -1e9).max(axis=1)
+        else:
+            embeddings = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+
+        if self.meta['normalize']:
+            embeddings = embeddings / np.clip(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None)
+
+        return embeddings.astype(np.float32)
+
+    def encode(self, sentences: Union[str, List[str]], batch_size: int = 32, **kwargs) -> np.ndarray:
+        """
+        Embed a text or a list of texts.
+
+        Args:
+            sentences (Union[str, List[str]]): The texts.
+            batch_size (int): The number of texts run through the model at once.
+
+        Returns:
+            np.ndarray: The (dim,) embedding of a text or the (len(sentences), dim) embeddings of a list.
+        """
+        if isinstance(sentences, str):
+            return self.encode([sentences], batch_size)[0]
+
+        if not sentences:
+            return np.zeros((0, self.meta['dim']), dtype=np.float32)
+
+        return np.concatenate([
+            self._encode_batch(sentences[i:i + batch_size]) for i in range(0, len(sentences), batch_size)
+        ])
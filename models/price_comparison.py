@@ -0,0 +1,70 @@
+from typing import Dict, List, Optional, Tuple
+import csv
+from parsers.product import Product
+
+
+def comparison_columns(competitors: List[str]) -> List[str]:
+    """Return the columns of the price comparison of the anchor products with the competitors."""
+    columns = ['id', 'name', 'url', 'price']
+
+    for source in competitors:
+        columns += [f'{source}_name', f'{source}_url', f'{source}_price', f'{source}_similarity', f'{source}_diff']
+
+    return columns + ['cheapest_source', 'cheapest_price']
+
+
+def price_comparison(products: List[Product],
+                     matches: Dict[str, List[Tuple[Product, Optional[Product], float]]]) -> List[Dict]:
+    """
+    Build one row per anchor product with its price and the match and price of every competitor.
+
+    The difference of a competitor is its price relative to the anchor price in percent, negative
+    when the competitor is cheaper. The cheapest source is the anchor source on a tie.
+
+    Args:
+        products (List[Product]): The anchor products.
+        matches (Dict[str, List[Tuple[Product, Optional[Product], float]]]): The matches of the anchor
+            products in every competitor source.
+
+    Returns:
+        List[Dict]: The rows of the comparison with the keys of `comparison_columns`, in the order of the products.
+    """
+    by_source = {source: {prod_a.id: (prod_b, sim) for prod_a, prod_b, sim in source_matches if prod_b is not None}
+                 for source, source_matches in matches.items()}
+    rows = []
+
+    for product in products:
+        row = {'id': product.id, 'name': product.name, 'url': product.url, 'price': product.price}
+        cheapest_source, cheapest_price = product.source, product.price
+
+        for source, source_matches in by_source.items():
+            match, similarity = source_matches.get(product.id, (None, None))
+            price = match.price if match is not None else None
+            diff = None
+
+            if price is not None and product.price:
+                diff = round((price - product.price) / product.price * 100, 2)
+
+            row.update({
+                f'{source}_name': match.name if match is not None else None,
+                f'{source}_url': match.url if match is not None else None,
+                f'{source}_price': price,
+                f'{source}_similarity': round(float(similarity), 4) if similarity is not None else None,
+                f'{source}_diff': diff,
+            })
+
+            if price is not None and (cheapest_price is None or price < cheapest_price):
+                cheapest_source, cheapest_price = source, price
+
+        row.update({'cheapest_source': cheapest_source, 'cheapest_price': cheapest_price})
+        rows.append(row)
+
+    return rows
+
+
+def save_comparison(path: str, rows: List[Dict], competitors: List[str]):
+    """Write the rows of a price comparison to a CSV file, the missing values are left empty."""
+    with open(path, 'w', newline='', encoding='utf-8') as file:
+        writer = csv.DictWriter(file, fieldnames=comparison_columns(competitors))
+        writer.writeheader()
+        writer.writerows(rows)
@@ -0,0 +1,129 @@
+from typing import List, Optional, Tuple
+import numpy as np
+
+
+def stack_embeddings(embeddings: List[Optional[np.ndarray]]) -> Tuple[np.ndarray, np.ndarray]:
+    """Stack embeddings into a single row-normalized float32 matrix.
+
+    Missing embeddings (None) and zero vectors are stored as zero rows, so their
+    similarity with any other vector is 0.
+
+    Args:
+        embeddings (List[Optional[np.ndarray]]): The embeddings to stack.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: The normalized (n, dim) matrix and a boolean mask
+            of the rows that had an embedding.
+    """
+    mask = np.array([emb is not None for emb in embeddings], dtype=bool)
+
+    if not mask.any():
+        return np.zeros((len(embeddings), 0), dtype=np.float32), mask
+
+    dim = next(emb for emb in embeddings if emb is not None).shape[-1]
+    matrix = np.zeros((len(embeddings), dim), dtype=np.float32)
+
+    for i, emb in enumerate(embeddings):
+        if emb is not None:
+            matrix[i] = emb
+
+    return normalize_rows(matrix), mask
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """Scale every row of the matrix to unit length, leaving zero rows untouched.
+
+    Args:
+        matrix (np.ndarray): A (n, dim) matrix.
+
+    Returns:
+        np.ndarray: The row-normalized float32 matrix.
+    """
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+
+    return matrix / norms
+
+
+def blocked_top_k(matrix_a: np.ndarray, matrix_b: np.ndarray, k: int = 1,
+                  block_size: int = 1024) -> Tuple[np.ndarray, np.ndarray]:
+    """Find the k most similar rows of B for every row of A.
+
+    Both matrices are expected to be row-normalized, so the dot product is the cosine
+    similarity. A is processed in blocks of `block_size` rows to keep the
+    (block_size, len(B)) similarity matrix bounded in memory. Ties are resolved in
+    favour of the lower index in B.
+
+    Args:
+        matrix_a (np.ndarray): A (n_a, dim) normalized matrix.
+        matrix_b (np.ndarray): A (n_b, dim) normalized matrix.
+        k (int): The number of candidates to return for every row of A.
+        block_size (int): The number of rows of A multiplied at once.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: (n_a, k) arrays with the indices into B and the
+            similarities, sorted by decreasing similarity.
+    """
+    k = min(k, matrix_b.shape[0])
+    indices = np.zeros((matrix_a.shape[0], k), dtype=np.int64)
+    scores = np.zeros((matrix_a.shape[0], k), dtype=np.float32)
+
+    if k == 0:
+        return indices, scores
+
+    for start in range(0, matrix_a.shape[0], block_size):
+        end = start + block_size
+        indices[start:end], scores[start:end] = top_k(matrix_a[start:end] @ matrix_b.T, k)
+
+    return indices, scores
+
+
+def top_k(sims: np.ndarray, k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+    """Find the k largest values of every row of a similarity matrix.
+
+    Ties are resolved in favour of the lower column.
+
+    Args:
+        sims (np.ndarray): A (n, m) similarity matrix.
+        k (int): The number of values to return for every row, at most m.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: (n, k) arrays with the columns and the values,
+            sorted by decreasing value.
+    """
+    if k == 1:
+        top = np.argmax(sims, axis=1)[:, None]
+    else:
+        top = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+        top_sims = np.take_along_axis(sims, top, axis=1)
+        # sort by similarity desc, then by index asc for deterministic ties
+        order = np.lexsort((top, -top_sims), axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+
+    return top, np.take_along_axis(sims, top, axis=1)
+
+
+def pair_similarities(matrix_a: np.ndarray, matrix_b: np.ndarray, rows_a: np.ndarray, rows_b: np.ndarray,
+                      chunk_size: int = 65536) -> np.ndarray:
+    """Compute the dot products of pairs of rows of two matrices.
+
+    The rows are gathered in chunks of `chunk_size` pairs to keep memory bounded.
+
+    Args:
+        matrix_a (np.ndarray): A (n_a, dim) normalized matrix.
+        matrix_b (np.ndarray): A (n_b, dim) normalized matrix.
+        rows_a (np.ndarray): The row of A of every pair.
+        rows_b (np.ndarray): The row of B of every pair.
+        chunk_size (int): The number of pairs computed at once.
+
+    Returns:
+        np.ndarray: The (len(rows_a),) similarities.
+    """
+    sims = np.zeros(len(rows_a), dtype=np.float32)
+
+    for start in range(0, len(rows_a), chunk_size):
+        end = start + chunk_size
+        sims[start:end] = np.einsum('ij,ij->i', matrix_a[rows_a[start:end]], matrix_b[rows_b[start:end]])
+
+    return sims
@@ -1,9 +1,21 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
 from dataclasses import dataclass
-from typing import List, Tuple
+from datetime import datetime, timedelta
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
 from parsers.product import Product
+from parsers.extractors import parse_product_html
+from parsers.http_client import HttpClient
+from parsers.http_cache import ResponseCache
+import requests
 from db.connector import SQLiteConnector
+from db.controller import ProductController
 from models.embedder import ProductEmbedder
-from config import user_agent, parser_types, db_params
+from models.embedding_cache import EmbeddingCache
+from config import user_agent, parser_types, db_params, http_params, http_cache_params, embedder_params, \
+    embedding_cache_params, parse_params, crawl_params
+from loguru import logger
 import validators
 from tqdm import tqdm
 
@@ -17,40 +29,70 @@ class BaseParser:
     - parser_type (str): The type of parser to use.
     - prod_urls (List[str]): The list of urls to parse
     - headers (dict): The headers to be used in HTTP requests.
+    - http (HttpClient): The pooled HTTP client with retries, shared by the fetching threads.
     - products (List[Product]): A list to store the parsed products.
 
     Methods:
     - __init__(self, parser_type: str, prod_urls: List[str]): Initializes the BaseParser.
     - __post_init__(self): Performs post-initialization checks and setup.
     - parse_catalog(self) -> Tuple[int, str]: Parses the catalog of products.
+    - select_products_to_crawl(self, stale_days: int, conn: SQLiteConnector = None): Selects the new, changed and stale catalog products.
     - _parse_single_product(self, product: Product) -> Tuple[int, str]: Parses a single product.
+    - _fetch_product_page(self, product: Product) -> Tuple[int, str, requests.Response]: Fetches a product page.
+    - _extract_product_fields(self, html, encoding) -> Dict: Extracts the product fields from the product page.
+    - _fetch_pages(self, urls: List[str]) -> List[requests.Response]: Fetches catalog pages concurrently.
+    - _deduplicate_products(self): Removes the products with repeated urls.
+    - save_batch(conn: SQLiteConnector, products: List[Product], chunk_size: int = None): Saves products, writing
+      the content columns of the changed ones only.
     - save_single_product(conn: SQLiteConnector, p: Product) -> Tuple[int, str]: Saves a single product to the database.
-    - parse_products(self) -> Tuple[int, int]: Parses all products in the list.
-    - gen_embeddings(self) -> Tuple[int, int]: Generates embeddings for the products in the list.
+    - iter_parsed_products(self, products, max_workers, parse_workers) -> Iterator[Tuple[Product, int, str]]: Yields products as they are parsed.
+    - parse_products(self, max_workers: int = None, parse_workers: int = None) -> Tuple[int, int]: Parses all products in the list concurrently.
+    - gen_embeddings(self, batch_size: int = None) -> Tuple[int, int]: Generates embeddings for the products in the list in bulk.
     - save_products(self) -> Tuple[int, int]: Saves all products in the list to an SQLite database and tracks the progress.
     """
 
-    def __init__(self, parser_type: str, prod_urls: List[str]):
+    def __init__(self, parser_type: str, prod_urls: List[str], offline: bool = None,
+                 embedder: ProductEmbedder = None, cache: ResponseCache = None):
         """
         Initialize the BaseParser.
 
         Args:
         - parser_type (str): The type of parser to use.
         - prod_urls (str): The list of urls to parse
+        - offline (bool, optional): Serve pages only from the response cache, defaults to `http_cache_params["offline"]`.
+        - embedder (ProductEmbedder, optional): An embedder shared with other parsers, a new one is created if omitted.
+        - cache (ResponseCache, optional): A response cache shared with other parsers, opened if omitted.
+
+        The embedding model is not loaded here but on the first embedding, so parsing the catalog
+        does not wait for it.
 
         Raises:
         - ValueError: If `parser_type` is not valid, one of the urls is not a valid URL or the list of urls is empty
-        - RuntimeError: If there is an error while loading the embedder.
         """
         self.parser_type = parser_type
         self.prod_urls = prod_urls
         self.headers = {"User-Agent": user_agent}
+        self.http = HttpClient(
+            cache=cache or self._open_cache(),
+            offline=http_cache_params["offline"] if offline is None else offline,
+            headers=self.headers,
+            max_per_host=http_params["max_per_host"],
+            rate_limit=http_params["rate_limit"],
+            timeout=http_params["timeout"],
+            max_retries=http_params["max_retries"],
+            backoff_factor=http_params["backoff_factor"],
+            max_backoff=http_params["max_backoff"],
+            pool_size=http_params["max_workers"],
+        )
         self.products: List[Product] = []
 
-        self.embedder = ProductEmbedder("sentence-transformers/all-MiniLM-L6-v2")
-
-        if self.embedder.model is None:
-            raise RuntimeError("Error while loading embedder.")
+        self.embedder = embedder or ProductEmbedder(
+            embedder_params["model_name"],
+            cache=self._open_embedding_cache(),
+            backend=embedder_params["backend"],
+            quantize=embedder_params["quantize"],
+            onnx_dir=embedder_params["onnx_dir"],
+        )
 
     def __post_init__(self):
         """
@@ -71,6 +113,110 @@ class BaseParser:
             if not validators.url(url):
                 raise ValueError(f"The passed url `{url}` is not valid.")
 
+    @staticmethod
+    def _open_cache() -> Optional[ResponseCache]:
+        """
+        Opens the response cache if it is enabled in the config.
+
+        Returns:
+            Optional[ResponseCache]: The response cache, None if it is disabled or cannot be opened.
+        """
+        if not http_cache_params["enabled"]:
+            return None
+
+        cache = ResponseCache(http_cache_params["db_file"])
+        status_code, status_message = cache.connect()
+
+        if status_code != 0:
+            logger.warning(f"The response cache is disabled: {status_message}")
+            return None
+
+        return cache
+
+    @staticmethod
+    def _open_embedding_cache() -> Optional[EmbeddingCache]:
+        """
+        Opens the embedding cache if it is enabled in the config.
+
+        Returns:
+            Optional[EmbeddingCache]: The embedding cache, None if it is disabled or cannot be opened.
+        """
+        if not embedding_cache_params["enabled"]:
+            return None
+
+        cache = EmbeddingCache(embedding_cache_params["db_file"], embedding_cache_params["max_entries"])
+        status_code, status_message = cache.connect()
+
+        if status_code != 0:
+            logger.warning(f"The embedding cache is disabled: {status_message}")
+            return None
+
+        return cache
+
+    def select_products_to_crawl(self, stale_days: int,
+                                 conn: SQLiteConnector = None) -> Tuple[int, str, List[Product], List[Product]]:
+        """
+        Splits the catalog products into the ones whose pages must be crawled and the unchanged ones.
+
+        A product page is crawled if the product is new, was marked as gone, its catalog price differs
+        from the stored one (for catalogs that list prices) or it was last crawled more than
+        `stale_days` days ago. Stored products missing from the catalog are marked as gone and
+        the unchanged products are marked as seen. Call it only after a complete catalog discovery:
+        nothing is marked as gone when the catalog is empty or smaller than
+        `crawl_params["min_catalog_share"]` of the stored products, which points to a failed discovery.
+
+        Args:
+            stale_days (int): The number of days after which a product page is crawled again.
+            conn (SQLiteConnector, optional): An open connection the gone and seen marks are written through,
+                e.g. the shared writer of a crawl, a connection of their own by default.
+
+        Returns:
+            Tuple[int, str, List[Product], List[Product]]: A tuple containing status code, status message,
+                the products to crawl and the unchanged products.
+        """
+        status_code, status_message, stored = ProductController.get_crawl_info(self.parser_type)
+
+        if status_code != 0:
+            return status_code, status_message, [], []
+
+        stale_before = (datetime.now() - timedelta(days=stale_days)).isoformat()
+        to_crawl = []
+        unchanged = []
+
+        for product in self.products:
+            info = stored.get(product.url)
+
+            if info is None:
+                to_crawl.append(product)
+                continue
+
+            price, crawled_at, gone_at = info
+            price_changed = product.price is not None and price is not None and float(product.price) != float(price)
+
+            if gone_at is not None or price_changed or crawled_at is None or crawled_at < stale_before:
+                to_crawl.append(product)
+            else:
+                unchanged.append(product)
+
+        active = {url for url, (_, _, gone_at) in stored.items() if gone_at is None}
+        gone = active - {product.url for product in self.products}
+
+        if gone and (not self.products or len(self.products) < crawl_params["min_catalog_share"] * len(active)):
+            logger.warning(
+                f"The catalog [{self.parser_type}] has {len(self.products)} products for {len(active)} stored ones, "
+                f"the {len(gone)} missing products are not marked as gone."
+            )
+        else:
+            status_code, status_message = ProductController.mark_gone(self.parser_type, gone, conn)
+            if status_code != 0:
+                return status_code, status_message, [], []
+
+        status_code, status_message = ProductController.mark_seen(self.parser_type, [p.url for p in unchanged], conn)
+        if status_code != 0:
+            return status_code, status_message, [], []
+
+        return 0, "OK", to_crawl, unchanged
+
     def parse_catalog(self) -> Tuple[int, str]:
         """
         Parses the catalog of products.
@@ -84,13 +230,108 @@ class BaseParser:
         """
         Parses a single product.
 
+        Fetches the product page and updates the product with the fields extracted from it.
+        If the page did not change since it was last parsed, the cached fields are reused.
+
         Args:
             product (Product): The product to parse.
 
         Returns:
-            Tuple[int, str]: A tuple containing the parsing status (0 for success, non-zero for error) and a message.
+            Tuple[int, str]: A tuple containing the parsing status (0 for success, 1 if the page could not
+                be fetched, 2 if the fields could not be extracted from it) and a message.
         """
-        pass
+        status_code, status_message, response = self._fetch_product_page(product)
+
+        if status_code != 0:
+            return status_code, status_message
+
+        try:
+            fields = response.fields
+
+            if fields is None:
+                fields = self._extract_product_fields(response.content, response.encoding)
+
+            self._set_product_fields(product, fields, cache=response.fields is None)
+        except Exception as e:
+            return 2, str(e)
+
+        return 0, "OK"
+
+    def _fetch_product_page(self, product: Product) -> Tuple[int, str, Optional[requests.Response]]:
+        """
+        Fetches the page of a product.
+
+        Args:
+            product (Product): The product.
+
+        Returns:
+            Tuple[int, str, Optional[requests.Response]]: A tuple containing the status (0 for success, 1 if the page
+                could not be fetched), a message and the response. The `fields` attribute of the response holds
+                the cached product fields if the page did not change since it was last parsed, None otherwise.
+        """
+        try:
+            response = self.http.get(product.url)
+            response.raise_for_status()
+        except Exception as e:
+            return 1, e.args[0], None
+
+        if not response.unchanged:
+            response.fields = None
+
+        return 0, "OK", response
+
+    def _set_product_fields(self, product: Product, fields: Dict, cache: bool = True):
+        """
+        Updates the product with the fields extracted from its page and stores them in the response cache.
+        """
+        for name, value in fields.items():
+            setattr(product, name, value)
+
+        if cache and self.http.cache is not None:
+            self.http.cache.put_fields(product.url, fields)
+
+    def _extract_product_fields(self, html: Union[str, bytes], encoding: str = None) -> Dict:
+        """
+        Extracts the product fields from the product page.
+
+        Args:
+            html (Union[str, bytes]): The product page.
+            encoding (str, optional): The encoding of the page if it is passed as bytes.
+
+        Returns:
+            Dict: The product attributes found on the page (name, description, price, image_url).
+        """
+        return parse_product_html(self.parser_type, html, encoding)
+
+    def _fetch_pages(self, urls: List[str]) -> List[requests.Response]:
+        """
+        Fetches the catalog pages concurrently with at most `http_params["max_workers"]` requests in flight.
+
+        Args:
+            urls (List[str]): The urls of the pages to fetch.
+
+        Returns:
+            List[requests.Response]: The responses in the order of the urls.
+
+        Raises:
+            Exception: The first exception raised while fetching a page.
+        """
+        with ThreadPoolExecutor(max_workers=http_params["max_workers"]) as executor:
+            return list(tqdm(executor.map(self.http.get, urls), total=len(urls)))
+
+    def _deduplicate_products(self):
+        """
+        Removes the products with repeated urls, keeping the first occurrence.
+        """
+        seen = set()
+        products = []
+
+        for product in self.products:
+            if product.url not in seen:
+                seen.add(product.url)
+                products.append(product)
+
+        self.products = products
 
     def _get_max_pages(self, url: str = None) -> int:
         """
@@ -104,45 +345,215 @@ class BaseParser:
         """
         pass
 
+    # the product keeps its id and row, and the price changes are appended to `price_history` by the triggers
+    # of the table. The content columns of a stored product are only written when its content changed (or it
+    # comes back to the catalog); the crawl of an unchanged product only updates its timestamps with `touch_query`
+    save_query = """
+        insert into products (
+            source, url, name, description, price, image_url, brand, name_emb, descr_emb, crawled_at, seen_at, gone_at
+        )
+        values(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, null)
+        on conflict (source, url) do update set
+            name = excluded.name,
+            description = excluded.description,
+            price = excluded.price,
+            image_url = excluded.image_url,
+            brand = excluded.brand,
+            name_emb = excluded.name_emb,
+            descr_emb = excluded.descr_emb,
+            crawled_at = excluded.crawled_at,
+            seen_at = excluded.seen_at,
+            gone_at = null
+        where products.name is not excluded.name
+            or products.description is not excluded.description
+            or products.price is not excluded.price
+            or products.image_url is not excluded.image_url
+            or products.brand is not excluded.brand
+            or products.name_emb is not excluded.name_emb
+            or products.descr_emb is not excluded.descr_emb
+            or products.gone_at is not null
+    """
+
+    # records the crawl of the products left unchanged by `save_query`, the rows it wrote already have the timestamp
+    touch_query = """
+        update products set crawled_at = ?, seen_at = ?
+        where source = ? and url = ? and crawled_at is not ?;
+    """
+
     @staticmethod
-    def save_single_product(conn: SQLiteConnector, p: Product) -> Tuple[int, str]:
-        query = """
-            insert or replace into products (source, url, name, description, price, image_url, name_emb, descr_emb)
-            values(?, ?, ?, ?, ?, ?, ?, ?)
+    def _product_params(p: Product) -> Tuple:
+        """
+        Returns the parameters of `save_query` for a product.
         """
-
         name_emb = None if p.name_emb is None else p.name_emb.tobytes()
         descr_emb = None if p.descr_emb is None else p.descr_emb.tobytes()
+        now = datetime.now().isoformat()
 
-        params = (
+        return (
             p.source,
             p.url,
             p.name,
             p.description,
             p.price,
             p.image_url,
+            p.brand or None,
             name_emb,
             descr_emb,
+            now,
+            now,
         )
 
-        status_code, status_message = conn.execute_query(query, params)
+    @staticmethod
+    def save_batch(conn: SQLiteConnector, products: List[Product],
+                   chunk_size: int = None) -> Tuple[int, str, List[Tuple[int, str]]]:
+        """
+        Saves products with `save_query` and records the crawl of the unchanged ones with `touch_query`.
+
+        Args:
+            conn (SQLiteConnector): The open connection.
+            products (List[Product]): The products to save.
+            chunk_size (int, optional): The number of rows committed in one transaction, all of them by default.
+
+        Returns:
+            Tuple[int, str, List[Tuple[int, str]]]: A tuple containing a status code, a message and the failed
+                products as (index in `products`, error message).
+        """
+        chunk_size = chunk_size or max(1, len(products))
+        params = [BaseParser._product_params(p) for p in products]
+        status_code, status_message, failed = conn.executemany(BaseParser.save_query, params, chunk_size=chunk_size)
+
+        if status_code != 0:
+            return status_code, status_message, failed
+
+        failed_idx = {i for i, _ in failed}
+        saved = [i for i in range(len(products)) if i not in failed_idx]
+        # source, url and the crawl time of every saved product
+        touch_params = [(params[i][9], params[i][10], params[i][0], params[i][1], params[i][9]) for i in saved]
+        status_code, status_message, touch_failed = conn.executemany(
+            BaseParser.touch_query, touch_params, chunk_size=chunk_size
+        )
+
+        if status_code != 0:
+            return status_code, status_message, failed
+
+        return 0, "OK", sorted(failed + [(saved[i], reason) for i, reason in touch_failed])
+
+    @staticmethod
+    def save_single_product(conn: SQLiteConnector, p: Product) -> Tuple[int, str]:
+        status_code, status_message, failed = BaseParser.save_batch(conn, [p])
+
+        if status_code == 0 and failed:
+            return 1, failed[0][1]
 
         return status_code, status_message
 
-    def parse_products(self) -> Tuple[int, int]:
+    def iter_parsed_products(
+        self, products: Iterable[Product] = None, max_workers: int = None, parse_workers: int = None,
+        on_fetched: Callable[[Product], None] = None
+    ) -> Iterator[Tuple[Product, int, str]]:
+        """
+        Parses products concurrently and yields them as soon as they are parsed.
+
+        The product pages are fetched by a pool of threads, the per-host concurrency and
+        rate limits of the HTTP client still apply. The fetched pages are parsed by a pool of
+        processes, so the CPU-bound parsing is not limited to one core by the GIL. At most
+        two products per fetching worker are in flight, so the products are not all held in
+        memory at once.
+
+        Args:
+            products (Iterable[Product], optional): The products to parse, defaults to the products in the list.
+            max_workers (int, optional): The number of worker threads, defaults to `http_params["max_workers"]`.
+            parse_workers (int, optional): The number of parsing processes, 0 to parse in the fetching threads,
+                defaults to `parse_params["max_workers"]`.
+            on_fetched (Callable[[Product], None], optional): Called with every product whose page was fetched,
+                before the page is parsed.
+
+        Yields:
+            Tuple[Product, int, str]: The product, the parsing status (0 for success, non-zero for error) and a message.
+        """
+        max_workers = max_workers or http_params["max_workers"]
+        parse_workers = parse_params["max_workers"] if parse_workers is None else parse_workers
+        products = iter(self.products if products is None else products)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            parse_pool = ProcessPoolExecutor(max_workers=parse_workers) if parse_workers else None
+            fetching = {}
+            parsing = {}
+
+            def fetch_next(qty: int):
+                for next_product in islice(products, qty):
+                    fetching[executor.submit(self._fetch_product_page, next_product)] = next_product
+
+            def parse(page: requests.Response):
+                nonlocal parse_pool
+
+                if parse_pool is not None:
+                    try:
+                        return parse_pool.submit(parse_product_html, self.parser_type, page.content, page.encoding)
+                    except BrokenProcessPool:
+                        logger.warning("The parsing processes terminated abruptly, parsing in the fetching threads.")
+                        parse_pool = None
+
+                return executor.submit(self._extract_product_fields, page.content, page.encoding)
+
+            try:
+                fetch_next(2 * max_workers)
+
+                while fetching or parsing:
+                    done, _ = wait([*fetching, *parsing], return_when=FIRST_COMPLETED)
+
+                    for future in done:
+                        if future in fetching:
+                            product = fetching.pop(future)
+
+                            try:
+                                status_code, status_message, page = future.result()
+                            except Exception as e:
+                                status_code, status_message, page = 1, str(e), None
+
+                            if status_code == 0 and on_fetched is not None:
+                                on_fetched(product)
+
+                            if status_code == 0 and page.fields is None:
+                                parsing[parse(page)] = product
+                                continue
+
+                            if status_code == 0:
+                                self._set_product_fields(product, page.fields, cache=False)
+                        else:
+                            product = parsing.pop(future)
+
+                            try:
+                                self._set_product_fields(product, future.result())
+                                status_code, status_message = 0, "OK"
+                            except Exception as e:
+                                status_code, status_message = 2, str(e)
+
+                        fetch_next(1)
+
+                        yield product, status_code, status_message
+            finally:
+                if parse_pool is not None:
+                    parse_pool.shutdown(cancel_futures=True)
+
+    def parse_products(self, max_workers: int = None, parse_workers: int = None) -> Tuple[int, int]:
         """
         Parses all products in the list.
 
+        Args:
+            max_workers (int, optional): The number of worker threads, defaults to `http_params["max_workers"]`.
+            parse_workers (int, optional): The number of parsing processes, defaults to `parse_params["max_workers"]`.
+
         Returns:
             Tuple[int, int]: A tuple containing the total number of products processed and the number of errors encountered.
         """
         err_qty = 0
         prc_qty = 0
 
-        for product in (pbar := tqdm(self.products)):
-            pbar.set_description(f"Product #{prc_qty + 1} processed ...")
+        parsed = self.iter_parsed_products(max_workers=max_workers, parse_workers=parse_workers)
 
-            status_code, status_message = self._parse_single_product(product)
+        for product, status_code, status_message in (pbar := tqdm(parsed, total=len(self.products))):
+            pbar.set_description(f"Product #{prc_qty + 1} processed ...")
 
             if status_code != 0:
                 print(f"Product parsing error: {product}")
@@ -154,25 +565,30 @@ class BaseParser:
 
         return prc_qty, err_qty
 
-    def gen_embeddings(self) -> Tuple[int, int]:
+    def gen_embeddings(self, batch_size: int = None) -> Tuple[int, int]:
         """
         Generate embeddings for the products in the controller.
 
-        This method iterates over each product in the controller and generates embeddings for
-        the product's name and description using the embedder specified in the controller.
+        The names and descriptions of all the products are embedded in bulk with
+        `ProductEmbedder.embed_batch` using length-sorted batches.
+
+        Args:
+            batch_size (int, optional): The number of texts encoded at once, defaults to `embedder_params["batch_size"]`.
 
         Returns:
             Tuple[int, int]: A tuple containing the total number of products processed and the number
                 of errors encountered during embedding generation.
         """
         err_qty = 0
-        prc_qty = 0
 
-        for product in (pbar := tqdm(self.products)):
-            pbar.set_description(f"Product #{prc_qty + 1} processed ...")
+        texts = [product.name for product in self.products] + [product.description for product in self.products]
+        embeddings = self.embedder.embed_batch(
+            texts, batch_size=batch_size or embedder_params["batch_size"], show_progress=True
+        )
 
-            product.name_emb = self.embedder.embed_description(product.name)
-            product.descr_emb = self.embedder.embed_description(product.description)
+        for i, product in enumerate(self.products):
+            product.name_emb = None if embeddings is None else embeddings[i]
+            product.descr_emb = None if embeddings is None else embeddings[len(self.products) + i]
 
             if product.name_emb is None:
                 print(f"Error generating embedding for product name: {product}")
@@ -182,22 +598,20 @@ class BaseParser:
                 print(f"Error generating embedding for product description: {product}")
                 err_qty += 1
 
-            prc_qty += 1
-
-        return prc_qty, err_qty
+        return len(self.products), err_qty
 
     def save_products(self) -> Tuple[int, int]:
         """
         Saves all products in the list to an SQLite database and tracks the progress.
 
-        This function attempts to connect to an SQLite database and iterates through
-        each product in the product list. Each product is saved using the
-        save_single_product method. It provides feedback on the progress and logs any errors encountered.
+        This function attempts to connect to an SQLite database and writes the products with
+        `save_batch` in chunked transactions of `db_params["chunk_size"]` rows.
+        A failing product does not abort its chunk, the errors are reported per product.
 
         Returns:
             Tuple[int, int]: A tuple containing the total number of products saved and the number of errors encountered.
         """
-        conn = SQLiteConnector(db_params["db_file"])
+        conn = SQLiteConnector(db_params["db_file"], pragmas=db_params["pragmas"])
         status_code, status_message = conn.connect()
 
         if status_code != 0:
@@ -206,19 +620,24 @@ class BaseParser:
 
         err_qty = 0
         svd_qty = 0
+        chunk_size = db_params["chunk_size"]
 
-        for product in (pbar := tqdm(self.products)):
+        for start in (pbar := tqdm(range(0, len(self.products), chunk_size))):
             pbar.set_description(f"Product #{svd_qty + 1} saved ...")
 
-            status_code, status_message = BaseParser.save_single_product(conn, product)
+            chunk = self.products[start:start + chunk_size]
+            status_code, status_message, failed = self.save_batch(conn, chunk, chunk_size)
 
             if status_code != 0:
-                print(f"Product saving error: {product}")
-                print(f"Reason: {status_message}")
+                failed = [(i, status_message) for i in range(len(chunk))]
+
+            for i, reason in failed:
+                print(f"Product saving error: {chunk[i]}")
+                print(f"Reason: {reason}")
                 print("")
                 err_qty += 1
 
-            svd_qty += 1
+            svd_qty += len(chunk)
 
         conn.close()
 
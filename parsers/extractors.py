@@ -0,0 +1,121 @@
+from typing import Callable, Dict, Union
+from parsers.soup import make_soup, only
+
+# The extraction of the product fields from the product pages. The functions only depend on the page,
+# so they can run in worker processes: this module must not import the parsers, the database or the models.
+
+# the parts of the product pages the extraction reads, the rest of the page is not parsed
+moonglow_product_strainer = only(
+    ("h1", "product_title entry-title wd-entities-title"),
+    ("div", "wc-tab-inner wd-scroll-content"),
+    ("span", "woocommerce-Price-amount amount"),
+    ("img", "wp-post-image wp-post-image"),
+)
+myskin_product_strainer = only(
+    ("span", "acc-title"),
+    ("li", "acc-block_item"),
+    ("a", "gall-img img-0 active"),
+)
+
+
+def extract_moonglow_product(html: Union[str, bytes], encoding: str = None) -> Dict:
+    """Extracts the details of a single product from its MoonGlow webpage.
+
+    Extracts the product name, description, price, and image URL from the product's webpage.
+
+    Args:
+        html (Union[str, bytes]): The product page.
+        encoding (str, optional): The encoding of the page if it is passed as bytes.
+
+    Returns:
+        Dict: The product name, description, price and image URL.
+    """
+    soup = make_soup(html, moonglow_product_strainer, encoding)
+    fields = {}
+
+    fields['name'] = soup.find('h1', class_='product_title entry-title wd-entities-title').get_text(strip=True)
+
+    fields['description'] = soup.find('div', class_='wc-tab-inner wd-scroll-content').get_text(strip=True)
+
+    fields['price'] = soup.findAll('span', class_='woocommerce-Price-amount amount')[-1].\
+        get_text(strip=True).lower().strip('mdl').replace(',', '.')
+
+    image_element = soup.find('img', class_='wp-post-image wp-post-image')
+    if image_element:
+        fields['image_url'] = image_element['src']
+
+    return fields
+
+
+def extract_myskin_product(html: Union[str, bytes], encoding: str = None) -> Dict:
+    """Extracts the details of a single product from its MySkin webpage.
+
+    Extracts the product description and image URL from the product's webpage,
+    the name and the price come from the catalog.
+
+    Args:
+        html (Union[str, bytes]): The product page.
+        encoding (str, optional): The encoding of the page if it is passed as bytes.
+
+    Returns:
+        Dict: The product description and image URL, if found.
+    """
+    soup = make_soup(html, myskin_product_strainer, encoding)
+    fields = {}
+
+    description_title = soup.find("span", class_="acc-title", string="Описание")
+    if description_title:
+        description_item = description_title.find_parent(
+            "li", class_="acc-block_item"
+        )
+
+        if description_item:
+            description_content = description_item.find(
+                "div", class_="acc-content"
+            )
+
+            if description_content:
+                paragraphs = description_content.find_all("p")
+
+                if paragraphs and paragraphs[0].get_text(strip=True).startswith(
+                    "Рекомендуем"
+                ):
+                    paragraphs.pop(0)
+
+                fields["description"] = "\n".join(
+                    p.get_text(strip=True) for p in paragraphs
+                )
+
+    a_tag = soup.find("a", class_="gall-img img-0 active")
+
+    if a_tag:
+        fields["image_url"] = f"https://myskin.md{a_tag.get('href')}"
+
+    return fields
+
+
+product_extractors: Dict[str, Callable[..., Dict]] = {
+    "moonglow": extract_moonglow_product,
+    "myskin": extract_myskin_product,
+}
+
+
+def parse_product_html(source: str, html: Union[str, bytes], encoding: str = None) -> Dict:
+    """
+    Extracts the product fields from a product page of a source.
+
+    Args:
+        source (str): The source of the product, one of `parser_types`.
+        html (Union[str, bytes]): The product page.
+        encoding (str, optional): The encoding of the page if it is passed as bytes, detected from the page if omitted.
+
+    Returns:
+        Dict: The product attributes found on the page (name, description, price, image_url).
+
+    Raises:
+        ValueError: If there is no extractor for the source.
+    """
+    if source not in product_extractors:
+        raise ValueError(f"No product page extractor for the source `{source}`.")
+
+    return product_extractors[source](html, encoding)
@@ -0,0 +1,153 @@
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+import hashlib
+import json
+import threading
+import zlib
+from db.connector import SQLiteConnector
+
+
+@dataclass
+class CachedPage:
+    """A page stored in the response cache.
+
+    Attributes:
+        url (str): The url of the page.
+        body (bytes): The body of the response.
+        body_hash (str): The SHA-1 hash of the body.
+        content_type (str): The Content-Type header of the response.
+        etag (str): The ETag header of the response.
+        last_modified (str): The Last-Modified header of the response.
+        fields (Dict): The product fields parsed from the body, None if not parsed yet.
+    """
+    url: str
+    body: bytes
+    body_hash: str
+    content_type: Optional[str] = None
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    fields: Optional[Dict] = None
+
+
+class ResponseCache:
+    """
+    On-disk cache of HTTP responses keyed by url.
+
+    Bodies are stored zlib-compressed together with their validators (ETag and Last-Modified)
+    and a hash, so unchanged pages can be revalidated with conditional requests and the
+    fields parsed from them can be reused. The cache is safe to use from several threads.
+
+    Example:
+        cache = ResponseCache('db/http_cache.db')
+        status_code, status_message = cache.connect()
+        page = cache.get('https://myskin.md/brendy')
+    """
+
+    def __init__(self, db_file: str):
+        """
+        Args:
+            db_file (str): The path to the SQLite database file of the cache.
+        """
+        self.conn = SQLiteConnector(db_file, check_same_thread=False)
+        self._lock = threading.Lock()
+
+    def connect(self) -> Tuple[int, str]:
+        """
+        Open the cache database, creating the table if needed.
+
+        Returns:
+            Tuple[int, str]: A tuple containing a status code and a message.
+        """
+        status_code, status_message = self.conn.connect()
+
+        if status_code != 0:
+            return status_code, status_message
+
+        query = """
+            create table if not exists responses (
+                url text primary key,
+                body blob not null,
+                body_hash text not null,
+                content_type text,
+                etag text,
+                last_modified text,
+                fields text,
+                fetched_at text not null
+            );
+        """
+
+        return self.conn.execute_query(query)
+
+    def close(self):
+        self.conn.close()
+
+    @staticmethod
+    def hash_body(body: bytes) -> str:
+        return hashlib.sha1(body).hexdigest()
+
+    def get(self, url: str) -> Optional[CachedPage]:
+        """
+        Return the cached page of the url, None if the url is not cached.
+        """
+        query = """
+            select body, body_hash, content_type, etag, last_modified, fields
+            from responses where url = ?;
+        """
+
+        with self._lock:
+            status_code, _, result = self.conn.execute_read_query(query, (url,))
+
+        if status_code != 0 or not result:
+            return None
+
+        body, body_hash, content_type, etag, last_modified, fields = result[0]
+
+        return CachedPage(
+            url=url,
+            body=zlib.decompress(body),
+            body_hash=body_hash,
+            content_type=content_type,
+            etag=etag,
+            last_modified=last_modified,
+            fields=None if fields is None else json.loads(fields),
+        )
+
+    def put(self, url: str, body: bytes, content_type: str = None, etag: str = None,
+            last_modified: str = None) -> Tuple[int, str]:
+        """
+        Store the page of the url. The parsed fields are kept only if the body did not change.
+        """
+        query = """
+            insert into responses (url, body, body_hash, content_type, etag, last_modified, fetched_at)
+            values (?, ?, ?, ?, ?, ?, ?)
+            on conflict (url) do update set
+                body = excluded.body,
+                fields = case when body_hash = excluded.body_hash then fields end,
+                body_hash = excluded.body_hash,
+                content_type = excluded.content_type,
+                etag = excluded.etag,
+                last_modified = excluded.last_modified,
+                fetched_at = excluded.fetched_at;
+        """
+        params = (
+            url,
+            zlib.compress(body),
+            self.hash_body(body),
+            content_type,
+            etag,
+            last_modified,
+            datetime.now().isoformat(),
+        )
+
+        with self._lock:
+            return self.conn.execute_query(query, params)
+
+    def put_fields(self, url: str, fields: Dict) -> Tuple[int, str]:
+        """
+        Store the product fields parsed from the cached page of the url.
+        """
+        query = "update responses set fields = ? where url = ?;"
+
+        with self._lock:
+            return self.conn.execute_query(query, (json.dumps(fields, ensure_ascii=False), url))
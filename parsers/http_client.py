@@ -0,0 +1,261 @@
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+from loguru import logger
+from requests.adapters import HTTPAdapter
+from parsers.http_cache import ResponseCache, CachedPage
+import random
+import threading
+import time
+import requests
+
+
+class HostLimiter:
+    """
+    Limits the number of simultaneous requests and the request rate per host.
+
+    Attributes:
+    - max_per_host (int): The maximum number of simultaneous requests to the same host.
+    - rate_limit (float): The maximum number of requests per second to the same host, 0 for no limit.
+    """
+
+    def __init__(self, max_per_host: int, rate_limit: float = 0):
+        self.max_per_host = max_per_host
+        self.rate_limit = rate_limit
+        self._lock = threading.Lock()
+        self._semaphores: Dict[str, threading.Semaphore] = {}
+        self._next_slot: Dict[str, float] = {}
+
+    @contextmanager
+    def limit(self, url: str):
+        """
+        Block until a request to the host of the url is allowed and hold the host slot.
+
+        Args:
+            url (str): The url to request.
+        """
+        host = urlsplit(url).netloc
+
+        with self._lock:
+            semaphore = self._semaphores.setdefault(host, threading.Semaphore(self.max_per_host))
+
+        with semaphore:
+            if self.rate_limit > 0:
+                with self._lock:
+                    now = time.monotonic()
+                    slot = max(now, self._next_slot.get(host, now))
+                    self._next_slot[host] = slot + 1 / self.rate_limit
+
+                time.sleep(max(0.0, slot - now))
+
+            yield
+
+
+class HttpClient:
+    """
+    HTTP client shared by the parser threads.
+
+    Requests go through a pooled keep-alive session, so connections to a host are reused
+    instead of paying the TCP/TLS handshake for every page. Connection errors, timeouts,
+    429 and 5xx responses are retried with exponential backoff and jitter, honoring the
+    Retry-After header.
+
+    Attributes:
+    - headers (dict): The headers to be used in HTTP requests.
+    - timeout (float): The request timeout in seconds.
+    - max_retries (int): The number of retries of a failed request.
+    - backoff_factor (float): The base delay in seconds of the exponential backoff.
+    - max_backoff (float): The maximum delay in seconds between retries.
+    - limiter (HostLimiter): The per-host concurrency and rate limiter.
+    - session (requests.Session): The pooled session.
+    - cache (ResponseCache): The response cache, None to disable caching.
+    - offline (bool): Serve pages only from the cache, without touching the network.
+
+    Every returned response has two extra attributes:
+    - unchanged (bool): The page is the same as the cached one (304 or same body hash).
+    - fields (Dict): The product fields parsed from the unchanged page earlier, if any.
+
+    Example:
+        client = HttpClient(headers={"User-Agent": user_agent}, max_per_host=4, rate_limit=5)
+        response = client.get("https://myskin.md/brendy")
+    """
+
+    retry_statuses = {429, 500, 502, 503, 504}
+
+    def __init__(
+        self,
+        headers: Dict[str, str],
+        max_per_host: int = 4,
+        rate_limit: float = 0,
+        timeout: float = 30,
+        max_retries: int = 3,
+        backoff_factor: float = 0.5,
+        max_backoff: float = 30,
+        pool_size: int = 10,
+        cache: ResponseCache = None,
+        offline: bool = False,
+    ):
+        self.headers = headers
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.limiter = HostLimiter(max_per_host, rate_limit)
+        self.cache = cache
+        self.offline = offline
+
+        self.session = requests.Session()
+        self.session.headers.update(headers)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def close(self):
+        """
+        Close the pooled connections and the response cache.
+        """
+        self.session.close()
+
+        if self.cache is not None:
+            self.cache.close()
+
+    def _backoff(self, attempt: int) -> float:
+        """Return the delay before the retry number `attempt` (exponential backoff with full jitter)."""
+        return random.uniform(0, min(self.max_backoff, self.backoff_factor * 2 ** attempt))
+
+    def _retry_after(self, response: requests.Response) -> Optional[float]:
+        """Return the delay requested by the Retry-After header of the response, if any."""
+        value = response.headers.get("Retry-After")
+
+        if not value:
+            return None
+
+        try:
+            delay = float(value)
+        except ValueError:
+            try:
+                delay = (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds()
+            except (TypeError, ValueError):
+                return None
+
+        return min(self.max_backoff, max(0.0, delay))
+
+    @staticmethod
+    def _from_cache(page: CachedPage) -> requests.Response:
+        """Build a response from a cached page."""
+        response = requests.Response()
+        response.status_code = 200
+        response.reason = "OK"
+        response.url = page.url
+        response._content = page.body
+
+        if page.content_type:
+            response.headers["Content-Type"] = page.content_type
+
+        response.unchanged = True
+        response.fields = page.fields
+
+        return response
+
+    @staticmethod
+    def _offline_miss(url: str) -> requests.Response:
+        """Build the response returned in offline mode for a page missing from the cache."""
+        response = requests.Response()
+        response.status_code = 504
+        response.reason = "Not in cache (offline mode)"
+        response.url = url
+        response._content = b""
+        response.unchanged = False
+        response.fields = None
+
+        return response
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        """
+        Send a GET request, revalidating the cached page of the url if there is one.
+
+        Args:
+            url (str): The url to request.
+            **kwargs: Additional arguments passed to `requests.Session.get`.
+
+        Returns:
+            requests.Response: The response, built from the cache if the page did not change.
+        """
+        page = None if self.cache is None else self.cache.get(url)
+
+        if self.offline:
+            return self._offline_miss(url) if page is None else self._from_cache(page)
+
+        if page is not None:
+            headers = dict(kwargs.pop("headers", None) or {})
+
+            if page.etag:
+                headers["If-None-Match"] = page.etag
+            if page.last_modified:
+                headers["If-Modified-Since"] = page.last_modified
+
+            kwargs["headers"] = headers
+
+        response = self._send(url, **kwargs)
+
+        if page is not None and response.status_code == 304:
+            return self._from_cache(page)
+
+        response.unchanged = False
+        response.fields = None
+
+        if self.cache is not None and response.status_code == 200:
+            if page is not None and page.body_hash == self.cache.hash_body(response.content):
+                response.unchanged = True
+                response.fields = page.fields
+
+            self.cache.put(
+                url,
+                response.content,
+                content_type=response.headers.get("Content-Type"),
+                etag=response.headers.get("ETag"),
+                last_modified=response.headers.get("Last-Modified"),
+            )
+
+        return response
+
+    def _send(self, url: str, **kwargs) -> requests.Response:
+        """
+        Send a GET request respecting the per-host limits, retrying transient failures.
+
+        Args:
+            url (str): The url to request.
+            **kwargs: Additional arguments passed to `requests.Session.get`.
+
+        Returns:
+            requests.Response: The response, the last one if all the retries failed.
+
+        Raises:
+            requests.RequestException: If the last retry failed with a connection error or a timeout.
+        """
+        kwargs.setdefault("timeout", self.timeout)
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                with self.limiter.limit(url):
+                    response = self.session.get(url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt == self.max_retries:
+                    raise
+
+                delay = self._backoff(attempt)
+                logger.debug(f"Retrying {url} in {delay:.1f}s after error: {e}")
+            else:
+                if response.status_code not in self.retry_statuses or attempt == self.max_retries:
+                    return response
+
+                delay = self._retry_after(response)
+                if delay is None:
+                    delay = self._backoff(attempt)
+
+                logger.debug(f"Retrying {url} in {delay:.1f}s after status {response.status_code}")
+                response.close()
+
+            time.sleep(delay)
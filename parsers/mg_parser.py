@@ -1,9 +1,7 @@
-from typing import Tuple
+from typing import List, Tuple, Union
 from parsers.base import Product, BaseParser
-from tqdm import tqdm
-from bs4 import BeautifulSoup
+from parsers.soup import make_soup, only
 from loguru import logger
-import requests
 import re
 import math
 
@@ -14,10 +12,20 @@ class MoonGlowParser(BaseParser):
     This class inherits from BaseParser and is used to parse the product catalog from the MoonGlow website.
     """
 
+    # number of products on a catalog page, the `loop` url parameter is the offset of the page
+    products_per_page = 30
+
+    # the parts of the pages the parser reads, the rest of the page is not parsed
+    catalog_strainer = only(("div", r'\"wd-entities-title\"'))
+    count_strainer = only(("p", "woocommerce-result-count"))
+
     def parse_catalog(self) -> Tuple[int, str]:
         """Parses the product catalog from the MoonGlow website.
 
-        Iterates through the catalog pages and extracts product information.
+        Fetches the catalog pages concurrently and extracts product information in page order.
+        A 404 after the first page is the normal end of the listing, shorter than the number of pages
+        announced. The discovery fails if the number of pages is unknown, the first page is missing or
+        a page could not be fetched for another reason, the products found on the other pages are kept.
 
         Returns:
             Tuple[int, str]: A tuple containing the parsing status (0 for success, non-zero for error) and a message.
@@ -27,72 +35,64 @@ class MoonGlowParser(BaseParser):
 
         if max_pages == 0:
             logger.warning('The number of pages in the catalog is 0.')
-            return 0, 'OK'
+            return 1, 'The number of pages in the catalog is unknown.'
+
+        failed_pages = []
 
         try:
             for url in self.prod_urls:
-                loop = 0
                 logger.info(f'url: {url}')
 
-                for i in (pbar:=tqdm(range(1, max_pages + 1))):
-                    pbar.set_description(f'{len(self.products)} products')
-
-                    response = requests.get(url.format(page=i, loop=loop), headers=self.headers)
-                    soup = BeautifulSoup(response.content, "html.parser")
+                page_urls = [
+                    url.format(page=i, loop=(i - 1) * self.products_per_page)
+                    for i in range(1, max_pages + 1)
+                ]
 
+                for i, response in enumerate(self._fetch_pages(page_urls), start=1):
                     if (response.status_code != 200):
+                        # a 404 ends the listing, unless there is no listing at all
+                        if response.status_code != 404 or i == 1:
+                            failed_pages.append(i)
+
                         if response.status_code == 404:
-                            logger.wa(f'Exit! Page #{i}: 404 error.')
+                            logger.warning(f'Exit! Page #{i}: 404 error.')
                             break
                         else:
                             print(f"Page #{i} status_code: {response.status_code}")
                             continue
 
-                    page_products = soup.findAll("div", {"class": r'\"wd-entities-title\"'})
-
-                    if len(page_products) != 0:
-                        for item in page_products:
-                            item_head = item.select('a[href]')[0]
-                            item_url = item_head['href'].replace('\\', '').strip('"''"')
+                    self.products.extend(self._extract_catalog_products(response.content))
 
-                            self.products.append(Product(source=self.parser_type, url=item_url))
-
-                        loop += len(page_products)
+            self._deduplicate_products()
         except Exception as e:
             return 1, e.args[0]
 
-        return 0, 'OK'
+        if failed_pages:
+            return 1, f'{len(failed_pages)} catalog pages could not be fetched, first page: #{failed_pages[0]}'
 
-    def _parse_single_product(self, product: Product) -> Tuple[int, str]:
-        """Parses the details of a single product from its webpage.
+        return 0, 'OK'
 
-        Extracts the product name, description, price, and image URL from the product's webpage.
+    def _extract_catalog_products(self, html: Union[str, bytes]) -> List[Product]:
+        """Extracts the products listed on a catalog page.
 
         Args:
-            product (Product): The product object to be updated with details.
+            html (Union[str, bytes]): The catalog page.
 
         Returns:
-            Tuple[int, str]: A tuple containing the parsing status (0 for success, non-zero for error) and a message.
+            List[Product]: The products with their url.
         """
-        try:
-            response = requests.get(product.url, headers=self.headers)
-            response.raise_for_status()
-            soup = BeautifulSoup(response.text, 'html.parser')
-
-            product.name = soup.find('h1', class_='product_title entry-title wd-entities-title').get_text(strip=True)
+        soup = make_soup(html, self.catalog_strainer)
+        products = []
 
-            product.description = soup.find('div', class_='wc-tab-inner wd-scroll-content').get_text(strip=True)
+        for item in soup.findAll("div", {"class": r'\"wd-entities-title\"'}):
+            # the escaped closing tags are not recognized, so the items are nested in each other:
+            # `find` stops at the first link instead of matching a css selector over the whole subtree
+            item_head = item.find('a', href=True)
+            item_url = item_head['href'].replace('\\', '').strip('"''"')
 
-            product.price = soup.findAll('span', class_='woocommerce-Price-amount amount')[-1].\
-                get_text(strip=True).lower().strip('mdl').replace(',', '.')
+            products.append(Product(source=self.parser_type, url=item_url))
 
-            image_element = soup.find('img', class_='wp-post-image wp-post-image')
-            if image_element:
-                product.image_url = soup.find('img', class_='wp-post-image wp-post-image')['src']
-        except Exception as e:
-            return 1, e.args[0]
-
-        return 0, 'OK'
+        return products
 
     def _get_max_pages(self, url: str = None) -> int:
         """
@@ -105,11 +105,10 @@ class MoonGlowParser(BaseParser):
         url = 'https://moonglow.md/ru/catalog/'
 
         max_pages = 0
-        products_per_page = 30
 
         try:
-            response = requests.get(url, headers=self.headers)
-            soup = BeautifulSoup(response.content, 'html.parser')
+            response = self.http.get(url)
+            soup = make_soup(response.content, self.count_strainer)
 
             element_count = soup.find('p', class_='woocommerce-result-count')
 
@@ -118,7 +117,7 @@ class MoonGlowParser(BaseParser):
                 match = re.search(pattern, products_qty)
 
                 if match:
-                    max_pages = math.ceil(int(match.group(1)) / products_per_page)
+                    max_pages = math.ceil(int(match.group(1)) / self.products_per_page)
         except Exception as e:
             logger.exception(f'Unable to determine the number of pages in the catalog: {e}.')
 
@@ -1,9 +1,9 @@
-from typing import Tuple, List
+from typing import Tuple, List, Union
 from parsers.base import Product, BaseParser
-from tqdm import tqdm
-from bs4 import BeautifulSoup
+from config import http_params
+from concurrent.futures import ThreadPoolExecutor
+from parsers.soup import make_soup, only
 from loguru import logger
-import requests
 
 
 class MySkinParser(BaseParser):
@@ -12,10 +12,20 @@ class MySkinParser(BaseParser):
     This class inherits from BaseParser and is used to parse the products from the MySkin website.
     """
 
+    # the parts of the pages the parser reads, the rest of the page is not parsed
+    catalog_strainer = only(("div", "product-block"))
+    paginator_strainer = only(("div", "paginator_wrapper"))
+    brands_strainer = only(("a", "brand-name"))
+
     def parse_catalog(self) -> Tuple[int, str]:
         """Parses the product catalog from the MoonGlow MySkin.
 
-        Iterates through the catalog pages and extracts product information.
+        Discovers the number of pages of every brand, fetches all the listing pages concurrently
+        and extracts product information in brand and page order. The products get the brand
+        of the listing they were found in. A 404 after the first page of a brand is the normal
+        end of its listing. The discovery fails if no brand is found, the first page of a brand is
+        missing or a page could not be fetched for another reason, the products found on the other
+        pages are kept.
 
         Returns:
             Tuple[int, str]: A tuple containing the parsing status (0 for success, non-zero for error) and a message.
@@ -23,125 +33,120 @@ class MySkinParser(BaseParser):
         self.products.clear()
 
         try:
-            brand_urls = self._get_brands()
+            brands = self._get_brands()
+            brand_urls = [url for _, url in brands]
+            brand_names = {url: brand for brand, url in brands}
+            failed_pages = []
+
+            if not brands:
+                return 1, "No brands found in the catalog."
 
-            for brand_url in brand_urls:
-                logger.info(f"brand_url: {brand_url}")
+            # discover the number of pages of every brand, then fetch all the pages at once
+            with ThreadPoolExecutor(max_workers=http_params["max_workers"]) as executor:
+                brand_pages = list(executor.map(self._get_max_pages, brand_urls))
 
-                max_pages = self._get_max_pages(brand_url)
+            page_urls = []
+            for brand_url, max_pages in zip(brand_urls, brand_pages):
                 if max_pages == 0:
-                    logger.warning("The number of pages for category is 0.")
+                    logger.warning(f"The number of pages for category is 0: {brand_url}")
+                    failed_pages.append(brand_url)
                     continue
 
-                for i in (pbar := tqdm(range(1, max_pages + 1))):
-                    pbar.set_description(f"{len(self.products)} products")
+                page_urls.extend(
+                    (brand_url, i, f"{brand_url}?page={i}") for i in range(1, max_pages + 1)
+                )
 
-                    response = requests.get(
-                        url=f"{brand_url}?page={i}", headers=self.headers
-                    )
-                    soup = BeautifulSoup(response.content, "html.parser")
-
-                    if response.status_code != 200:
-                        if response.status_code == 404:
-                            logger.warning(f"Exit! Page #{i}: 404 error.")
-                            break
-                        else:
-                            print(f"Page #{i} status_code: {response.status_code}")
-                            continue
-
-                    for product in soup.find_all("div", class_="product-block"):
-                        title = product.find("a", class_="title").text.strip()
-                        href = product.find("a", class_="title")["href"]
-
-                        curr_price = (
-                            float(
-                                product.find("span", class_="new-price").text.strip(
-                                    " MDL"
-                                )
-                            )
-                            if product.find("span", class_="new-price")
-                            else None
-                        )
+            logger.info(f"{len(brand_urls)} brands, {len(page_urls)} pages")
+            responses = self._fetch_pages([url for _, _, url in page_urls])
 
-                        if not curr_price:
-                            curr_price = (
-                                float(
-                                    product.find("span", class_="price").text.strip(
-                                        " MDL"
-                                    )
-                                )
-                                if product.find("span", class_="price")
-                                else None
-                            )
-                        # old_price = (
-                        #     float(product.find("span", class_="old-price").text.strip(" MDL"))
-                        #     if product.find("span", class_="old-price")
-                        #     else None
-                        # )
-
-                        self.products.append(
-                            Product(
-                                source=self.parser_type,
-                                url=f"https://myskin.md{href}",
-                                name=title,
-                                price=curr_price,
-                            )
-                        )
+            skipped_brand = None
+            for (brand_url, i, _), response in zip(page_urls, responses):
+                if brand_url == skipped_brand:
+                    continue
+
+                if response.status_code != 200:
+                    # a 404 ends the listing of the brand, unless there is no listing at all
+                    if response.status_code != 404 or i == 1:
+                        failed_pages.append(f"{brand_url}?page={i}")
+
+                    if response.status_code == 404:
+                        logger.warning(f"Exit! Page #{i} of {brand_url}: 404 error.")
+                        skipped_brand = brand_url
+                    else:
+                        print(f"Page #{i} status_code: {response.status_code}")
+
+                    continue
+
+                products = self._extract_catalog_products(response.content)
+
+                for product in products:
+                    product.brand = brand_names[brand_url]
+
+                self.products.extend(products)
+
+            self._deduplicate_products()
 
         except Exception as e:
             logger.exception(f"Exception while parsing page with products: {e}")
             return 1, e.args[0]
 
-        return 0, "OK"
+        if failed_pages:
+            return 1, f"{len(failed_pages)} catalog pages could not be fetched, first page: {failed_pages[0]}"
 
-    def _parse_single_product(self, product: Product) -> Tuple[int, str]:
-        """Parses the details of a single product from its webpage.
+        return 0, "OK"
 
-        Extracts the product name, description, price, and image URL from the product's webpage.
+    def _extract_catalog_products(self, html: Union[str, bytes]) -> List[Product]:
+        """Extracts the products listed on a catalog page.
 
         Args:
-            product (Product): The product object to be updated with details.
+            html (Union[str, bytes]): The catalog page.
 
         Returns:
-            Tuple[int, str]: A tuple containing the parsing status (0 for success, non-zero for error) and a message.
+            List[Product]: The products with their url, name and price.
         """
-        try:
-            response = requests.get(product.url, headers=self.headers)
-            response.raise_for_status()
-            soup = BeautifulSoup(response.text, "html.parser")
-
-            description_title = soup.find("span", class_="acc-title", string="Описание")
-            if description_title:
-                description_item = description_title.find_parent(
-                    "li", class_="acc-block_item"
-                )
+        soup = make_soup(html, self.catalog_strainer)
+        products = []
 
-                if description_item:
-                    description_content = description_item.find(
-                        "div", class_="acc-content"
-                    )
-
-                    if description_content:
-                        paragraphs = description_content.find_all("p")
+        for product in soup.find_all("div", class_="product-block"):
+            title = product.find("a", class_="title").text.strip()
+            href = product.find("a", class_="title")["href"]
 
-                        if paragraphs and paragraphs[0].get_text(strip=True).startswith(
-                            "Рекомендуем"
-                        ):
-                            paragraphs.pop(0)
+            curr_price = (
+                float(
+                    product.find("span", class_="new-price").text.strip(
+                        " MDL"
+                    )
+                )
+                if product.find("span", class_="new-price")
+                else None
+            )
 
-                        product.description = "\n".join(
-                            p.get_text(strip=True) for p in paragraphs
+            if not curr_price:
+                curr_price = (
+                    float(
+                        product.find("span", class_="price").text.strip(
+                            " MDL"
                         )
+                    )
+                    if product.find("span", class_="price")
+                    else None
+                )
+            # old_price = (
+            #     float(product.find("span", class_="old-price").text.strip(" MDL"))
+            #     if product.find("span", class_="old-price")
+            #     else None
+            # )
+
+            products.append(
+                Product(
+                    source=self.parser_type,
+                    url=f"https://myskin.md{href}",
+                    name=title,
+                    price=curr_price,
+                )
+            )
 
-            a_tag = soup.find("a", class_="gall-img img-0 active")
-
-            if a_tag:
-                product.image_url = f"https://myskin.md{a_tag.get('href')}"
-
-        except Exception as e:
-            return 1, e.args[0]
-
-        return 0, "OK"
+        return products
 
     def _get_max_pages(self, url: str = None) -> int:
         """
@@ -153,8 +158,8 @@ class MySkinParser(BaseParser):
         max_pages = 1
 
         try:
-            response = requests.get(url=url, headers=self.headers)
-            soup = BeautifulSoup(response.content, "html.parser")
+            response = self.http.get(url)
+            soup = make_soup(response.content, self.paginator_strainer)
 
             paginator = soup.find("div", class_="paginator_wrapper")
 
@@ -168,13 +173,19 @@ class MySkinParser(BaseParser):
 
         return max_pages
 
-    def _get_brands(self) -> List[str]:
-        response = requests.get(url=self.prod_urls[0], headers=self.headers)
-        soup = BeautifulSoup(response.content, "html.parser")
+    def _get_brands(self) -> List[Tuple[str, str]]:
+        """
+        Gets the brands listed in the catalog.
+
+        Returns:
+            List[Tuple[str, str]]: The names of the brands and the urls of their listings.
+        """
+        response = self.http.get(self.prod_urls[0])
+        soup = make_soup(response.content, self.brands_strainer)
 
-        brand_urls = []
+        brands = []
         for brand_tag in soup.find_all("a", class_="brand-name"):
             brand_href = brand_tag.get("href")
-            brand_urls.append(f"https://myskin.md{brand_href}")
+            brands.append((brand_tag.get_text(strip=True), f"https://myskin.md{brand_href}"))
 
-        return brand_urls
+        return brands
@@ -0,0 +1,445 @@
+from dataclasses import dataclass
+from queue import Queue, Empty
+from typing import Dict, List, Optional, Tuple
+import threading
+import time
+from loguru import logger
+from tqdm import tqdm
+from config import db_params, embedder_params, pipeline_params
+from db.connector import SQLiteConnector
+from db.crawl_state import CrawlState, SourceStates
+from models.embedder import ProductEmbedder
+from parsers.base import BaseParser
+from parsers.product import Product
+
+# marks the end of the stream of a producer
+_DONE = None
+
+
+def _mark(state: Optional[CrawlState], products: List[Product], stage: str, error: str = None, attempt: bool = False):
+    """Move the products to a stage of the crawl state. A failed update is logged: the products keep
+    their previous stage, so `--resume` may crawl them again or skip them."""
+    if state is None or not products:
+        return
+
+    status_code, status_message = state.mark(products, stage, error, attempt)
+
+    if status_code != 0:
+        logger.error(f"Unable to move {len(products)} products to the `{stage}` crawl stage: {status_message}")
+
+
+@dataclass
+class PipelineStats:
+    """Counters of a pipeline run.
+
+    Attributes:
+        parsed (int): The number of parsed products, including the failed ones.
+        parse_errors (int): The number of products that failed to parse.
+        embedded (int): The number of products sent to the embedder.
+        embed_errors (int): The number of missing name or description embeddings.
+        saved (int): The number of products sent to the database, including the failed ones.
+        save_errors (int): The number of products that failed to save.
+    """
+    parsed: int = 0
+    parse_errors: int = 0
+    embedded: int = 0
+    embed_errors: int = 0
+    saved: int = 0
+    save_errors: int = 0
+
+
+class _Stage(threading.Thread):
+    """
+    A pipeline stage running in its own thread.
+
+    Reads products from `in_queue` in micro-batches of up to `batch_size` products, a batch is
+    also flushed when no product arrives for `flush_interval` seconds. The stage stops after it
+    received the end marker from each of its `producers`.
+    """
+
+    def __init__(self, in_queue: Queue, out_queue: Optional[Queue], batch_size: int,
+                 stats: PipelineStats, producers: int = 1, flush_interval: float = 1.0,
+                 state: CrawlState = None):
+        super().__init__(daemon=True)
+        self.in_queue = in_queue
+        self.out_queue = out_queue
+        self.batch_size = batch_size
+        self.stats = stats
+        self.producers = producers
+        self.flush_interval = flush_interval
+        self.state = state
+
+    def process(self, batch: List[Product]):
+        raise NotImplementedError
+
+    def on_error(self, batch: List[Product], error: Exception):
+        """Handle a batch that failed to process, the batch is not passed to the next stage."""
+        pass
+
+    def close(self):
+        pass
+
+    def _flush(self, batch: List[Product]):
+        if not batch:
+            return
+
+        try:
+            self.process(batch)
+        except Exception as e:
+            logger.exception(f"{type(self).__name__} failed on a batch of {len(batch)} products: {e}")
+            self.on_error(batch, e)
+            batch.clear()
+            return
+
+        if self.out_queue is not None:
+            for product in batch:
+                self.out_queue.put(product)
+
+        batch.clear()
+
+    def run(self):
+        batch = []
+        finished = 0
+
+        while finished < self.producers:
+            try:
+                product = self.in_queue.get(timeout=self.flush_interval)
+            except Empty:
+                self._flush(batch)
+                continue
+
+            if product is _DONE:
+                finished += 1
+                continue
+
+            batch.append(product)
+
+            if len(batch) >= self.batch_size:
+                self._flush(batch)
+
+        self._flush(batch)
+        self.close()
+
+        if self.out_queue is not None:
+            self.out_queue.put(_DONE)
+
+
+class EmbedStage(_Stage):
+    """
+    Embeds the names and descriptions of micro-batches of products.
+    """
+
+    def __init__(self, embedder: ProductEmbedder, in_queue: Queue, out_queue: Queue, batch_size: int,
+                 stats: PipelineStats, producers: int = 1, state: CrawlState = None):
+        super().__init__(in_queue, out_queue, batch_size, stats, producers, state=state)
+        self.embedder = embedder
+
+    def process(self, batch: List[Product]):
+        texts = [p.name for p in batch] + [p.description for p in batch]
+        embeddings = self.embedder.embed_batch(texts, batch_size=embedder_params["batch_size"])
+
+        if embeddings is None:
+            # handled by `on_error`: the products without embeddings are not saved over the stored ones
+            raise RuntimeError(f'The embedding model "{self.embedder.model_name}" could not be loaded.')
+
+        for i, product in enumerate(batch):
+            product.name_emb = embeddings[i]
+            product.descr_emb = embeddings[len(batch) + i]
+
+        self.stats.embedded += len(batch)
+        _mark(self.state, batch, CrawlState.EMBEDDED)
+
+    def on_error(self, batch: List[Product], error: Exception):
+        # e.g. the model failed to load: the products are not saved without embeddings and can be resumed
+        self.stats.embed_errors += 2 * len(batch)
+        _mark(self.state, batch, CrawlState.PARSED, error=str(error))
+
+
+class SaveStage(_Stage):
+    """
+    Saves micro-batches of products in single transactions, then drops their description
+    and embeddings, so saved products do not stay in memory.
+
+    The products are written through `conn` when given, the connection of the crawl state shared by
+    all the writers of the crawl, which the stage neither opens nor closes.
+    """
+
+    def __init__(self, in_queue: Queue, batch_size: int, stats: PipelineStats, producers: int = 1,
+                 total: int = None, state: CrawlState = None, conn: SQLiteConnector = None):
+        super().__init__(in_queue, None, batch_size, stats, producers, state=state)
+        self.shared = conn is not None
+        self.conn = conn or SQLiteConnector(db_params["db_file"], check_same_thread=False, pragmas=db_params["pragmas"])
+        self.pbar = tqdm(total=total, desc="Products saved")
+        # the error of the database connection, None when connected
+        self.connect_error: Optional[str] = None
+
+    def run(self):
+        status_code, status_message = (0, "OK") if self.shared else self.conn.connect()
+
+        if status_code != 0:
+            # the queue is still drained, so the other stages are not blocked, and every product fails to save
+            logger.error(f"Unable to connect to the database, no products are saved: {status_message}")
+            self.connect_error = f"Unable to connect to the database: {status_message}"
+
+        super().run()
+
+    def process(self, batch: List[Product]):
+        if self.connect_error is not None:
+            status_code, status_message, failed = 1, self.connect_error, []
+        else:
+            status_code, status_message, failed = BaseParser.save_batch(self.conn, batch)
+
+        if status_code != 0:
+            failed = [(i, status_message) for i in range(len(batch))]
+
+        for i, reason in failed:
+            logger.warning(f"Product saving error: {batch[i].url}, reason: {reason}")
+            _mark(self.state, [batch[i]], CrawlState.EMBEDDED, error=reason)
+
+        failed_idx = {i for i, _ in failed}
+        _mark(self.state, [p for i, p in enumerate(batch) if i not in failed_idx], CrawlState.SAVED)
+
+        self.stats.saved += len(batch)
+        self.stats.save_errors += len(failed)
+        self._release(batch)
+
+    def on_error(self, batch: List[Product], error: Exception):
+        # the products stay embedded in the crawl state and can be resumed
+        self.stats.saved += len(batch)
+        self.stats.save_errors += len(batch)
+        _mark(self.state, batch, CrawlState.EMBEDDED, error=str(error))
+        self._release(batch)
+
+    def _release(self, batch: List[Product]):
+        self.pbar.update(len(batch))
+
+        for product in batch:
+            product.description = ""
+            product.name_emb = None
+            product.descr_emb = None
+
+    def close(self):
+        self.pbar.close()
+
+        if not self.shared:
+            self.conn.close()
+
+
+class CrawlPipeline:
+    """
+    Streaming parse -> embed -> save pipeline.
+
+    Products are parsed by the parser's fetch threads, embedded in micro-batches by the
+    embed stage and saved in batched transactions by the save stage. The stages are
+    connected by bounded queues and run concurrently, so network, inference and disk I/O
+    overlap and only a bounded number of products is in flight at any time. The embedding
+    model is loaded by the embed stage with the first batch, while the next pages are fetched.
+    Products that failed to parse or to embed are not saved, so they do not overwrite the stored ones.
+
+    Example:
+        parser.parse_catalog()
+        stats = CrawlPipeline(parser).run()
+    """
+
+    def __init__(self, parser: BaseParser, embed_batch_size: int = None, save_batch_size: int = None,
+                 queue_size: int = None, state: CrawlState = None, parse_workers: int = None):
+        """
+        Args:
+            parser (BaseParser): The parser with the catalog already parsed.
+            state (CrawlState, optional): The crawl state updated as the products move through the stages.
+            embed_batch_size (int, optional): Products per embedding micro-batch, defaults to `pipeline_params`.
+            save_batch_size (int, optional): Products per save transaction, defaults to `pipeline_params`.
+            queue_size (int, optional): The capacity of the queues between the stages, defaults to `pipeline_params`.
+            parse_workers (int, optional): The number of parsing processes, defaults to `parse_params["max_workers"]`.
+        """
+        self.parser = parser
+        self.embed_batch_size = embed_batch_size or pipeline_params["embed_batch_size"]
+        self.save_batch_size = save_batch_size or pipeline_params["save_batch_size"]
+        self.queue_size = queue_size or pipeline_params["queue_size"]
+        self.state = state
+        self.parse_workers = parse_workers
+        self.stats = PipelineStats()
+        # the fetched products not marked in the crawl state yet
+        self._fetched: List[Product] = []
+
+    def _flush_parsed(self, results: List[Tuple[Product, int, str]], embed_queue: Queue):
+        """Record the parsing results in the crawl state and send the parsed products to the embed stage.
+
+        The state is updated before the products are queued, so a later stage never gets overwritten.
+        """
+        self._flush_fetched()
+
+        _mark(self.state, [p for p, status_code, _ in results if status_code == 0], CrawlState.PARSED, attempt=True)
+
+        # status 1: the page could not be fetched, 2: the page was fetched but not parsed
+        for product, status_code, status_message in results:
+            if status_code != 0:
+                stage = CrawlState.DISCOVERED if status_code == 1 else CrawlState.FETCHED
+                _mark(self.state, [product], stage, error=str(status_message), attempt=True)
+
+        for product, status_code, _ in results:
+            if status_code == 0:
+                embed_queue.put(product)
+
+        results.clear()
+
+    def run(self, products: List[Product] = None) -> PipelineStats:
+        """
+        Run the pipeline over the products.
+
+        Args:
+            products (List[Product], optional): The products to process, defaults to the parser's products.
+
+        Returns:
+            PipelineStats: The counters of the run.
+        """
+        products = self.parser.products if products is None else products
+
+        embed_queue = Queue(maxsize=self.queue_size)
+        save_queue = Queue(maxsize=self.queue_size)
+
+        embed_stage = EmbedStage(self.parser.embedder, embed_queue, save_queue, self.embed_batch_size, self.stats,
+                                 state=self.state)
+        save_stage = SaveStage(save_queue, self.save_batch_size, self.stats, total=len(products), state=self.state,
+                               conn=None if self.state is None else self.state.conn)
+        embed_stage.start()
+        save_stage.start()
+
+        try:
+            self.produce(embed_queue, products)
+        finally:
+            embed_queue.put(_DONE)
+            embed_stage.join()
+            save_stage.join()
+
+        return self.stats
+
+    def _on_fetched(self, product: Product):
+        """Record a fetched product, the fetched products are marked in the crawl state in micro-batches."""
+        if self.state is None:
+            return
+
+        self._fetched.append(product)
+
+        if len(self._fetched) >= self.embed_batch_size:
+            self._flush_fetched()
+
+    def _flush_fetched(self):
+        _mark(self.state, self._fetched, CrawlState.FETCHED)
+        self._fetched = []
+
+    def produce(self, embed_queue: Queue, products: List[Product] = None):
+        """
+        Parse the products and send the parsed ones to the embed stage in micro-batches, without the end marker.
+
+        Args:
+            embed_queue (Queue): The input queue of the embed stage.
+            products (List[Product], optional): The products to process, defaults to the parser's products.
+        """
+        products = self.parser.products if products is None else products
+        results = []
+
+        try:
+            for product, status_code, status_message in self.parser.iter_parsed_products(
+                products, parse_workers=self.parse_workers, on_fetched=self._on_fetched
+            ):
+                self.stats.parsed += 1
+                results.append((product, status_code, status_message))
+
+                if status_code != 0:
+                    logger.warning(f"Product parsing error: {product.url}, reason: {status_message}")
+                    self.stats.parse_errors += 1
+
+                if len(results) >= self.embed_batch_size:
+                    self._flush_parsed(results, embed_queue)
+        finally:
+            self._flush_parsed(results, embed_queue)
+
+
+class CrawlOrchestrator:
+    """
+    Crawls several sources concurrently through one embed stage and one save stage.
+
+    The products of every source are fetched and parsed by its own producer thread (with the fetch
+    threads, rate limits and parsing processes of its parser), so the network waits of the sites
+    overlap and the crawl takes about as long as the slowest site. The parsed products of all the
+    sources are embedded by one embedder, so the model is loaded once, and saved by one save stage.
+    The save stage writes the products through the connection of `SourceStates`, the one the crawl
+    states are updated through, so with the gone and seen marks written by the catalog comparison
+    (see `run_parsing.prepare_crawl`) all the writes of the crawl go through a single connection.
+
+    Example:
+        pipelines = [CrawlPipeline(parser, state=states[parser.parser_type]) for parser in parsers]
+        stats = CrawlOrchestrator(pipelines, parsers[0].embedder, state=states).run()
+    """
+
+    def __init__(self, pipelines: List[CrawlPipeline], embedder: ProductEmbedder, state: SourceStates = None,
+                 embed_batch_size: int = None, save_batch_size: int = None, queue_size: int = None):
+        """
+        Args:
+            pipelines (List[CrawlPipeline]): The pipelines of the sources, only their producers are run.
+            embedder (ProductEmbedder): The embedder shared by the sources.
+            state (SourceStates, optional): The crawl states of the sources updated by the shared stages.
+            embed_batch_size (int, optional): Products per embedding micro-batch, defaults to `pipeline_params`.
+            save_batch_size (int, optional): Products per save transaction, defaults to `pipeline_params`.
+            queue_size (int, optional): The capacity of the queues between the stages, defaults to `pipeline_params`.
+        """
+        self.pipelines = pipelines
+        self.embedder = embedder
+        self.state = state
+        self.embed_batch_size = embed_batch_size or pipeline_params["embed_batch_size"]
+        self.save_batch_size = save_batch_size or pipeline_params["save_batch_size"]
+        self.queue_size = queue_size or pipeline_params["queue_size"]
+        self.stats = PipelineStats()
+        # the crawl time of every source in seconds
+        self.elapsed: Dict[str, float] = {}
+
+    def _produce(self, pipeline: CrawlPipeline, embed_queue: Queue, start: float):
+        source = pipeline.parser.parser_type
+
+        try:
+            pipeline.produce(embed_queue)
+        except Exception as e:
+            logger.exception(f"Crawling [{source}] failed: {e}")
+        finally:
+            embed_queue.put(_DONE)
+            self.elapsed[source] = time.perf_counter() - start
+            logger.info(f"Products of [{source}] parsed in {self.elapsed[source]:.1f}s: "
+                        f"{pipeline.stats.parsed} products, {pipeline.stats.parse_errors} errors")
+
+    def run(self) -> PipelineStats:
+        """
+        Run the pipelines of all the sources.
+
+        Returns:
+            PipelineStats: The counters of all the sources, the parsing counters of every source
+                are in the stats of its pipeline.
+        """
+        embed_queue = Queue(maxsize=self.queue_size)
+        save_queue = Queue(maxsize=self.queue_size)
+
+        embed_stage = EmbedStage(self.embedder, embed_queue, save_queue, self.embed_batch_size, self.stats,
+                                 producers=len(self.pipelines), state=self.state)
+        save_stage = SaveStage(save_queue, self.save_batch_size, self.stats,
+                               total=sum(len(pipeline.parser.products) for pipeline in self.pipelines),
+                               state=self.state, conn=None if self.state is None else self.state.conn)
+        embed_stage.start()
+        save_stage.start()
+
+        start = time.perf_counter()
+        producers = [threading.Thread(target=self._produce, args=(pipeline, embed_queue, start), daemon=True)
+                     for pipeline in self.pipelines]
+
+        for producer in producers:
+            producer.start()
+
+        for producer in producers:
+            producer.join()
+
+        embed_stage.join()
+        save_stage.join()
+
+        self.stats.parsed = sum(pipeline.stats.parsed for pipeline in self.pipelines)
+        self.stats.parse_errors = sum(pipeline.stats.parse_errors for pipeline in self.pipelines)
+
+        return self.stats
@@ -6,6 +6,10 @@ import numpy as np
 class Product:
     """A class to represent a product.
 
+    The attributes are stored in slots instead of a per-instance dictionary, which keeps
+    large catalogs compact. The description of a product read from the database without
+    its description is loaded on first access.
+
     Attributes:
         id (int): The ID of the product.
         source (str): The source of the product.
@@ -14,6 +18,7 @@ class Product:
         description (str): The description of the product.
         price (float): The price of the product.
         image_url (str): The URL of the product's image.
+        brand (str): The brand of the product, if the catalog lists it.
         name_emb (np.ndarray): An array representing the name embedding of the product.
         descr_emb (np.ndarray): An array representing the description embedding of the product.
 
@@ -21,6 +26,9 @@ class Product:
         __str__: Returns a string representation of the product.
     """
 
+    __slots__ = ('id', 'source', 'url', 'name', '_description', 'price', 'image_url', 'brand',
+                 'name_emb', 'descr_emb')
+
     def __init__(
         self, source: str, url: str, name: str = "", price: float = None
     ) -> None:
@@ -28,12 +36,27 @@ class Product:
         self.source = source
         self.url = url
         self.name = name
-        self.description: str = ""
+        self._description: str = ""
         self.price = price
         self.image_url: str = ""
+        self.brand: str = ""
         self.name_emb: np.ndarray = None
         self.descr_emb: np.ndarray = None
 
+    @property
+    def description(self) -> str:
+        # None means the description was not read from the database yet
+        if self._description is None:
+            from db.controller import ProductController
+
+            ProductController.load_descriptions([self])
+
+        return "" if self._description is None else self._description
+
+    @description.setter
+    def description(self, value: str):
+        self._description = value
+
     def __str__(self):
         return (
             f"id: {self.id}\n"
@@ -0,0 +1,67 @@
+from typing import Tuple, Union
+from bs4 import BeautifulSoup, SoupStrainer
+
+try:
+    import lxml  # noqa: F401
+    # the libxml2 based tree builder is several times faster than the pure-Python one
+    HTML_PARSER = "lxml"
+except ImportError:
+    HTML_PARSER = "html.parser"
+
+
+def has_class(value: Union[str, list, None], css_class: str) -> bool:
+    """
+    Check the class attribute of a tag the way `find(..., class_=css_class)` does: the class matches
+    one of the classes of the tag or the whole attribute value.
+
+    Args:
+        value (Union[str, list, None]): The class attribute, a string or a list of classes.
+        css_class (str): The class to look for.
+
+    Returns:
+        bool: True if the class matches.
+    """
+    if value is None:
+        return False
+
+    classes = value.split() if isinstance(value, str) else list(value)
+
+    return css_class in classes or css_class == " ".join(classes)
+
+
+def only(*selectors: Tuple[str, str]) -> SoupStrainer:
+    """
+    Create a strainer that builds the tree only from the subtrees of the selected tags.
+
+    Everything outside those tags (navigation, scripts, footers, ...) is skipped while parsing,
+    so the tree is much smaller, while `find` and `find_all` of the selected tags and of their
+    descendants return the same elements as on the full tree.
+
+    Args:
+        *selectors (Tuple[str, str]): The (tag name, class) pairs of the tags to keep.
+
+    Returns:
+        SoupStrainer: The strainer to pass to `make_soup`.
+    """
+    def match(name: str, attrs: dict) -> bool:
+        return any(name == tag and has_class(attrs.get("class"), css_class) for tag, css_class in selectors)
+
+    return SoupStrainer(match)
+
+
+def make_soup(markup: Union[str, bytes], parse_only: SoupStrainer = None, encoding: str = None) -> BeautifulSoup:
+    """
+    Parse a page with the fastest available tree builder.
+
+    Args:
+        markup (Union[str, bytes]): The page.
+        parse_only (SoupStrainer, optional): Restrict the tree to the subtrees selected by `only`.
+        encoding (str, optional): The encoding of the page if it is passed as bytes, detected from the page if omitted.
+
+    Returns:
+        BeautifulSoup: The parsed page.
+    """
+    if isinstance(markup, str):
+        encoding = None
+
+    return BeautifulSoup(markup, HTML_PARSER, parse_only=parse_only, from_encoding=encoding)
@@ -1,46 +1,292 @@
-import sys
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from functools import partial
+from typing import Dict, List, Optional, Tuple
 from loguru import logger
+from config import ann_params, db_params, matcher_params, parser_types
 from db.controller import ProductController
-from models.matcher import Matcher
+from db.match_controller import MatchController
+from models.matcher import Matcher, match_key, match_modes, incremental_matches
+from models.ann_index import get_index
+from models.lexical_index import get_lexical_index
+from models.price_comparison import price_comparison, save_comparison
+from db.embedding_store import EmbeddingStore, load_store
+from parsers.product import Product
 
-if __name__ == "__main__":
-    if len(sys.argv) == 3:
-        source1 = sys.argv[1]
-        source2 = sys.argv[2]
+# the columns read from the products table, the embeddings are read from the embedding stores
+# and the descriptions are not needed for matching
+match_columns = ('name', 'price', 'image_url', 'brand')
+
+
+def load_source(source: str) -> Tuple[int, str, List[Product], Optional[EmbeddingStore]]:
+    """
+    Load the embedding store and the products of a source. The embeddings of the products are read
+    only when the store cannot be loaded.
+
+    Args:
+        source (str): The source of the products.
+
+    Returns:
+        Tuple[int, str, List[Product], Optional[EmbeddingStore]]: A tuple containing status code, status message,
+            the products and the embedding store.
+    """
+    result, msg, store = load_store(source)
+    if result != 0:
+        logger.warning(f'Unable to load the embedding store for source "{source}", '
+                       f'the embeddings of the products are used: {msg}')
+        store = None
+
+    columns = match_columns if store is not None else match_columns + ('name_emb', 'descr_emb')
+
+    result, msg, products = ProductController.get_products(source, columns)
+    if result != 0:
+        return result, f'Error while loading products for source "{source}": {msg}', [], store
+
+    if not products:
+        return 1, f'No products for source "{source}"', [], store
+
+    return 0, 'OK', products, store
+
+
+def match_source(args: argparse.Namespace, source1: str, mg_products: List[Product], mg_store: Optional[EmbeddingStore],
+                 source2: str, started_at: str) -> Tuple[int, str, Dict]:
+    """
+    Match the products of the anchor source with the products of a competitor source and store the matches.
+
+    Args:
+        args (argparse.Namespace): The arguments of the script.
+        source1 (str): The anchor source.
+        mg_products (List[Product]): The products of the anchor source.
+        mg_store (EmbeddingStore, optional): The embedding store of the anchor source.
+        source2 (str): The competitor source.
+        started_at (str): The start time of the run in ISO format.
+
+    Returns:
+        Tuple[int, str, Dict]: A tuple containing the exit code (0 for success), status message and the result:
+            the matches found by the run, the current matches of all the anchor products (the stored ones
+            included with --incremental) and the candidates.
+    """
+    # the matches of other settings are kept under their own keys and never reused by this run
+    key = match_key(args.mode, args.assignment, args.hybrid, args.blocking, args.ann)
+
+    last_run = None
+    if args.incremental:
+        if args.mode != 'best':
+            logger.warning(f'The incremental matching supports the best mode only, all the matches of the '
+                           f'"{args.mode}" mode are recomputed.')
+        elif args.hybrid or args.blocking:
+            # the lexical scores and the blocks depend on the whole source2, not only on its changed products
+            logger.warning('The incremental matching does not support the hybrid scoring and the blocking, '
+                           'all the matches are recomputed.')
+        else:
+            result, msg, last_run = MatchController.get_last_run(source1, source2, key)
+            if result != 0:
+                return 5, f'Error while loading the last matching run: {msg}', {}
+
+            if last_run is None:
+                logger.info(f'No stored matches for source "{source2}", all the matches are computed.')
+
+    result, msg, ms_products, ms_store = load_source(source2)
+    if result != 0:
+        return 3, msg, {}
+
+    index = None
+    if args.ann:
+        result, msg, index = get_index(source2)
+        if result != 0:
+            return 4, f'Error while loading the index for source "{source2}": {msg}', {}
+
+    lexical = None
+    threshold = matcher_params['threshold']
+    if args.hybrid:
+        result, msg, lexical = get_lexical_index(source2)
+        if result != 0:
+            return 4, f'Error while loading the lexical index for source "{source2}": {msg}', {}
+
+        threshold = matcher_params['hybrid_threshold']
+
+    def make_matcher(products_a, products_b, whole_b: bool = True) -> Matcher:
+        # the index covers all the products of source2, it is not used to search a part of them
+        return Matcher(products_a, products_b, threshold=threshold, index=index if whole_b else None,
+                       candidates=ann_params['candidates'], store_a=mg_store, store_b=ms_store,
+                       top_k=args.top_k, mode=args.mode, assignment=args.assignment,
+                       blocking=args.blocking, lexical=lexical, weights=matcher_params['weights'])
+
+    logger.info(f'Product matching with source "{source2}" started ...')
+
+    if last_run is not None:
+        result, msg, stored = MatchController.get_matches(source1, source2, key)
+        if result == 0:
+            result, msg, changed1 = ProductController.get_changed_ids(source1, last_run)
+        if result == 0:
+            result, msg, changed2 = ProductController.get_changed_ids(source2, last_run)
+        if result != 0:
+            return 5, f'Error while loading the changes since the last matching run: {msg}', {}
+
+        logger.info(f'Changed since {last_run}: {len(changed1)} products of "{source1}", '
+                    f'{len(changed2)} products of "{source2}"')
+
+        matches, replaced = incremental_matches(mg_products, ms_products, stored, changed1, changed2, make_matcher)
+        result, msg = MatchController.save_matches(source1, source2, key, matches, started_at, replaced)
+        candidates = []
+
+        ms_by_id = {p.id: p for p in ms_products}
+        current = [(p, ms_by_id[stored[p.id][0]], stored[p.id][1]) for p in mg_products
+                   if p.id in stored and p.id not in replaced and stored[p.id][0] in ms_by_id] + matches
+
+        logger.info(f'Product matching with source "{source2}" finished: {len(replaced)} stored matches replaced, '
+                    f'{len(matches)} matches found.')
     else:
-        logger.error('Parser type is not specified')
+        matcher = make_matcher(mg_products, ms_products)
+        matcher.find_best_matches()
+        matches, candidates = matcher.get_matches(), matcher.get_candidates()
+        current = matches
+        result, msg = MatchController.save_matches(source1, source2, key, matches, started_at)
+
+        logger.info(f'Product matching with source "{source2}" finished: {len(matches)} matches found, '
+                    f'{matcher.comparisons} similarities computed.')
+
+    if result != 0:
+        return 6, f'Error while saving the matches of source "{source2}": {msg}', {}
+
+    return 0, 'OK', {'matches': matches, 'current': current, 'candidates': candidates}
+
+
+# the anchor source loaded by a matching process: (status code, status message, products, store)
+_anchor = None
+
+
+def _init_matching_process(db_file: str, source1: str):
+    """Load the anchor source once in a matching process. Its embedding matrix is memory-mapped, so
+    the processes share the pages of the store files instead of holding copies of the matrix."""
+    global _anchor
+
+    # the path may have been changed at runtime, e.g. by the benchmarks
+    db_params['db_file'] = db_file
+    _anchor = load_source(source1)
+
+
+def _match_in_process(args: argparse.Namespace, source1: str, started_at: str, source2: str) -> Tuple[int, str, Dict]:
+    result, msg, mg_products, mg_store = _anchor
+    if result != 0:
+        return 2, msg, {}
+
+    return match_source(args, source1, mg_products, mg_store, source2, started_at)
+
+
+def match_competitors(args: argparse.Namespace, source1: str, mg_products: List[Product],
+                      mg_store: Optional[EmbeddingStore], competitors: List[str], started_at: str,
+                      workers: int = 1) -> List[Tuple[int, str, Dict]]:
+    """
+    Match the products of the anchor source with every competitor source, see `match_source`.
+
+    With several workers the competitors are matched in parallel by a pool of processes: the candidate
+    selection, blocking, reranking and assignment run in Python and would be serialized by the GIL in
+    threads. Every process loads the anchor products and memory-maps the anchor embedding store once.
+
+    Args:
+        args (argparse.Namespace): The arguments of the script.
+        source1 (str): The anchor source.
+        mg_products (List[Product]): The products of the anchor source, used by the sequential run.
+        mg_store (EmbeddingStore, optional): The embedding store of the anchor source, used by the sequential run.
+        competitors (List[str]): The competitor sources.
+        started_at (str): The start time of the run in ISO format.
+        workers (int): The number of competitors matched in parallel, 1 to match them one after another.
+
+    Returns:
+        List[Tuple[int, str, Dict]]: The results of `match_source`, in the order of the competitors.
+    """
+    workers = max(1, min(workers, len(competitors)))
+
+    if workers == 1:
+        return [match_source(args, source1, mg_products, mg_store, source2, started_at) for source2 in competitors]
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_matching_process,
+                             initargs=(db_params['db_file'], source1)) as executor:
+        return list(executor.map(partial(_match_in_process, args, source1, started_at), competitors))
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description='Match the products of an anchor source with competitor sources.')
+    arg_parser.add_argument('source1', help='The anchor source.')
+    arg_parser.add_argument('source2', nargs='*',
+                            help='The competitor sources, all the other sources of `parser_types` if omitted.')
+    arg_parser.add_argument('--ann', action='store_true',
+                            help='Search the candidates in the approximate nearest-neighbour index of every competitor.')
+    arg_parser.add_argument('--top-k', type=int, default=matcher_params['top_k'],
+                            help='Number of candidates kept for every product of source1.')
+    arg_parser.add_argument('--mode', choices=match_modes, default=matcher_params['mode'],
+                            help='How the matches are chosen among the candidates.')
+    arg_parser.add_argument('--assignment', choices=('greedy', 'hungarian'), default=matcher_params['assignment'],
+                            help='Assignment of the one_to_one mode.')
+    arg_parser.add_argument('--blocking', action=argparse.BooleanOptionalAction, default=matcher_params['blocking'],
+                            help='Compare the products only within the same brand and pack size.')
+    arg_parser.add_argument('--hybrid', action=argparse.BooleanOptionalAction, default=matcher_params['hybrid'],
+                            help='Add the lexical candidates and score the candidates with the hybrid score.')
+    arg_parser.add_argument('--incremental', action='store_true',
+                            help='Update the stored matches with the products saved since the last run '
+                                 '(best mode without --hybrid and --blocking only).')
+    arg_parser.add_argument('--workers', type=int, default=matcher_params['workers'],
+                            help='Number of competitor sources matched in parallel by separate processes.')
+    arg_parser.add_argument('--output', help='Write the price comparison of the products of source1 to a CSV file.')
+    args = arg_parser.parse_args()
+
+    source1 = args.source1
+    competitors = args.source2 or [source for source in parser_types if source != source1]
+
+    if not competitors:
+        logger.error(f'No competitor sources for source "{source1}"')
         exit(1)
 
-    result, msg, mg_products = ProductController.get_products(source1)
+    # taken before loading the products, the products saved during the run are matched by the next one
+    started_at = datetime.now().isoformat()
+
+    # the anchor catalog is loaded (and its embedding store refreshed) once before the competitors are matched
+    result, msg, mg_products, mg_store = load_source(source1)
     if result != 0:
-        logger.error(f'Error while loading products for source "{source1}"')
+        logger.error(msg)
         exit(2)
 
-    if not mg_products:
-        logger.error(f'No products for source "{source1}"')
-        exit(2)
+    results = match_competitors(args, source1, mg_products, mg_store, competitors, started_at, args.workers)
 
-    result, msg, ms_products = ProductController.get_products(source2)
-    if result != 0:
-        logger.error(f'Error while loading products for source "{source2}"')
-        exit(3)
+    exit_code = 0
+    for source2, (result, msg, _) in zip(competitors, results):
+        if result != 0:
+            logger.error(msg)
+            exit_code = exit_code or result
+
+    matched = {source2: data for source2, (result, _, data) in zip(competitors, results) if result == 0}
+
+    for source2, data in matched.items():
+        print(f'First 8 matches with {source2}:')
+        for prod1, prod2, similarity in data['matches'][:8]:
+            print(f'<<{source1}>>:')
+            print(prod1)
+            print(f'<<{source2}>>:')
+            print(prod2)
+            print(f'similarity: {similarity}')
+            print('--')
 
-    if not ms_products:
-        logger.error(f'No products for source "{source1}"')
-        exit(3)
+        if args.top_k > 1 and data['candidates']:
+            print(f'Top {args.top_k} candidates of the first 8 products:')
+            for prod1, prod_candidates in data['candidates'][:8]:
+                print(f'<<{source1}>> {prod1.name}:')
+                for prod2, similarity in prod_candidates:
+                    print(f'  {similarity:.4f} <<{source2}>> {prod2.name} ({prod2.url})')
 
-    logger.info('Product matching started ...')
+    if matched and (len(competitors) > 1 or args.output):
+        rows = price_comparison(mg_products, {source2: data['current'] for source2, data in matched.items()})
 
-    matcher = Matcher(mg_products, ms_products)
-    matcher.find_best_matches()
+        if len(competitors) > 1:
+            print('Price comparison of the first 8 products:')
+            for row in rows[:8]:
+                prices = ', '.join(f'{source2} {row[f"{source2}_price"]} ({row[f"{source2}_diff"]:+.1f}%)'
+                                   if row[f'{source2}_diff'] is not None else f'{source2} -' for source2 in matched)
+                print(f'{row["name"]}: {source1} {row["price"]}, {prices}; cheapest: {row["cheapest_source"]}')
 
-    logger.info(f'Product matching finished: {len(matcher.matches)} matches found.')
+        if args.output:
+            save_comparison(args.output, rows, list(matched))
+            logger.info(f'The price comparison of {len(rows)} products was written to "{args.output}".')
 
-    print('First 8 matches:')
-    for prod1, prod2, similarity in matcher.matches[:8]:
-        print(f'<<{source1}>>:')
-        print(prod1)
-        print(f'<<{source2}>>:')
-        print(prod2)
-        print(f'similarity: {similarity}')
-        print('--')
+    exit(exit_code)
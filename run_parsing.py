@@ -1,79 +1,213 @@
-import sys
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from typing import Tuple
+from parsers.base import BaseParser
 from parsers.mg_parser import MoonGlowParser
 from parsers.ms_parser import MySkinParser
+from parsers.pipeline import CrawlPipeline, CrawlOrchestrator
+from db.crawl_state import CrawlState, SourceStates
+from db.embedding_store import load_store
+from models.lexical_index import get_lexical_index
+from config import crawl_params, parse_params, parser_types
 from loguru import logger
 
 
-if __name__ == "__main__":
-    if len(sys.argv) > 1:
-        parser_type = sys.argv[1]
-    else:
-        logger.error("Parser type is not specified")
-        exit(1)
+def make_parser(parser_type: str, offline: bool, other: BaseParser = None) -> BaseParser:
+    """
+    Create the parser of a website.
+
+    Args:
+        parser_type (str): The type of the parser.
+        offline (bool): Serve the pages only from the response cache.
+        other (BaseParser, optional): A parser whose embedder and response cache are shared.
 
-    parser = None
+    Returns:
+        BaseParser: The parser, None for an unknown parser type.
+    """
+    shared = {} if other is None else {"embedder": other.embedder, "cache": other.http.cache}
 
     ### moonglow
     if parser_type.lower() == "moonglow":
         prod_urls = [
             "https://www.moonglow.md/ru/catalog/page/{page}?loop={loop}&woo_ajax=1"
         ]
-        parser = MoonGlowParser(parser_type="moonglow", prod_urls=prod_urls)
+        return MoonGlowParser(parser_type="moonglow", prod_urls=prod_urls, offline=offline, **shared)
 
     ### myskin
     if parser_type.lower() == "myskin":
         prod_urls = ["https://myskin.md/brendy"]
-        parser = MySkinParser(parser_type="myskin", prod_urls=prod_urls)
+        return MySkinParser(parser_type="myskin", prod_urls=prod_urls, offline=offline, **shared)
+
+    return None
+
+
+def prepare_crawl(parser: BaseParser, state: CrawlState, args: argparse.Namespace) -> Tuple[int, str]:
+    """
+    Select the products to crawl: the unfinished products of the last crawl with --resume,
+    otherwise the products of the catalog (only the new, changed and stale ones with --incremental).
+
+    Args:
+        parser (BaseParser): The parser.
+        state (CrawlState): The crawl state of the source of the parser.
+        args (argparse.Namespace): The arguments of the script.
 
-    if parser is None:
-        logger.error(f"No parser found for the specified parser type: `{parser_type}`")
-        exit(2)
+    Returns:
+        Tuple[int, str]: A tuple containing the exit code (0 for success) and a message.
+    """
+    parser_type = parser.parser_type
+
+    if args.resume:
+        ### resume the last crawl
+        status_code, status_message, parser.products = state.get_unfinished(crawl_params["max_attempts"])
+
+        if status_code != 0:
+            return 4, f"Unable to load the unfinished products [{parser_type}]: {status_message}"
+
+        logger.info(f"Resuming the last crawl [{parser_type}], unfinished products: {len(parser.products)}")
+
+        return 0, "OK"
 
     ### parse catalog
     logger.info(f"Product catalog [{parser_type}] parsing started ...")
     status_code, status_message = parser.parse_catalog()
 
     if status_code != 0:
-        logger.error(f"Product catalog parsing finished with error: {status_message}")
-        exit(3)
+        return 3, f"Product catalog [{parser_type}] parsing finished with error: {status_message}"
 
-    logger.info(
-        f"Product catalog parsing finished, total products: {len(parser.products)}"
-    )
+    logger.info(f"Product catalog [{parser_type}] parsing finished, total products: {len(parser.products)}")
 
-    ### parse products
-    logger.info("Products parsing started ...")
-    success_qty, err_qty = parser.parse_products()
+    ### select the products to crawl, a full crawl treats every product as stale
+    stale_days = crawl_params["stale_days"] if args.incremental else 0
+    # the gone and seen marks are written through the connection of the crawl state, the single writer of the crawl
+    status_code, status_message, parser.products, unchanged = parser.select_products_to_crawl(stale_days, state.conn)
 
-    if success_qty != 0:
+    if status_code != 0:
+        return 3, f"Unable to compare the catalog [{parser_type}] with the stored products: {status_message}"
+
+    if args.incremental:
         logger.info(
-            f"Products parsing finished successfully for {success_qty} products."
+            f"Products to crawl [{parser_type}]: {len(parser.products)}, unchanged products: {len(unchanged)}"
         )
 
-    if err_qty != 0:
-        logger.warning(f"Products parsing finished with errors for {err_qty} products.")
+    status_code, status_message = state.start(parser.products)
 
-    ### generate embeddings
-    logger.info("Generating embeddings for products started ...")
-    success_qty, err_qty = parser.gen_embeddings()
-    if success_qty != 0:
-        logger.info(
-            f"Generating embeddings finished successfully for {success_qty} products."
-        )
+    if status_code != 0:
+        return 4, f"Unable to save the crawl state [{parser_type}]: {status_message}"
 
-    if err_qty != 0:
-        logger.warning(
-            f"Generating embeddings finished with errors for {err_qty} products."
-        )
+    return 0, "OK"
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Parse the products of one or several websites concurrently.")
+    arg_parser.add_argument("parser_type", nargs="*",
+                            help="The types of the parsers, all the `parser_types` if omitted.")
+    arg_parser.add_argument(
+        "--offline",
+        action="store_true",
+        help="Replay the pages stored in the response cache without touching the network.",
+    )
+    arg_parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Continue the last crawl: process only the products that were not saved yet.",
+    )
+    arg_parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Crawl only the new, changed and stale products of the catalog.",
+    )
+    args = arg_parser.parse_args()
+
+    parsers = []
+
+    for parser_type in args.parser_type or parser_types:
+        # the parsers share the embedder (the model is loaded once) and the response cache
+        parser = make_parser(parser_type, args.offline, parsers[0] if parsers else None)
+
+        if parser is None:
+            logger.error(f"No parser found for the specified parser type: `{parser_type}`")
+            exit(2)
+
+        parsers.append(parser)
+
+    states = SourceStates([parser.parser_type for parser in parsers])
+    status_code, status_message = states.connect()
+
+    if status_code != 0:
+        logger.error(f"Unable to open the crawl state: {status_message}")
+        exit(4)
+
+    ### parse the catalogs concurrently
+    with ThreadPoolExecutor(max_workers=len(parsers)) as executor:
+        results = list(executor.map(lambda parser: prepare_crawl(parser, states[parser.parser_type], args), parsers))
+
+    exit_code = 0
+    for code, status_message in results:
+        if code != 0:
+            logger.error(status_message)
+            exit_code = exit_code or code
+
+    all_parsers = parsers
+    parsers = [parser for parser, (code, _) in zip(parsers, results) if code == 0]
+
+    if not parsers:
+        exit(exit_code)
+
+    ### parse products, generate embeddings and save products; the parsing processes are split between the sources
+    parse_workers = parse_params["max_workers"] and max(1, parse_params["max_workers"] // len(parsers))
+    pipelines = [CrawlPipeline(parser, state=states[parser.parser_type], parse_workers=parse_workers)
+                 for parser in parsers]
+
+    logger.info("Products parsing, embedding and saving started ...")
+    orchestrator = CrawlOrchestrator(pipelines, parsers[0].embedder, state=states)
+    stats = orchestrator.run()
+
+    if stats.parsed != 0:
+        logger.info(f"Products parsing finished for {stats.parsed} products.")
+
+    if stats.parse_errors != 0:
+        logger.warning(f"Products parsing finished with errors for {stats.parse_errors} products.")
+
+    if stats.embed_errors != 0:
+        logger.warning(f"Generating embeddings finished with {stats.embed_errors} errors.")
+
+    if stats.saved != 0:
+        logger.info(f"Successfully saved {stats.saved - stats.save_errors} products.")
+
+    if stats.save_errors != 0:
+        logger.warning(f"{stats.save_errors} errors while saving products.")
+
+    for parser in parsers:
+        _, _, summary = states[parser.parser_type].get_summary()
+        logger.info(f"Crawl state [{parser.parser_type}]: {dict(summary)}")
+
+    states.close()
+
+    embedder = parsers[0].embedder
+    if embedder.cache is not None:
+        logger.info(f"Embedding cache: {embedder.cache.stats()}")
+        embedder.cache.close()
+
+    for parser in all_parsers:
+        parser.http.close()
+
+    ### refresh the embedding stores and the lexical indexes used by matching
+    for parser in parsers:
+        parser_type = parser.parser_type
 
-    ### save products
-    logger.info("Products saving started ...")
-    success_qty, err_qty = parser.save_products()
+        status_code, status_message, store = load_store(parser_type)
+        if status_code != 0:
+            logger.warning(f"Unable to refresh the embedding store [{parser_type}]: {status_message}")
+        else:
+            logger.info(f"Embedding store [{parser_type}]: {len(store)} products.")
 
-    if success_qty != 0:
-        logger.info(f"Successfully saved {success_qty} products.")
+        status_code, status_message, _ = get_lexical_index(parser_type)
+        if status_code != 0:
+            logger.warning(f"Unable to refresh the lexical index [{parser_type}]: {status_message}")
 
-    if err_qty != 0:
-        logger.warning(f"{err_qty} errors while saving products.")
+    if len(parsers) > 1:
+        elapsed = ', '.join(f"{source} {seconds:.1f}s" for source, seconds in orchestrator.elapsed.items())
+        logger.info(f"Crawl time per source: {elapsed}")
 
     logger.info("Finish.")
+    exit(exit_code)